@@ -1,21 +1,64 @@
 """
-VetFlow - AI Chat Module using OpenAI GPT via Emergent Integrations
+VetFlow - AI Chat Module using OpenAI GPT via Emergent Integrations (see llm_backends)
 With appointment booking capabilities via WhatsApp
 """
 import os
 import re
 import json
+import asyncio
+import weakref
 from dotenv import load_dotenv
 load_dotenv()
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-from typing import Optional, Dict, Tuple
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime, timezone, timedelta
+import time
 import logging
 
+from llm_gateway import call_llm
+from llm_backends import LLMSession, get_llm_backend
+from tracing import traced
+
 logger = logging.getLogger(__name__)
 
-EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
+# Batched reminder prompts produce many messages at once and get a longer deadline
+LLM_BATCH_TIMEOUT_SECONDS = float(os.environ.get("LLM_BATCH_TIMEOUT_SECONDS", "60"))
+
+# Conversation sessions kept warm per (tenant, phone)
+CHAT_SESSION_LIMIT = int(os.environ.get("CHAT_SESSION_LIMIT", "1000"))
+CHAT_SESSION_IDLE_SECONDS = int(os.environ.get("CHAT_SESSION_IDLE_SECONDS", "1800"))
+# A session is rebuilt from the stored window after this many turns, bounding its history
+CHAT_SESSION_MAX_TURNS = int(os.environ.get("CHAT_SESSION_MAX_TURNS", "8"))
+
+# (user_id, is_registered) -> (settings version, compiled system prompt)
+_prompt_cache: Dict[Tuple[str, bool], Tuple[str, str]] = {}
+
+
+
+class PooledChat:
+    """A warm session plus what it has seen, to tell whether it still matches the stored thread."""
+    __slots__ = ("version", "last_used", "chat", "turns", "last_exchange")
+
+    def __init__(self, version: str, chat: LLMSession):
+        self.version = version
+        self.last_used = time.monotonic()
+        self.chat = chat
+        self.turns = 0
+        # (customer message, reply) of the session's last turn
+        self.last_exchange: Optional[Tuple[str, str]] = None
+
+
+# (user_id, phone) -> pooled session
+_chat_sessions: "OrderedDict[Tuple[str, str], PooledChat]" = OrderedDict()
+# One turn at a time per conversation; a lock lives while someone holds or waits on it
+_chat_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Replies used when the model cannot answer; never cached
+AI_UNAVAILABLE_MESSAGE = "Şu anda AI asistan hizmeti mevcut değil. Lütfen kliniği arayın."
+AI_ERROR_MESSAGE = "Üzgünüm, şu anda yanıt veremiyorum. Lütfen kliniği doğrudan arayın."
+
+REMINDER_SYSTEM_MESSAGE = "Sen bir veteriner kliniği için mesaj yazan asistansın. Kısa ve etkili mesajlar yaz."
 
 
 def build_system_prompt(ai_settings: dict, is_registered: bool = False) -> str:
@@ -73,6 +116,91 @@ Kurallar:
     return base_prompt
 
 
+def settings_version(ai_settings: dict) -> str:
+    """Version tag of a tenant's AI settings; changes whenever the settings are saved."""
+    return str(ai_settings.get("updated_at", ""))
+
+
+def get_system_prompt(ai_settings: dict, is_registered: bool = False) -> str:
+    """
+    Get the tenant's compiled system prompt, rebuilding it only when the
+    AI settings version changes.
+    """
+    user_id = ai_settings.get("user_id")
+    if not user_id:
+        return build_system_prompt(ai_settings, is_registered)
+    
+    key = (user_id, is_registered)
+    version = settings_version(ai_settings)
+    cached = _prompt_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    prompt = build_system_prompt(ai_settings, is_registered)
+    _prompt_cache[key] = (version, prompt)
+    return prompt
+
+
+def chat_lock(user_id: str, phone: str) -> asyncio.Lock:
+    """Lock serializing turns of one (tenant, phone) conversation in this worker."""
+    key = (user_id, phone)
+    lock = _chat_locks.get(key)
+    if lock is None:
+        lock = _chat_locks[key] = asyncio.Lock()
+    return lock
+
+
+def _in_sync(pooled: PooledChat, history: Optional[List[Dict]]) -> bool:
+    """
+    Whether the stored thread ends with the session's last turn. Replies from the
+    answer cache, the booking fast path or another worker never reach the session,
+    so after one of those the session would answer from a stale thread.
+    """
+    if history is None:
+        return True
+    if pooled.last_exchange is None:
+        return False
+    tail = [(turn["role"], turn["content"]) for turn in history[-2:]]
+    message, reply = pooled.last_exchange
+    return tail == [("user", message), ("assistant", reply)]
+
+
+def get_chat_session(
+    user_id: str,
+    phone: str,
+    system_prompt: str,
+    version: str,
+    history: Optional[List[Dict]] = None
+) -> Tuple[PooledChat, bool]:
+    """
+    Get the pooled chat session for a (tenant, phone) conversation; call with chat_lock held.
+    A stable session id and system prompt let the provider reuse its cached
+    prompt prefix across messages. Sessions are rebuilt when the prompt version
+    changes, after CHAT_SESSION_MAX_TURNS turns, and when the stored history
+    (load_conversation) has moved on without them; the caller seeds a rebuilt
+    session from that history. Evicted least-recently-used beyond CHAT_SESSION_LIMIT.
+    Returns: (pooled session, is_new)
+    """
+    key = (user_id, phone)
+    now = time.monotonic()
+    
+    pooled = _chat_sessions.get(key)
+    if (pooled and pooled.version == version and now - pooled.last_used < CHAT_SESSION_IDLE_SECONDS
+            and pooled.turns < CHAT_SESSION_MAX_TURNS and _in_sync(pooled, history)):
+        pooled.last_used = now
+        _chat_sessions.move_to_end(key)
+        return pooled, False
+    
+    pooled = PooledChat(version, get_llm_backend().create_session(f"vetflow_{user_id}_{phone}", system_prompt))
+    
+    _chat_sessions[key] = pooled
+    _chat_sessions.move_to_end(key)
+    while len(_chat_sessions) > CHAT_SESSION_LIMIT:
+        _chat_sessions.popitem(last=False)
+    
+    return pooled, True
+
+
 def parse_appointment_request(response: str) -> Optional[Dict]:
     """
     Parse appointment request from AI response.
@@ -113,31 +241,65 @@ def clean_response_for_customer(response: str) -> str:
     return re.sub(r'\[RANDEVU_TALEBI\].*?\[/RANDEVU_TALEBI\]', '', response, flags=re.DOTALL).strip()
 
 
+def _seeded(message: str, conversation_history: Optional[list], is_new_session: bool) -> str:
+    """A warm pooled session already holds the thread; a fresh one is seeded from stored history."""
+    if conversation_history and is_new_session:
+        from conversation import format_history
+        return f"{format_history(conversation_history)}\n\nMüşterinin yeni mesajı: {message}"
+    return message
+
+
+@traced("ai.response")
 async def get_ai_response(
     message: str,
     ai_settings: dict,
     is_registered: bool = False,
-    conversation_history: Optional[list] = None
+    conversation_history: Optional[list] = None,
+    user_id: Optional[str] = None,
+    phone: Optional[str] = None
 ) -> Tuple[str, Optional[Dict]]:
     """
     Get AI response for a customer message.
+    With user_id and phone the conversation reuses a pooled session for that
+    (tenant, phone), one turn at a time; without them a one-off session is used.
+    conversation_history (from conversation.load_conversation) seeds sessions that
+    start cold and tells whether a warm one still matches the stored thread.
     Returns: (response_text, appointment_request or None)
     """
-    if not EMERGENT_LLM_KEY:
-        logger.error("EMERGENT_LLM_KEY not configured")
-        return "Şu anda AI asistan hizmeti mevcut değil. Lütfen kliniği arayın.", None
+    if not get_llm_backend().is_configured():
+        logger.error("LLM backend not configured (EMERGENT_LLM_KEY missing)")
+        return AI_UNAVAILABLE_MESSAGE, None
     
     try:
-        system_prompt = build_system_prompt(ai_settings, is_registered)
-        
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"vetflow_{id(message)}",
-            system_message=system_prompt
-        ).with_model("openai", "gpt-5.2")
+        system_prompt = get_system_prompt(ai_settings, is_registered)
+        tenant = user_id or ai_settings.get("user_id", "system")
         
-        user_message = UserMessage(text=message)
-        response = await chat.send_message(user_message)
+        if user_id and phone:
+            async with chat_lock(user_id, phone):
+                version = f"{settings_version(ai_settings)}:{is_registered}"
+                pooled, is_new_session = get_chat_session(
+                    user_id, phone, system_prompt, version, conversation_history
+                )
+                try:
+                    response = await call_llm(
+                        lambda: pooled.chat.send(_seeded(message, conversation_history, is_new_session)),
+                        tenant=tenant,
+                        operation="chat"
+                    )
+                except Exception:
+                    # Don't keep a session whose last turn is in an unknown state
+                    if _chat_sessions.get((user_id, phone)) is pooled:
+                        _chat_sessions.pop((user_id, phone), None)
+                    raise
+                pooled.turns += 1
+                pooled.last_exchange = (message, clean_response_for_customer(response))
+        else:
+            chat = get_llm_backend().create_session(f"vetflow_{id(message)}", system_prompt)
+            response = await call_llm(
+                lambda: chat.send(_seeded(message, conversation_history, True)),
+                tenant=tenant,
+                operation="chat"
+            )
         
         # Check for appointment request
         appointment_request = None
@@ -151,9 +313,10 @@ async def get_ai_response(
         
     except Exception as e:
         logger.error(f"AI chat error: {str(e)}")
-        return "Üzgünüm, şu anda yanıt veremiyorum. Lütfen kliniği doğrudan arayın.", None
+        return AI_ERROR_MESSAGE, None
 
 
+@traced("appointment.availability")
 async def check_appointment_availability(db, user_id: str, date_str: str, time_str: str) -> Dict:
     """
     Check if the requested appointment slot is available.
@@ -182,8 +345,8 @@ async def check_appointment_availability(db, user_id: str, date_str: str, time_s
             }
         
         # Check for existing appointments (within 30 min window)
-        start_window = (requested_dt - timedelta(minutes=30)).isoformat()
-        end_window = (requested_dt + timedelta(minutes=30)).isoformat()
+        start_window = requested_dt - timedelta(minutes=30)
+        end_window = requested_dt + timedelta(minutes=30)
         
         existing = await db.appointments.find_one({
             "user_id": user_id,
@@ -205,6 +368,7 @@ async def check_appointment_availability(db, user_id: str, date_str: str, time_s
         return {"available": False, "reason": "Tarih formatı hatalı", "alternative": None}
 
 
+@traced("appointment.next_slot")
 async def find_next_available_slot(db, user_id: str, start_from: datetime) -> Optional[Dict]:
     """Find the next available appointment slot."""
     try:
@@ -225,8 +389,8 @@ async def find_next_available_slot(db, user_id: str, start_from: datetime) -> Op
                 continue
             
             # Check if slot is available
-            start_window = (current - timedelta(minutes=15)).isoformat()
-            end_window = (current + timedelta(minutes=15)).isoformat()
+            start_window = current - timedelta(minutes=15)
+            end_window = current + timedelta(minutes=15)
             
             existing = await db.appointments.find_one({
                 "user_id": user_id,
@@ -251,6 +415,7 @@ async def find_next_available_slot(db, user_id: str, start_from: datetime) -> Op
         return None
 
 
+@traced("appointment.create")
 async def create_whatsapp_appointment(
     db, 
     user_id: str, 
@@ -265,6 +430,10 @@ async def create_whatsapp_appointment(
     Returns the created appointment or error.
     """
     from models import Appointment, generate_id
+    from codec import to_document
+    from counters import increment_counter
+    from versions import bump_version
+    from events import publish_event
     
     try:
         # Create datetime
@@ -284,12 +453,12 @@ async def create_whatsapp_appointment(
             status="confirmed"  # Auto-confirm WhatsApp appointments
         )
         
-        doc = appointment.model_dump()
-        doc["created_at"] = doc["created_at"].isoformat()
-        doc["updated_at"] = doc["updated_at"].isoformat()
-        doc["date"] = doc["date"].isoformat()
+        doc = to_document(appointment)
         
         await db.appointments.insert_one(doc)
+        await increment_counter(db, user_id, "appointments")
+        await bump_version(db, user_id, "appointments")
+        publish_event(user_id, "appointment.created", doc)
         
         return {
             "success": True,
@@ -341,16 +510,11 @@ async def generate_reminder_message(
     """
     Generate a personalized reminder message using AI.
     """
-    if not EMERGENT_LLM_KEY:
+    from reminder_renderer import render_reminder
+    
+    if not get_llm_backend().is_configured():
         # Fallback to template messages
-        templates = {
-            "appointment": f"Sayın {customer_name}, {pet_name} için randevunuz yaklaşıyor. {details}",
-            "vaccination": f"Sayın {customer_name}, {pet_name}'in aşı zamanı geldi. {details}",
-            "food": f"Sayın {customer_name}, {pet_name}'in maması bitmek üzere. {details}",
-            "medication": f"Sayın {customer_name}, {pet_name}'in ilacı bitmek üzere. {details}",
-            "checkup": f"Sayın {customer_name}, {pet_name} için kontrol zamanı. {details}"
-        }
-        return templates.get(reminder_type, f"Sayın {customer_name}, {pet_name} için hatırlatma: {details}")
+        return render_reminder(ai_settings, reminder_type, customer_name, pet_name, details)
     
     try:
         tone = ai_settings.get("tone", "friendly")
@@ -367,15 +531,86 @@ Ton: {tone}
 
 Kısa, samimi ve profesyonel bir mesaj yaz. Emojiler kullanabilirsin ama abartma."""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"reminder_{id(prompt)}",
-            system_message="Sen bir veteriner kliniği için mesaj yazan asistansın. Kısa ve etkili mesajlar yaz."
-        ).with_model("openai", "gpt-5.2")
+        # Stable session id and system message so the shared prompt prefix stays cacheable
+        chat = get_llm_backend().create_session(
+            f"reminder_{ai_settings.get('user_id', 'system')}",
+            REMINDER_SYSTEM_MESSAGE
+        )
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        response = await call_llm(
+            lambda: chat.send(prompt),
+            tenant=ai_settings.get("user_id", "system"),
+            operation="reminder"
+        )
         return response
         
     except Exception as e:
         logger.error(f"Reminder generation error: {str(e)}")
         return f"Sayın {customer_name}, {pet_name} için hatırlatma: {details}"
+
+
+@traced("ai.reminder_batch")
+async def generate_reminder_messages_batch(ai_settings: dict, jobs: list) -> Dict[str, str]:
+    """
+    Personalize many reminders of one tenant with a single LLM call.
+    Each job needs key, reminder_type, customer_name, pet_name, details and
+    template_message. The model answers with a JSON array that is split back
+    per key; missing or malformed entries are simply left out.
+    Returns: {key: message}
+    """
+    tone = ai_settings.get("tone", "friendly")
+    clinic_name = ai_settings.get("clinic_info", "VetFlow Veteriner Kliniği")
+    
+    items = [
+        {
+            "id": job["key"],
+            "musteri": job["customer_name"],
+            "evcil_hayvan": job["pet_name"],
+            "tur": job["reminder_type"],
+            "detay": job["details"],
+            "taslak": job["template_message"]
+        }
+        for job in jobs
+    ]
+    
+    prompt = f"""Aşağıdaki her kayıt için bir veteriner kliniği adına kısa bir WhatsApp hatırlatma mesajı yaz.
+
+Klinik: {clinic_name}
+Ton: {tone}
+
+Kayıtlar (JSON):
+{json.dumps(items, ensure_ascii=False)}
+
+Her mesaj taslaktaki bilgileri korusun, kısa, samimi ve profesyonel olsun. Emojileri abartma.
+Yalnızca şu biçimde bir JSON dizisi döndür, başka metin ekleme:
+[{{"id": "<kayıt id>", "mesaj": "<mesaj>"}}]"""
+    
+    chat = get_llm_backend().create_session(
+        f"reminder_batch_{ai_settings.get('user_id', 'system')}",
+        REMINDER_SYSTEM_MESSAGE
+    )
+    
+    response = await call_llm(
+        lambda: chat.send(prompt),
+        tenant=ai_settings.get("user_id", "system"),
+        operation="reminder_batch",
+        timeout=LLM_BATCH_TIMEOUT_SECONDS
+    )
+    
+    match = re.search(r'\[.*\]', response, re.DOTALL)
+    if not match:
+        logger.warning("Reminder batch response had no JSON array")
+        return {}
+    
+    try:
+        rows = json.loads(match.group(0))
+    except ValueError:
+        logger.warning("Reminder batch response was not valid JSON")
+        return {}
+    
+    wanted = {job["key"] for job in jobs}
+    return {
+        str(row["id"]): row["mesaj"].strip()
+        for row in rows
+        if isinstance(row, dict) and str(row.get("id")) in wanted and isinstance(row.get("mesaj"), str) and row["mesaj"].strip()
+    }
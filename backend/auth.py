@@ -10,10 +10,12 @@ from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException, Request, Response
 from typing import Optional
 from models import User, UserSession, generate_id
+from dates import as_utc
 
 JWT_SECRET = os.environ.get("JWT_SECRET_KEY", "vetflow_default_secret")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 168  # 7 days
+STREAM_TICKET_SECONDS = 60
 
 EMERGENT_AUTH_URL = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
 
@@ -35,6 +37,29 @@ def create_jwt_token(user_id: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+def create_stream_ticket(user_id: str) -> str:
+    """
+    Short-lived token for the event stream (EventSource cannot send headers,
+    so it goes in the URL). Scoped tokens are not accepted as sessions.
+    """
+    now = datetime.now(timezone.utc)
+    payload = {
+        "user_id": user_id,
+        "scope": "events",
+        "exp": now + timedelta(seconds=STREAM_TICKET_SECONDS),
+        "iat": now
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def decode_stream_ticket(ticket: str) -> Optional[str]:
+    """User id of a valid event stream ticket, else None."""
+    payload = decode_jwt_token(ticket)
+    if payload and payload.get("scope") == "events":
+        return payload.get("user_id")
+    return None
+
+
 def decode_jwt_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -45,25 +70,50 @@ def decode_jwt_token(token: str) -> Optional[dict]:
         return None
 
 
-async def get_current_user(request: Request, db) -> User:
-    """
-    Get current user from session token (cookie) or Authorization header.
-    """
-    # Try cookie first
+def get_session_token(request: Request) -> Optional[str]:
+    """Session token from the cookie, falling back to the Authorization header."""
     session_token = request.cookies.get("session_token")
-    
-    # Fallback to Authorization header
     if not session_token:
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             session_token = auth_header.split(" ")[1]
+    return session_token
+
+
+async def resolve_user_id(request: Request, db) -> Optional[str]:
+    """
+    User id behind the request's token without loading the user: JWTs are
+    decoded locally, sessions cost one indexed read. None if not authenticated.
+    """
+    session_token = get_session_token(request)
+    if not session_token:
+        return None
+    
+    payload = decode_jwt_token(session_token)
+    if payload and not payload.get("scope"):
+        return payload.get("user_id")
+    
+    session_doc = await db.user_sessions.find_one(
+        {"session_token": session_token},
+        {"_id": 0, "user_id": 1, "expires_at": 1}
+    )
+    if not session_doc or as_utc(session_doc.get("expires_at")) < datetime.now(timezone.utc):
+        return None
+    return session_doc["user_id"]
+
+
+async def get_current_user(request: Request, db) -> User:
+    """
+    Get current user from session token (cookie) or Authorization header.
+    """
+    session_token = get_session_token(request)
     
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     # Check if it's a JWT token
     payload = decode_jwt_token(session_token)
-    if payload:
+    if payload and not payload.get("scope"):
         user_id = payload.get("user_id")
         user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0})
         if not user_doc:
@@ -80,12 +130,7 @@ async def get_current_user(request: Request, db) -> User:
         raise HTTPException(status_code=401, detail="Invalid session")
     
     # Check expiry
-    expires_at = session_doc.get("expires_at")
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
+    expires_at = as_utc(session_doc.get("expires_at"))
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
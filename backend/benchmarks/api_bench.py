@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+VetFlow - API Benchmark Suite
+Boots the FastAPI app in-process against a local MongoDB (or mongomock-motor),
+seeds multi-tenant data (benchmarks/datagen.py), drives concurrent load through the key routes and the
+reminder job, and compares the results with stored baselines.
+
+Usage (from backend/):
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/api_bench.py --tenants 20 --customers 200
+    python benchmarks/api_bench.py --mongomock                         # no MongoDB needed
+    python benchmarks/api_bench.py --update-baseline                   # record baselines
+    python benchmarks/api_bench.py --only customers_list,pet_history
+
+Exits 1 when a scenario's p95 or throughput regresses beyond --tolerance
+against benchmarks/baselines.json (same --profile), and 2 when there is no
+baseline to compare with or it was recorded with other load settings.
+Baselines are machine specific: record them on the machine that runs the
+comparison. A baseline keeps the tolerance it was recorded with. The committed
+"mongomock" profile (the default with --mongomock) is the default settings run
+with --mongomock --tolerance 0.6: in-memory Mongo is noisy from run to run, so
+it only catches gross regressions such as a query going quadratic.
+
+Uses its own database (DB_NAME, default vetflow_bench), which is dropped first.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from webhook_bench import percentile, webhook_payload, REGISTERED_MESSAGES, UNREGISTERED_MESSAGES  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+DEFAULT_TOLERANCE = 0.2
+SEARCH_TERMS = ["Ah", "Me", "Yıl", "Ka", "Ze", "53", "0532"]
+
+SCENARIOS = (
+    "customers_list",
+    "customers_search",
+    "dashboard_stats",
+    "finance_summary",
+    "pet_history",
+    "webhook",
+    "reminder_job",
+)
+
+
+async def seed(db, args) -> dict:
+    """
+    Multi-tenant data from the synthetic generator (skewed clinic sizes, history,
+    reminders due within the reminder job's window).
+    Returns {user_id: {"pets": [...], "phones": [...]}}.
+    """
+    from datagen import GeneratorConfig, generate
+
+    config = GeneratorConfig(
+        clinics=args.tenants, customers=args.tenants * args.customers,
+        years=args.years, seed=args.seed
+    )
+    clinics = await generate(db, config, drop=True)
+    return {clinic.user_id: {"pets": clinic.pet_ids, "phones": clinic.phones} for clinic in clinics}
+
+
+def scenario_request(name: str, user_id: str, fixture: dict, rng: random.Random, index: int):
+    """(method, path, params, json) for one request of an HTTP scenario."""
+    if name == "customers_list":
+        return "GET", "/api/customers", None, None
+    if name == "customers_search":
+        return "GET", "/api/customers", {"search": rng.choice(SEARCH_TERMS)}, None
+    if name == "dashboard_stats":
+        return "GET", "/api/dashboard/stats", None, None
+    if name == "finance_summary":
+        return "GET", "/api/finance/summary", None, None
+    if name == "pet_history":
+        return "GET", f"/api/pets/{rng.choice(fixture['pets'])}/history", None, None
+    if name == "webhook":
+        if rng.random() < 0.7:
+            phone, text = rng.choice(fixture["phones"]), rng.choice(REGISTERED_MESSAGES)
+        else:
+            phone, text = f"90544{rng.randrange(10**7):07d}", rng.choice(UNREGISTERED_MESSAGES)
+        return "POST", "/api/whatsapp/webhook", None, webhook_payload(phone, text, f"wamid.apibench.{index}")
+    raise ValueError(name)
+
+
+async def run_http_scenario(client, name: str, tokens: dict, fixtures: dict, args, rng: random.Random) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tenants = list(fixtures)
+
+    async def one(index: int):
+        nonlocal errors
+        user_id = tenants[index % len(tenants)]
+        method, path, params, body = scenario_request(name, user_id, fixtures[user_id], rng, index)
+        headers = {"Authorization": f"Bearer {tokens[user_id]}"}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    # Warm-up: first requests pay for imports, index builds and cold caches
+    for i in range(min(args.warmup, args.requests)):
+        await one(-1 - i)
+    latencies.clear()
+    errors = 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_reminder_job(db, args) -> dict:
+    """Time check_and_send_reminders over the seeded due reminders, resetting them between runs."""
+    from scheduler import check_and_send_reminders
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.job_runs):
+        await db.reminders.update_many({}, {"$set": {"sent": False, "sent_at": None}})
+        run_started = time.perf_counter()
+        await check_and_send_reminders(db)
+        latencies.append(time.perf_counter() - run_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Regression messages for scenarios slower (p95) or lower in throughput than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']} req/s < baseline {base['rps']} req/s")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {result['errors']} errors > baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def baseline_settings(args) -> dict:
+    """Load settings a baseline was recorded with; comparisons need the same ones."""
+    return {name: getattr(args, name) for name in (
+        "tenants", "customers", "years", "requests", "concurrency", "warmup", "job_runs",
+        "llm_latency_ms", "seed", "mongomock"
+    )}
+
+
+def load_baselines() -> dict:
+    if BASELINE_PATH.exists():
+        return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+async def run(args) -> int:
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["LLM_STUB_SEED"] = str(args.seed)
+    os.environ.setdefault("DB_NAME", "vetflow_bench")
+    os.environ.setdefault("APP_ENV", "production")
+    if args.mongomock:
+        # Must happen before server creates its client
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+        os.environ.setdefault("MONGO_URL", "mongodb://mongomock")
+
+    import httpx
+    from server import app, db
+    from auth import create_jwt_token
+    from counters import ensure_counter_indexes
+    from subscription import ensure_subscription_indexes
+    from conversation import ensure_conversation_indexes
+    from versions import ensure_version_indexes
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    fixtures = await seed(db, args)
+    for ensure in (ensure_counter_indexes, ensure_subscription_indexes,
+                   ensure_conversation_indexes, ensure_version_indexes):
+        await ensure(db)
+    print(f"Seeded {args.tenants} tenants, {args.tenants * args.customers} customers "
+          f"in {time.perf_counter() - seed_started:.1f}s")
+
+    tokens = {user_id: create_jwt_token(user_id) for user_id in fixtures}
+    selected = args.only.split(",") if args.only else SCENARIOS
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for name in selected:
+            if name == "reminder_job":
+                results[name] = await run_reminder_job(db, args)
+            else:
+                results[name] = await run_http_scenario(client, name, tokens, fixtures, args, rng)
+            r = results[name]
+            print(f"{name:18} {r['requests']:6} req  {r['rps']:9.1f} req/s  p50 {r['p50_ms']:8.1f}  "
+                  f"p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  errors {r['errors']}")
+
+    if not args.keep_db:
+        await db.client.drop_database(db.name)
+
+    baselines = load_baselines()
+    settings = baseline_settings(args)
+    if args.update_baseline:
+        previous = baselines.get(args.profile, {})
+        kept = previous if previous.get("settings") == settings else {}
+        tolerance = args.tolerance if args.tolerance is not None else kept.get("tolerance", DEFAULT_TOLERANCE)
+        baselines[args.profile] = {**kept, **results, "settings": settings, "tolerance": tolerance}
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Baseline '{args.profile}' written to {BASELINE_PATH}")
+        return 0
+
+    baseline = baselines.get(args.profile)
+    if baseline is None:
+        print(f"No baseline for profile '{args.profile}' (run with --update-baseline)")
+        return 2
+    if baseline.get("settings") != settings:
+        print(f"Baseline '{args.profile}' was recorded with {baseline.get('settings')}, not {settings}")
+        return 2
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+    regressions = compare(results, baseline, tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions against baseline '{args.profile}' (tolerance {tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the VetFlow API in-process")
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=200, help="average customers per tenant")
+    parser.add_argument("--years", type=float, default=1.0, help="history to seed")
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--job-runs", type=int, default=3)
+    parser.add_argument("--only", default="", help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--profile", help="baseline name, one per machine (default: mongomock or default)")
+    parser.add_argument("--tolerance", type=float, help=f"default: the baseline's, else {DEFAULT_TOLERANCE}")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--keep-db", action="store_true")
+    args = parser.parse_args()
+    args.profile = args.profile or ("mongomock" if args.mongomock else "default")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+VetFlow - Synthetic Data Generator
+Seeds realistic multi-tenant volumes built from the real models: a few big
+clinics and a long tail of small ones, Turkish names and mobile numbers,
+years of seasonal appointment history, annual vaccine due dates, transactions
+and WhatsApp logs. Output is deterministic for a given --seed (dates are
+relative to the hour the generator runs).
+
+Usage (from backend/):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=vetflow_scale python benchmarks/datagen.py \
+        --clinics 5000 --customers 200000 --years 3 --parallel 8 --drop
+
+Used by benchmarks/api_bench.py; also handy for local profiling. Documents are
+added to the target database; --drop empties it first, which is refused for the
+API's own database (DB_NAME in backend/.env).
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+FIRST_NAMES = [
+    "Ahmet", "Mehmet", "Mustafa", "Ali", "Hüseyin", "Hasan", "İbrahim", "Murat", "Emre", "Burak",
+    "Can", "Cem", "Oğuz", "Serkan", "Volkan", "Kerem", "Onur", "Tolga", "Barış", "Uğur",
+    "Ayşe", "Fatma", "Emine", "Hatice", "Zeynep", "Elif", "Merve", "Büşra", "Esra", "Özlem",
+    "Selin", "Derya", "Gül", "Şeyma", "Ebru", "Deniz", "İrem", "Ceren", "Pınar", "Tuğba",
+]
+LAST_NAMES = [
+    "Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Yıldırım", "Öztürk", "Aydın", "Özdemir",
+    "Arslan", "Doğan", "Kılıç", "Aslan", "Çetin", "Kara", "Koç", "Kurt", "Özkan", "Şimşek",
+    "Polat", "Korkmaz", "Erdoğan", "Güneş", "Aksoy", "Tekin", "Bulut", "Kaplan", "Avcı", "Ünal",
+]
+CITIES = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya", "Eskişehir", "Konya", "Adana", "Kayseri", "Trabzon"]
+PET_NAMES = {
+    "dog": ["Karabaş", "Paşa", "Zeytin", "Boncuk", "Max", "Çomar", "Duman", "Rocky", "Lucky", "Fındık"],
+    "cat": ["Tekir", "Pamuk", "Minnoş", "Sarman", "Mırmır", "Boncuk", "Limon", "Zeytin", "Duman", "Şeker"],
+    "bird": ["Maviş", "Cikcik", "Limon", "Çiko"],
+    "rabbit": ["Pamuk", "Havuç", "Kartopu"],
+    "hamster": ["Fıstık", "Leblebi"],
+    "fish": ["Nemo", "Balon"],
+    "other": ["Tosbağa", "Dikenli"],
+}
+BREEDS = {
+    "dog": ["Golden Retriever", "Kangal", "Labrador", "Terrier", "Pomeranian", "Sokak köpeği"],
+    "cat": ["Tekir", "Van Kedisi", "British Shorthair", "Scottish Fold", "Sokak kedisi"],
+}
+SPECIES_WEIGHTS = {"dog": 45, "cat": 45, "bird": 4, "rabbit": 3, "hamster": 1, "fish": 1, "other": 1}
+APPOINTMENT_TITLES = ["Genel muayene", "Aşı", "Kontrol", "Kısırlaştırma", "Diş temizliği", "Tırnak kesimi"]
+VACCINES = ["Kuduz aşısı", "Karma aşı", "İç parazit", "Dış parazit", "Lösemi aşısı"]
+INCOME_CATEGORIES = ["Muayene", "Aşı", "Operasyon", "Mama satışı", "İlaç satışı"]
+EXPENSE_CATEGORIES = ["Kira", "Maaş", "Malzeme", "Elektrik", "Mama alımı"]
+INBOUND_TEXTS = [
+    "Merhaba, randevu almak istiyorum", "Aşı zamanı geldi mi?", "Çalışma saatleriniz nedir?",
+    "Kedim yemek yemiyor", "Teşekkürler", "Yarın uygun musunuz?",
+]
+# Spring vaccination season and early-autumn peak
+MONTH_WEIGHTS = [0.8, 0.8, 1.2, 1.4, 1.3, 1.0, 0.8, 0.8, 1.2, 1.1, 0.9, 0.7]
+# 09:00-18:00 Turkey time (UTC+3)
+OPENING_HOUR_UTC = 6
+CLOSING_HOUR_UTC = 15
+MOBILE_PREFIXES = [
+    "530", "531", "532", "533", "535", "536", "538", "539", "541", "542",
+    "543", "544", "545", "505", "506", "507", "552", "553", "554", "555",
+]
+
+
+@dataclass
+class GeneratorConfig:
+    clinics: int = 50
+    customers: int = 2000
+    pets_per_customer: float = 2.0
+    years: float = 2.0
+    appointments_per_pet_year: float = 2.5
+    messages_per_customer: float = 4.0
+    # Pareto shape for clinic sizes: lower means a heavier head of big clinics
+    size_skew: float = 1.2
+    batch_size: int = 1000
+    parallel: int = 4
+    seed: int = 42
+
+
+@dataclass
+class GeneratedClinic:
+    user_id: str
+    customer_count: int
+    pet_ids: List[str] = field(default_factory=list)
+    phones: List[str] = field(default_factory=list)
+
+
+def _id(rng: random.Random, prefix: str) -> str:
+    """Same shape as models.generate_id, but reproducible."""
+    return f"{prefix}{rng.getrandbits(48):012x}"
+
+
+def phone_for(index: int) -> str:
+    """Unique Turkish mobile number per global customer index (prefix, then a scrambled 7 digits)."""
+    prefix = MOBILE_PREFIXES[index % len(MOBILE_PREFIXES)]
+    number = (index // len(MOBILE_PREFIXES) * 7_654_321 + 1_234_567) % 10_000_000
+    return f"90{prefix}{number:07d}"
+
+
+def clinic_sizes(config: GeneratorConfig, rng: random.Random) -> List[int]:
+    """Split the customers over clinics following a Pareto curve (every clinic gets at least one)."""
+    weights = [rng.paretovariate(config.size_skew) for _ in range(config.clinics)]
+    total = sum(weights)
+    remaining = config.customers - config.clinics
+    sizes = [1 + int(remaining * w / total) for w in weights]
+    sizes[max(range(len(sizes)), key=sizes.__getitem__)] += config.customers - sum(sizes)
+    return sizes
+
+
+def app_db_name() -> Optional[str]:
+    """DB_NAME the API itself is configured with (backend/.env), if any."""
+    from dotenv import dotenv_values
+
+    return dotenv_values(BACKEND_DIR / ".env").get("DB_NAME")
+
+
+def _plan_for(size: int) -> str:
+    from subscription import SUBSCRIPTION_PLANS
+
+    for plan_id in ("starter", "professional"):
+        limit = SUBSCRIPTION_PLANS[plan_id].get("customer_limit")
+        if limit is not None and size <= limit:
+            return plan_id
+    return "unlimited"
+
+
+def _history_date(rng: random.Random, now: datetime, years: float, future_days: int = 30) -> datetime:
+    """A weekday business-hours slot in the last `years`, weighted by season."""
+    while True:
+        day = now - timedelta(days=rng.uniform(-future_days, years * 365))
+        if day.weekday() < 5 and rng.random() < MONTH_WEIGHTS[day.month - 1] / max(MONTH_WEIGHTS):
+            break
+    return day.replace(
+        hour=rng.randrange(OPENING_HOUR_UTC, CLOSING_HOUR_UTC),
+        minute=rng.choice((0, 15, 30, 45)), second=0, microsecond=0
+    )
+
+
+def build_clinic(config: GeneratorConfig, index: int, size: int, first_customer: int, now: datetime) -> Dict[str, List[Dict]]:
+    """All documents of one clinic. Each clinic has its own RNG, so output doesn't depend on batching."""
+    from models import (
+        User, AISettings, Customer, Pet, HealthRecord, Appointment, Transaction, Reminder,
+        WhatsAppMessage, AppointmentStatus, ReminderType, TransactionType
+    )
+    from codec import to_document
+
+    rng = random.Random(f"{config.seed}:{index}")
+    docs: Dict[str, List[Dict]] = {name: [] for name in (
+        "users", "ai_settings", "subscriptions", "customers", "pets", "health_records",
+        "appointments", "transactions", "reminders", "whatsapp_messages"
+    )}
+    created = now - timedelta(days=config.years * 365 + rng.uniform(0, 90))
+    city = rng.choice(CITIES)
+    owner = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+    user = User(
+        user_id=_id(rng, "user_"), email=f"klinik{index}@example.com", name=owner,
+        clinic_name=f"{city} {rng.choice(LAST_NAMES)} Veteriner Kliniği", created_at=created
+    )
+    user_id = user.user_id
+    docs["users"].append(to_document(user))
+    docs["ai_settings"].append(to_document(AISettings(
+        settings_id=_id(rng, "ai_"), user_id=user_id, clinic_info=f"{user.clinic_name}, {city}",
+        working_hours="Hafta içi 09:00-18:00", services=", ".join(rng.sample(APPOINTMENT_TITLES, 3)),
+        created_at=created, updated_at=created
+    )))
+    docs["subscriptions"].append({
+        "subscription_id": _id(rng, "sub_"),
+        "user_id": user_id,
+        "plan": _plan_for(size),
+        "status": "active",
+        "current_period_start": now - timedelta(days=rng.randint(0, 29)),
+        "current_period_end": now + timedelta(days=rng.randint(1, 30)),
+        "customer_count": size,
+        "unregistered_responses_used": rng.randint(0, 50),
+        "extra_responses_balance": 0,
+        "created_at": created,
+        "updated_at": now
+    })
+
+    species = list(SPECIES_WEIGHTS)
+    species_weights = list(SPECIES_WEIGHTS.values())
+    for c in range(size):
+        phone = phone_for(first_customer + c)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customer_created = created + timedelta(days=rng.uniform(0, (now - created).days))
+        customer = Customer(
+            customer_id=_id(rng, "cust_"), user_id=user_id, name=f"{first} {last}", phone=phone,
+            address=f"{rng.randint(1, 120)}. Sokak No:{rng.randint(1, 80)}, {city}",
+            created_at=customer_created, updated_at=customer_created
+        )
+        docs["customers"].append(to_document(customer))
+
+        # Mostly one or two pets, occasionally a multi-pet household
+        extra_pets = rng.expovariate(1 / max(config.pets_per_customer - 1, 0.01))
+        pet_count = min(8, 1 + round(extra_pets))
+        for _ in range(pet_count):
+            kind = rng.choices(species, species_weights)[0]
+            pet = Pet(
+                pet_id=_id(rng, "pet_"), customer_id=customer.customer_id, user_id=user_id,
+                name=rng.choice(PET_NAMES[kind]), species=kind,
+                breed=rng.choice(BREEDS[kind]) if kind in BREEDS else None,
+                birth_date=now - timedelta(days=rng.randint(60, 15 * 365)),
+                weight=round(rng.uniform(2, 40) if kind == "dog" else rng.uniform(0.05, 7), 1),
+                created_at=customer_created, updated_at=customer_created
+            )
+            docs["pets"].append(to_document(pet))
+
+            visits = max(0, int(rng.gauss(config.appointments_per_pet_year * config.years, 2)))
+            for _ in range(visits):
+                date = _history_date(rng, now, config.years)
+                if date > now:
+                    status = rng.choice((AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED))
+                else:
+                    status = rng.choices(
+                        (AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED, AppointmentStatus.NO_SHOW),
+                        (85, 10, 5)
+                    )[0]
+                title = rng.choice(APPOINTMENT_TITLES)
+                docs["appointments"].append(to_document(Appointment(
+                    appointment_id=_id(rng, "apt_"), user_id=user_id, customer_id=customer.customer_id,
+                    pet_id=pet.pet_id, title=title, date=date, status=status,
+                    duration_minutes=rng.choice((15, 30, 30, 45, 60)), reminder_sent=date < now,
+                    created_at=date - timedelta(days=rng.randint(0, 14)), updated_at=date
+                )))
+                if status == AppointmentStatus.COMPLETED:
+                    docs["transactions"].append(to_document(Transaction(
+                        transaction_id=_id(rng, "trx_"), user_id=user_id,
+                        transaction_type=TransactionType.INCOME, amount=round(rng.lognormvariate(6.5, 0.6), 2),
+                        category=rng.choice(INCOME_CATEGORIES), customer_id=customer.customer_id,
+                        date=date, created_at=date
+                    )))
+
+            # Annual vaccines: due dates cluster on the anniversary of each shot
+            if kind in ("dog", "cat"):
+                last_shot = _history_date(rng, now, 1, future_days=0)
+                vaccine = rng.choice(VACCINES)
+                due = last_shot + timedelta(days=365)
+                docs["health_records"].append(to_document(HealthRecord(
+                    record_id=_id(rng, "rec_"), pet_id=pet.pet_id, user_id=user_id,
+                    record_type="vaccination", title=vaccine, date=last_shot,
+                    next_due_date=due, cost=round(rng.uniform(300, 1500), 2), created_at=last_shot
+                )))
+                if due - now < timedelta(days=45):
+                    docs["reminders"].append(to_document(Reminder(
+                        reminder_id=_id(rng, "rem_"), user_id=user_id, customer_id=customer.customer_id,
+                        pet_id=pet.pet_id, reminder_type=ReminderType.VACCINATION,
+                        title=vaccine, message=f"{pet.name} için {vaccine} zamanı yaklaşıyor",
+                        due_date=due, sent=due < now, sent_at=due - timedelta(days=2) if due < now else None,
+                        created_at=last_shot
+                    )))
+
+        for _ in range(int(rng.expovariate(1 / config.messages_per_customer)) if config.messages_per_customer else 0):
+            sent = customer_created + timedelta(seconds=rng.uniform(0, (now - customer_created).total_seconds()))
+            inbound = rng.random() < 0.5
+            docs["whatsapp_messages"].append(to_document(WhatsAppMessage(
+                message_id=_id(rng, "msg_"), user_id=user_id,
+                direction="inbound" if inbound else "outbound", phone_number=phone,
+                message_text=rng.choice(INBOUND_TEXTS) if inbound else "Randevunuz oluşturuldu.",
+                status="received" if inbound else rng.choice(("sent", "delivered", "read")),
+                customer_id=customer.customer_id, created_at=sent
+            )))
+
+    # Monthly running costs
+    month = created.replace(day=1, hour=9, minute=0, second=0, microsecond=0)
+    while month < now:
+        for category in rng.sample(EXPENSE_CATEGORIES, 2):
+            docs["transactions"].append(to_document(Transaction(
+                transaction_id=_id(rng, "trx_"), user_id=user_id, transaction_type=TransactionType.EXPENSE,
+                amount=round(rng.uniform(2000, 40000) * (1 + size / 500), 2), category=category,
+                date=month + timedelta(days=rng.randint(0, 27)), created_at=month
+            )))
+        month = (month + timedelta(days=32)).replace(day=1)
+
+    return docs
+
+
+async def generate(db, config: GeneratorConfig, drop: bool = False, progress: bool = False) -> List[GeneratedClinic]:
+    """
+    Generate and insert the whole dataset. Batches of `batch_size` documents are
+    written with unordered insert_many, up to `parallel` batches in flight.
+    Tenant counters are reconciled at the end so dashboards match the data.
+    With drop=True the database is emptied first, unless it is the API's own.
+    """
+    from counters import reconcile_all_tenant_counters
+
+    if drop:
+        if db.name == app_db_name():
+            raise ValueError(f"Refusing to drop {db.name}: it is the API's database (backend/.env)")
+        await db.client.drop_database(db.name)
+
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    sizes = clinic_sizes(config, random.Random(config.seed))
+    semaphore = asyncio.Semaphore(config.parallel)
+    pending = set()
+    buffers: Dict[str, List[Dict]] = {}
+    totals: Dict[str, int] = {}
+    clinics: List[GeneratedClinic] = []
+
+    async def insert(collection: str, batch: List[Dict]):
+        try:
+            await db[collection].insert_many(batch, ordered=False)
+        finally:
+            semaphore.release()
+
+    async def submit(collection: str, batch: List[Dict]):
+        await semaphore.acquire()
+        task = asyncio.create_task(insert(collection, batch))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        totals[collection] = totals.get(collection, 0) + len(batch)
+
+    started = time.perf_counter()
+    first_customer = 0
+    for index, size in enumerate(sizes):
+        docs = build_clinic(config, index, size, first_customer, now)
+        first_customer += size
+        clinics.append(GeneratedClinic(
+            user_id=docs["users"][0]["user_id"],
+            customer_count=size,
+            pet_ids=[p["pet_id"] for p in docs["pets"]],
+            phones=[c["phone"] for c in docs["customers"]],
+        ))
+        for collection, items in docs.items():
+            buffer = buffers.setdefault(collection, [])
+            buffer.extend(items)
+            while len(buffer) >= config.batch_size:
+                batch = buffer[:config.batch_size]
+                del buffer[:config.batch_size]
+                await submit(collection, batch)
+        if progress and (index + 1) % 100 == 0:
+            print(f"  {index + 1}/{len(sizes)} clinics, {first_customer} customers "
+                  f"({time.perf_counter() - started:.0f}s)")
+
+    for collection, buffer in buffers.items():
+        if buffer:
+            await submit(collection, buffer)
+    if pending:
+        await asyncio.gather(*pending)
+
+    await reconcile_all_tenant_counters(db)
+    if progress:
+        for collection, count in sorted(totals.items()):
+            print(f"  {collection:18} {count}")
+    return clinics
+
+
+async def run(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    db = client[os.environ.get("DB_NAME", "vetflow_scale")]
+    config = GeneratorConfig(
+        clinics=args.clinics, customers=args.customers, pets_per_customer=args.pets_per_customer,
+        years=args.years, messages_per_customer=args.messages_per_customer, size_skew=args.skew,
+        batch_size=args.batch_size, parallel=args.parallel, seed=args.seed
+    )
+    started = time.perf_counter()
+    print(f"Generating {config.clinics} clinics / {config.customers} customers into {db.name} (seed {config.seed})")
+    clinics = await generate(db, config, drop=args.drop, progress=True)
+    biggest = max(c.customer_count for c in clinics)
+    print(f"Done in {time.perf_counter() - started:.1f}s; largest clinic has {biggest} customers")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed realistic multi-tenant VetFlow data")
+    parser.add_argument("--clinics", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=2000, help="total across all clinics")
+    parser.add_argument("--pets-per-customer", type=float, default=2.0)
+    parser.add_argument("--years", type=float, default=2.0, help="appointment and transaction history")
+    parser.add_argument("--messages-per-customer", type=float, default=4.0)
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto shape of clinic sizes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--parallel", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="drop the target database first")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+VetFlow - WhatsApp Webhook Load Benchmark
+Drives simulated WhatsApp conversations through /api/whatsapp/webhook
+in-process, with the LLM replaced by the local stub (or a replay file),
+and reports throughput and tail latency.
+
+Usage (from backend/):
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/webhook_bench.py \
+        --conversations 2000 --turns 4 --concurrency 64 --llm-latency-ms 800
+
+Uses its own database (DB_NAME, default vetflow_bench), which is dropped first.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+REGISTERED_MESSAGES = [
+    "Yarın 14:00 aşı için randevu almak istiyorum",
+    "Cuma saat 10:30 kontrol randevusu alabilir miyim?",
+    "Merhaba, köpeğim dün akşamdan beri yemek yemiyor, ne yapmalıyım?",
+    "Evet",
+    "Haftaya salı muayene için gelmek istiyorum, öğleden sonra uygun mu?",
+]
+UNREGISTERED_MESSAGES = [
+    "Çalışma saatleriniz nedir?",
+    "Kedi aşısı ne kadar?",
+    "Pazar günü açık mısınız?",
+    "Kısırlaştırma operasyonu fiyatı nedir?",
+    "Adresiniz nerede?",
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def webhook_payload(phone: str, text: str, message_id: str) -> dict:
+    return {
+        "entry": [{
+            "changes": [{
+                "value": {
+                    "contacts": [{"profile": {"name": "Bench"}}],
+                    "messages": [{
+                        "id": message_id,
+                        "from": phone,
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+async def seed(db, user_id: str, registered_phones):
+    """One tenant on the unlimited plan with a registered customer (and pet) per phone."""
+    from models import AISettings, Customer, Pet
+    from subscription import generate_subscription_id
+
+    now = datetime.now(timezone.utc)
+    await db.client.drop_database(db.name)
+
+    await db.users.insert_one({
+        "user_id": user_id, "email": "bench@vetflow.local", "name": "Bench",
+        "clinic_name": "Bench Klinik", "created_at": now
+    })
+
+    settings = AISettings(
+        user_id=user_id,
+        clinic_info="Bench Veteriner Kliniği",
+        working_hours="Hafta içi 09:00-18:00",
+        services="Muayene, Aşı, Kısırlaştırma"
+    ).model_dump()
+    await db.ai_settings.insert_one(settings)
+
+    await db.subscriptions.insert_one({
+        "subscription_id": generate_subscription_id(),
+        "user_id": user_id,
+        "plan": "unlimited",
+        "status": "active",
+        "current_period_start": now,
+        "current_period_end": now + timedelta(days=30),
+        "customer_count": len(registered_phones),
+        "unregistered_responses_used": 0,
+        "extra_responses_balance": 10_000_000,
+        "created_at": now,
+        "updated_at": now
+    })
+
+    customers, pets = [], []
+    for i, phone in enumerate(registered_phones):
+        customer = Customer(user_id=user_id, name=f"Müşteri {i}", phone=phone).model_dump()
+        pet = Pet(user_id=user_id, customer_id=customer["customer_id"], name=f"Pati {i}", species="dog").model_dump()
+        customers.append(customer)
+        pets.append(pet)
+    for i in range(0, len(customers), 1000):
+        await db.customers.insert_many(customers[i:i + 1000])
+        await db.pets.insert_many(pets[i:i + 1000])
+
+
+async def run(args):
+    os.environ["LLM_BACKEND"] = args.llm_backend
+    os.environ["LLM_STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["LLM_STUB_JITTER_MS"] = str(args.llm_jitter_ms)
+    os.environ["LLM_STUB_ERROR_RATE"] = str(args.llm_error_rate)
+    os.environ["LLM_STUB_SEED"] = str(args.seed)
+    if args.replay_path:
+        os.environ["LLM_REPLAY_PATH"] = args.replay_path
+    os.environ.setdefault("DB_NAME", "vetflow_bench")
+
+    import httpx
+    from server import app, db
+    from counters import ensure_counter_indexes
+    from subscription import ensure_subscription_indexes
+    from conversation import ensure_conversation_indexes
+    from llm_gateway import get_gateway_stats
+
+    rng = random.Random(args.seed)
+    user_id = "user_bench"
+    registered = [f"90555{i:07d}" for i in range(int(args.conversations * args.registered_share))]
+    unregistered = [f"90544{i:07d}" for i in range(args.conversations - len(registered))]
+
+    await seed(db, user_id, registered)
+    await ensure_counter_indexes(db)
+    await ensure_subscription_indexes(db)
+    await ensure_conversation_indexes(db)
+
+    conversations = [(phone, REGISTERED_MESSAGES) for phone in registered]
+    conversations += [(phone, UNREGISTERED_MESSAGES) for phone in unregistered]
+    rng.shuffle(conversations)
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def conversation(index, phone, messages):
+            nonlocal errors
+            async with semaphore:
+                for turn in range(args.turns):
+                    text = messages[rng.randrange(len(messages))]
+                    payload = webhook_payload(phone, text, f"wamid.bench.{index}.{turn}")
+                    started = time.perf_counter()
+                    response = await client.post("/api/whatsapp/webhook", json=payload)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            conversation(i, phone, messages) for i, (phone, messages) in enumerate(conversations)
+        ))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    gateway = get_gateway_stats()
+    print(f"Conversations:   {len(conversations)} x {args.turns} turns "
+          f"({len(registered)} registered, {len(unregistered)} unregistered)")
+    print(f"LLM backend:     {args.llm_backend} (latency {args.llm_latency_ms}±{args.llm_jitter_ms} ms, "
+          f"error rate {args.llm_error_rate})")
+    print(f"Requests:        {len(latencies)} in {elapsed:.2f}s -> {len(latencies) / elapsed:.1f} req/s")
+    print(f"Errors:          {errors}")
+    for pct in (50, 95, 99):
+        print(f"p{pct}:             {percentile(latencies, pct) * 1000:.1f} ms")
+    print(f"max:             {latencies[-1] * 1000:.1f} ms" if latencies else "max: -")
+    print(f"LLM calls:       {gateway['outcomes']} (circuit {gateway['circuit']})")
+
+    if not args.keep_db:
+        await db.client.drop_database(db.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the WhatsApp webhook with a local LLM stand-in")
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--registered-share", type=float, default=0.7)
+    parser.add_argument("--llm-backend", default="stub", choices=["stub", "replay"])
+    parser.add_argument("--replay-path", default=None)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-db", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
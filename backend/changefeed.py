@@ -0,0 +1,211 @@
+"""
+VetFlow - Change Feed Module
+Mongo change-stream consumer that keeps every API worker's in-process caches
+and live-event subscribers in sync with writes made by any worker.
+
+Change streams need a replica set; locally a single node is enough:
+    mongod --replSet rs0 --dbpath ./data && mongosh --eval "rs.initiate()"
+    MONGO_URL="mongodb://localhost:27017/?replicaSet=rs0"
+"""
+import os
+import socket
+import asyncio
+import time
+from typing import Dict
+from pymongo.errors import OperationFailure, PyMongoError
+import logging
+
+from dates import utc_now
+from events import get_broker, public_payload, set_feed_event_types, RESYNC_EVENT
+from versions import invalidate_versions
+from tenant_context import invalidate_tenant_context
+from response_cache import invalidate_answer_cache
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_ENABLED = os.environ.get("CHANGE_FEED_ENABLED", "true").lower() != "false"
+# Resume tokens are stored per worker process. The default includes the PID so
+# workers on one host never share a token; a new process starts from "now", which
+# is fine as its caches start empty. Give each worker its own stable
+# CHANGE_FEED_ID to resume across process restarts.
+CHANGE_FEED_ID = os.environ.get("CHANGE_FEED_ID", f"api-{socket.gethostname()}-{os.getpid()}")
+# Tokens left behind by exited workers are removed after this long
+RESUME_TOKEN_TTL_SECONDS = 7 * 24 * 3600
+RESUME_TOKEN_SAVE_SECONDS = float(os.environ.get("RESUME_TOKEN_SAVE_SECONDS", "5"))
+CHANGE_FEED_RETRY_SECONDS = 5
+CHANGE_FEED_MAX_RETRY_SECONDS = 60
+
+# Server error codes meaning change streams will never work here (standalone server,
+# unsupported topology), so the feed stays off and local publishing carries on
+_UNSUPPORTED_CODES = {40573, 40324}
+# The stored resume token fell off the oplog
+_HISTORY_LOST_CODES = {280, 286}
+
+WATCHED_COLLECTIONS = (
+    "tenant_versions",
+    "subscriptions",
+    "ai_settings",
+    "faq_entries",
+    "whatsapp_messages",
+    "appointments",
+)
+
+# Event types the feed derives (see events.set_feed_event_types)
+FEED_EVENT_TYPES = frozenset({
+    "message.created", "message.status", "appointment.created", "appointment.updated"
+})
+
+_state: Dict = {"running": False, "pre_images": False, "processed": 0, "restarts": 0}
+
+
+def _pipeline():
+    return [{"$match": {
+        "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }}]
+
+
+def invalidate_all():
+    """Forget everything cached in-process; used when changes may have been missed."""
+    invalidate_versions()
+    invalidate_tenant_context()
+    invalidate_answer_cache()
+
+
+def handle_change(change: Dict):
+    """Apply one change event to the in-process caches and event subscribers."""
+    collection = change["ns"]["coll"]
+    operation = change["operationType"]
+    doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange")
+    user_id = (doc or {}).get("user_id")
+
+    if collection == "tenant_versions":
+        invalidate_versions(user_id)
+    elif collection in ("subscriptions", "ai_settings"):
+        # Prompt, answer-index and chat-session caches are keyed on the settings version
+        invalidate_tenant_context(user_id)
+    elif collection == "faq_entries":
+        invalidate_answer_cache(user_id)
+
+    if not user_id:
+        return
+    broker = get_broker()
+
+    if collection == "whatsapp_messages":
+        if operation == "insert":
+            broker.publish(user_id, "message.created", public_payload(doc))
+        elif operation == "update":
+            updated = change.get("updateDescription", {}).get("updatedFields", {})
+            if "status" in updated:
+                broker.publish(user_id, "message.status", {
+                    "message_id": doc.get("message_id"),
+                    "status": updated["status"]
+                })
+
+    elif collection == "appointments":
+        if operation == "insert":
+            broker.publish(user_id, "appointment.created", public_payload(doc))
+        elif operation in ("update", "replace"):
+            broker.publish(user_id, "appointment.updated", public_payload(doc))
+        elif operation == "delete":
+            broker.publish(user_id, "appointment.deleted", {"appointment_id": doc.get("appointment_id")})
+
+
+async def _enable_pre_images(db) -> bool:
+    """
+    Deletes only carry the document key, so appointment deletions need pre-images
+    (MongoDB 6.0+) to be attributed to a tenant. Without them deletes stay local.
+    """
+    try:
+        await db.command({"collMod": "appointments", "changeStreamPreAndPostImages": {"enabled": True}})
+        return True
+    except PyMongoError as e:
+        logger.info(f"Change stream pre-images unavailable, appointment deletes stay local: {e}")
+        return False
+
+
+async def _load_resume_token(db):
+    doc = await db.change_feed_tokens.find_one({"_id": CHANGE_FEED_ID})
+    return (doc or {}).get("token")
+
+
+async def _save_resume_token(db, token):
+    await db.change_feed_tokens.update_one(
+        {"_id": CHANGE_FEED_ID},
+        {"$set": {"token": token, "updated_at": utc_now()}},
+        upsert=True
+    )
+
+
+async def _consume(db, resume_token):
+    options = {"full_document": "updateLookup"}
+    if _state["pre_images"]:
+        options["full_document_before_change"] = "whenAvailable"
+
+    async with db.watch(_pipeline(), resume_after=resume_token, **options) as stream:
+        event_types = FEED_EVENT_TYPES | ({"appointment.deleted"} if _state["pre_images"] else set())
+        set_feed_event_types(event_types)
+        _state["running"] = True
+        logger.info(f"Change feed {CHANGE_FEED_ID} started (resumed: {resume_token is not None})")
+
+        last_saved = time.monotonic()
+        try:
+            async for change in stream:
+                try:
+                    handle_change(change)
+                except Exception as e:
+                    logger.error(f"Change feed handler error: {e}")
+                _state["processed"] += 1
+
+                if time.monotonic() - last_saved >= RESUME_TOKEN_SAVE_SECONDS:
+                    await _save_resume_token(db, stream.resume_token)
+                    last_saved = time.monotonic()
+        finally:
+            _state["running"] = False
+            set_feed_event_types(frozenset())
+            if stream.resume_token is not None:
+                await _save_resume_token(db, stream.resume_token)
+
+
+async def run_change_feed(db):
+    """
+    Consume the change stream until cancelled, reconnecting with backoff.
+    Standalone servers (no replica set) can't serve change streams: the feed then
+    stays off and each worker relies on its own cache TTLs and local events.
+    """
+    if not CHANGE_FEED_ENABLED:
+        return
+
+    await db.change_feed_tokens.create_index("updated_at", expireAfterSeconds=RESUME_TOKEN_TTL_SECONDS)
+    _state["pre_images"] = await _enable_pre_images(db)
+    delay = CHANGE_FEED_RETRY_SECONDS
+    while True:
+        resume_token = await _load_resume_token(db)
+        try:
+            await _consume(db, resume_token)
+            delay = CHANGE_FEED_RETRY_SECONDS
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in _UNSUPPORTED_CODES:
+                logger.warning(f"Change streams not supported by this MongoDB deployment, feed disabled: {e}")
+                return
+            if e.code in _HISTORY_LOST_CODES:
+                logger.warning("Change feed resume token expired, restarting from now")
+                await db.change_feed_tokens.delete_one({"_id": CHANGE_FEED_ID})
+            else:
+                logger.error(f"Change feed error: {e}")
+        except PyMongoError as e:
+            logger.error(f"Change feed connection error: {e}")
+
+        # Anything may have changed while the feed was down
+        _state["restarts"] += 1
+        invalidate_all()
+        for user_id in list(get_broker().subscribers):
+            get_broker().publish(user_id, RESYNC_EVENT, {})
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, CHANGE_FEED_MAX_RETRY_SECONDS)
+
+
+def get_change_feed_stats() -> Dict:
+    return dict(_state, feed_id=CHANGE_FEED_ID)
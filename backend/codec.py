@@ -0,0 +1,98 @@
+"""
+VetFlow - Document Codec Module
+One place that maps models to Mongo documents and back, and turns stored
+documents into response JSON without a second validation pass
+"""
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Dict, List, Type
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from dates import utc_now
+
+# ORJSONResponse only fails at render time without orjson, so check for it up front
+FastJSONResponse = ORJSONResponse if find_spec("orjson") else JSONResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Documents per Mongo batch when streaming, so the first line goes out early
+NDJSON_BATCH_SIZE = 100
+
+
+class DocumentCodec:
+    """
+    Codec for one stored model.
+    Documents written through encode() already match the model, so list reads
+    projected with `projection` can be serialized directly by dump_json()
+    instead of being re-validated through response_model.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        fields = model.model_fields
+        self.projection = {"_id": 0, **{name: 1 for name in fields}}
+        # Plain defaults filled in for older documents written before a field existed
+        self._defaults = {
+            name: field.default
+            for name, field in fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        self._tracks_updates = "updated_at" in fields
+
+    def encode(self, instance: BaseModel) -> Dict:
+        """Model -> document to insert. Dates stay native datetimes."""
+        return instance.model_dump()
+
+    def decode(self, doc: Dict) -> BaseModel:
+        """Document -> model."""
+        return self.model.model_validate(doc)
+
+    def update(self, data: BaseModel) -> Dict:
+        """Partial update model -> $set document: the fields that were sent, plus updated_at."""
+        update = {k: v for k, v in data.model_dump().items() if v is not None}
+        if self._tracks_updates:
+            update["updated_at"] = utc_now()
+        return update
+
+    def _fill_defaults(self, doc: Dict) -> Dict:
+        for name, default in self._defaults.items():
+            if name not in doc:
+                doc[name] = default
+        return doc
+
+    def dump_json(self, docs: List[Dict]) -> bytes:
+        """Serialize projected documents as a JSON array without validating them."""
+        if self._defaults:
+            for doc in docs:
+                self._fill_defaults(doc)
+        return to_json(docs)
+
+    def list_response(self, docs: List[Dict]) -> Response:
+        """JSON response for a list endpoint; FastAPI skips response_model validation for Response objects."""
+        return Response(content=self.dump_json(docs), media_type="application/json")
+
+    def stream_ndjson(self, cursor) -> StreamingResponse:
+        """Stream one JSON document per line as the Motor cursor yields them."""
+        async def lines():
+            async for doc in cursor.batch_size(NDJSON_BATCH_SIZE):
+                yield to_json(self._fill_defaults(doc)) + b"\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True when the client asked for newline-delimited JSON (Accept: application/x-ndjson)."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+@lru_cache(maxsize=None)
+def get_codec(model: Type[BaseModel]) -> DocumentCodec:
+    return DocumentCodec(model)
+
+
+def to_document(instance: BaseModel) -> Dict:
+    """Encode any stored model instance with its codec."""
+    return get_codec(type(instance)).encode(instance)
@@ -0,0 +1,158 @@
+"""
+VetFlow - WhatsApp Conversation Memory Module
+Bounded conversation history from whatsapp_messages and per-thread state
+(rolling summary, pending appointment proposals)
+"""
+import os
+import re
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+import logging
+
+from dates import as_utc
+
+logger = logging.getLogger(__name__)
+
+# Turns passed verbatim to the model
+CONVERSATION_MAX_TURNS = int(os.environ.get("CONVERSATION_MAX_TURNS", "8"))
+# Older turns (loaded in the same query) folded into a one-line-per-turn summary
+CONVERSATION_SUMMARY_TURNS = int(os.environ.get("CONVERSATION_SUMMARY_TURNS", "12"))
+SUMMARY_SNIPPET_CHARS = 80
+PENDING_PROPOSAL_HOURS = 24
+
+# A confirmation is the whole reply: yes/no words plus optional politeness words.
+# Anything else ("evet ama 15:00 olsun") goes to the booking parser or the model.
+_POLITE = r"(?:l[uü]tfen|te[sş]ekk[uü]rler|te[sş]ekk[uü]r ederim|sa[gğ]ol(?:un)?|peki|o zaman|hocam|efendim)"
+_YES_WORDS = r"(?:evet|olur|tamam|tamamd[iı]r|uygun|onayl[iı]yorum|kabul(?: ediyorum)?|isterim|ok|okey)"
+_NO_WORDS = r"(?:hay[iı]r|olmaz|istemiyorum|uygun de[gğ]il|vazge[cç]tim|iptal)"
+_YES = re.compile(rf"^(?:{_POLITE} )*{_YES_WORDS}(?: (?:{_YES_WORDS}|{_POLITE}))*$")
+_NO = re.compile(rf"^(?:{_POLITE} )*{_NO_WORDS}(?: (?:{_NO_WORDS}|{_POLITE}))*$")
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+async def ensure_conversation_indexes(db):
+    """Create indexes for thread history reads and thread state lookups."""
+    await db.whatsapp_messages.create_index([("user_id", 1), ("phone_number", 1), ("created_at", -1)])
+    await db.conversation_states.create_index([("user_id", 1), ("phone_number", 1)], unique=True)
+
+
+def _summarize(messages: List[Dict]) -> Optional[str]:
+    """Compress older turns to short role-tagged snippets."""
+    if not messages:
+        return None
+    lines = []
+    for msg in messages:
+        speaker = "Müşteri" if msg.get("direction") == "inbound" else "Asistan"
+        text = " ".join((msg.get("message_text") or "").split())
+        if len(text) > SUMMARY_SNIPPET_CHARS:
+            text = text[:SUMMARY_SNIPPET_CHARS].rstrip() + "…"
+        lines.append(f"- {speaker}: {text}")
+    return "\n".join(lines)
+
+
+async def load_conversation(
+    db,
+    user_id: str,
+    phone: str,
+    exclude_message_id: Optional[str] = None
+) -> List[Dict]:
+    """
+    Load the recent thread in one query.
+    Returns chat turns oldest first: [{"role": "user" | "assistant" | "summary", "content": str}]
+    The newest CONVERSATION_MAX_TURNS turns are verbatim; up to
+    CONVERSATION_SUMMARY_TURNS older ones are folded into a single summary turn.
+    """
+    query = {"user_id": user_id, "phone_number": phone}
+    if exclude_message_id:
+        query["message_id"] = {"$ne": exclude_message_id}
+
+    limit = CONVERSATION_MAX_TURNS + CONVERSATION_SUMMARY_TURNS
+    recent = await db.whatsapp_messages.find(
+        query,
+        {"_id": 0, "direction": 1, "message_text": 1, "created_at": 1}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    recent.reverse()
+
+    older = recent[:-CONVERSATION_MAX_TURNS] if len(recent) > CONVERSATION_MAX_TURNS else []
+    window = recent[-CONVERSATION_MAX_TURNS:]
+
+    history = []
+    summary = _summarize(older)
+    if summary:
+        history.append({"role": "summary", "content": summary})
+    for msg in window:
+        history.append({
+            "role": "user" if msg.get("direction") == "inbound" else "assistant",
+            "content": msg.get("message_text") or ""
+        })
+    return history
+
+
+def format_history(history: List[Dict]) -> str:
+    """Render history as a transcript block to prepend to the user's message."""
+    lines = []
+    for turn in history:
+        if turn["role"] == "summary":
+            lines.append(f"Önceki konuşmanın özeti:\n{turn['content']}")
+        else:
+            speaker = "Müşteri" if turn["role"] == "user" else "Asistan"
+            lines.append(f"{speaker}: {turn['content']}")
+    return "\n".join(lines)
+
+
+def classify_confirmation(text: str) -> Optional[str]:
+    """
+    Classify a bare reply to a proposal. Returns "yes", "no" or None.
+    Replies carrying anything else (a time, a date, a condition) are None.
+    """
+    normalized = " ".join(_PUNCTUATION.sub(" ", text.replace("I", "ı").replace("İ", "i").lower()).split())
+    if not normalized or len(normalized) > 60:
+        return None
+    if _NO.match(normalized):
+        return "no"
+    if _YES.match(normalized):
+        return "yes"
+    return None
+
+
+async def get_pending_appointment(db, user_id: str, phone: str) -> Optional[Dict]:
+    """Get the unexpired appointment proposal offered in this thread, if any."""
+    state = await db.conversation_states.find_one(
+        {"user_id": user_id, "phone_number": phone},
+        {"_id": 0, "pending_appointment": 1}
+    )
+    pending = (state or {}).get("pending_appointment")
+    if not pending:
+        return None
+
+    if as_utc(pending["expires_at"]) < datetime.now(timezone.utc):
+        return None
+    return pending
+
+
+async def save_pending_appointment(db, user_id: str, phone: str, proposal: Dict):
+    """
+    Remember an offered slot so a plain "Evet" can book it without another LLM parse.
+    proposal: {"date", "time", "service", "customer_id", "pet_id"}
+    """
+    now = datetime.now(timezone.utc)
+    await db.conversation_states.update_one(
+        {"user_id": user_id, "phone_number": phone},
+        {"$set": {
+            "pending_appointment": {
+                **proposal,
+                "expires_at": now + timedelta(hours=PENDING_PROPOSAL_HOURS)
+            },
+            "updated_at": now
+        }},
+        upsert=True
+    )
+
+
+async def clear_pending_appointment(db, user_id: str, phone: str):
+    """Drop the thread's pending proposal after it was accepted or declined."""
+    await db.conversation_states.update_one(
+        {"user_id": user_id, "phone_number": phone},
+        {"$unset": {"pending_appointment": ""},
+         "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
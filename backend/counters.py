@@ -0,0 +1,203 @@
+"""
+VetFlow - Tenant Counters Module
+Denormalized per-tenant document counts maintained with atomic $inc
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional, Tuple
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Counter field -> collection it mirrors
+COUNTED_COLLECTIONS = {
+    "customers": "customers",
+    "pets": "pets",
+    "appointments": "appointments",
+    "messages": "whatsapp_messages"
+}
+
+# Every counter write bumps `revision`; a recount only overwrites the counter if the
+# revision it read before counting is still current.
+# A slot is reserved ($inc) before its insert lands, so a recount taken right after a
+# counter write can miss documents still in flight. The daily reconcile leaves tenants
+# whose counters moved this recently for the next run.
+RECONCILE_QUIET_SECONDS = 300
+# Imports reserve slots batch by batch; their tenants are skipped until the import ends
+ACTIVE_IMPORT_STATUSES = ["pending", "parsing", "importing"]
+# A running import saves progress after every chunk; an active job not updated for
+# this long was orphaned by a worker restart and no longer holds back the reconcile
+IMPORT_STALE_SECONDS = 600
+
+
+async def ensure_counter_indexes(db):
+    """Create the unique tenant index used by every counter update."""
+    await db.tenant_counters.create_index("user_id", unique=True)
+
+
+def _revision_filter(doc: Optional[Dict]):
+    """Match the counter revision seen in doc (documents written before revisions have none)."""
+    revision = doc.get("revision") if doc else None
+    return revision if revision is not None else {"$exists": False}
+
+
+async def reconcile_tenant_counters(db, user_id: str) -> Dict:
+    """
+    Recount all mirrored collections for one tenant and overwrite the counter document.
+    The overwrite only applies if no counter write happened during the count
+    (keyed on the revision read beforehand); otherwise the concurrent write wins.
+    Returns the counter document.
+    """
+    before = await db.tenant_counters.find_one({"user_id": user_id}, {"_id": 0, "revision": 1})
+    unchanged = {"user_id": user_id, "revision": _revision_filter(before)}
+
+    counts = {}
+    for field, collection in COUNTED_COLLECTIONS.items():
+        counts[field] = await db[collection].count_documents({"user_id": user_id})
+
+    now = datetime.now(timezone.utc)
+    try:
+        doc = await db.tenant_counters.find_one_and_update(
+            unchanged,
+            {"$set": {**counts, "reconciled_at": now, "updated_at": now}, "$inc": {"revision": 1}},
+            upsert=True,
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The counter document changed (or was created) while we counted
+        doc = None
+    return doc or await db.tenant_counters.find_one({"user_id": user_id}, {"_id": 0})
+
+
+async def reconcile_all_tenant_counters(db):
+    """
+    Recount every tenant's documents with one $group per collection and bulk-write the results.
+    Runs daily to repair any drift left by failed writes.
+    Each overwrite is conditional on the counter's revision read before counting;
+    tenants with recent counter writes or a running import are left for the next run.
+    """
+    try:
+        started = datetime.now(timezone.utc)
+        quiet_since = started - timedelta(seconds=RECONCILE_QUIET_SECONDS)
+        snapshot = {}
+        async for doc in db.tenant_counters.find({}, {"_id": 0, "user_id": 1, "revision": 1, "updated_at": 1}):
+            snapshot[doc["user_id"]] = doc
+        importing = set(await db.import_jobs.distinct("user_id", {
+            "status": {"$in": ACTIVE_IMPORT_STATUSES},
+            "updated_at": {"$gte": started - timedelta(seconds=IMPORT_STALE_SECONDS)}
+        }))
+
+        totals: Dict[str, Dict[str, int]] = {}
+
+        for field, collection in COUNTED_COLLECTIONS.items():
+            pipeline = [{"$group": {"_id": "$user_id", "count": {"$sum": 1}}}]
+            async for row in db[collection].aggregate(pipeline):
+                if row["_id"] is None:
+                    continue
+                totals.setdefault(row["_id"], {f: 0 for f in COUNTED_COLLECTIONS})[field] = row["count"]
+
+        # Tenants whose documents were all deleted still need zeroed counters
+        for user_id in snapshot:
+            totals.setdefault(user_id, {f: 0 for f in COUNTED_COLLECTIONS})
+
+        if not totals:
+            return
+
+        now = datetime.now(timezone.utc)
+        operations = []
+        skipped = 0
+        for user_id, counts in totals.items():
+            if user_id in importing:
+                skipped += 1
+            elif user_id not in snapshot:
+                # No counter yet: seed it unless a write created one meanwhile
+                operations.append(UpdateOne(
+                    {"user_id": user_id},
+                    {"$setOnInsert": {**counts, "reconciled_at": now, "updated_at": now, "revision": 1}},
+                    upsert=True
+                ))
+            elif snapshot[user_id].get("updated_at") and snapshot[user_id]["updated_at"] > quiet_since:
+                skipped += 1
+            else:
+                # Matches nothing if a reservation or release landed after the snapshot
+                operations.append(UpdateOne(
+                    {"user_id": user_id, "revision": _revision_filter(snapshot[user_id])},
+                    {"$set": {**counts, "reconciled_at": now, "updated_at": now}, "$inc": {"revision": 1}}
+                ))
+
+        for i in range(0, len(operations), 1000):
+            await db.tenant_counters.bulk_write(operations[i:i + 1000], ordered=False)
+
+        logger.info(f"Tenant counters reconciled for {len(operations)} tenants ({skipped} busy, skipped)")
+
+    except Exception as e:
+        logger.error(f"Tenant counter reconcile error: {str(e)}")
+
+
+async def get_tenant_counters(db, user_id: str) -> Dict:
+    """Get the counter document for a tenant, seeding it on first access."""
+    doc = await db.tenant_counters.find_one({"user_id": user_id}, {"_id": 0})
+    if not doc or "reconciled_at" not in doc:
+        doc = await reconcile_tenant_counters(db, user_id)
+    return doc
+
+
+async def increment_counter(db, user_id: str, field: str, amount: int = 1):
+    """Atomically adjust a tenant counter (negative amount to decrement)."""
+    await db.tenant_counters.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {field: amount, "revision": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        },
+        upsert=True
+    )
+
+
+async def try_increment_counter(
+    db,
+    user_id: str,
+    field: str,
+    limit: int,
+    amount: int = 1
+) -> Tuple[bool, int]:
+    """
+    Increment a counter only if the result stays within limit (-1 means unlimited).
+    The guard and the increment are a single find_one_and_update, so concurrent
+    creates can never push a tenant past its limit.
+    Returns: (incremented, current_value)
+    """
+    if limit == -1:
+        # Seed first: seeding after the $inc would recount before the caller's insert and drop it
+        await get_tenant_counters(db, user_id)
+        await increment_counter(db, user_id, field, amount)
+        doc = await get_tenant_counters(db, user_id)
+        return True, doc.get(field, 0)
+
+    for _ in range(2):
+        doc = await db.tenant_counters.find_one_and_update(
+            {
+                "user_id": user_id,
+                "reconciled_at": {"$exists": True},
+                field: {"$lte": limit - amount}
+            },
+            {
+                "$inc": {field: amount, "revision": 1},
+                "$set": {"updated_at": datetime.now(timezone.utc)}
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return True, doc[field]
+
+        # Either the limit is reached or the counter was never seeded
+        existing: Optional[Dict] = await db.tenant_counters.find_one({"user_id": user_id}, {"_id": 0})
+        if existing and "reconciled_at" in existing:
+            return False, existing.get(field, 0)
+        await reconcile_tenant_counters(db, user_id)
+
+    existing = await get_tenant_counters(db, user_id)
+    return False, existing.get(field, 0)
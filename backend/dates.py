@@ -0,0 +1,175 @@
+"""
+VetFlow - Date Storage Module
+Every stored date is a native BSON datetime (UTC). Helpers to normalize values
+at the model/query boundary and a batched, resumable migration that rewrites
+legacy ISO-string fields in place
+"""
+import os
+import asyncio
+from datetime import datetime, date, timezone
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = "bson_datetimes"
+MIGRATION_BATCH_SIZE = int(os.environ.get("DATE_MIGRATION_BATCH_SIZE", "500"))
+
+# Collection -> date fields (dotted paths for embedded documents)
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "customers": ["created_at", "updated_at"],
+    "pets": ["birth_date", "created_at", "updated_at"],
+    "health_records": ["date", "next_due_date", "created_at"],
+    "appointments": ["date", "created_at", "updated_at"],
+    "products": ["created_at", "updated_at"],
+    "pet_product_usages": ["start_date", "last_purchase_date", "created_at"],
+    "reminders": ["due_date", "sent_at", "created_at"],
+    "transactions": ["date", "created_at"],
+    "whatsapp_messages": ["created_at"],
+    "ai_settings": ["created_at", "updated_at"],
+    "faq_entries": ["created_at", "updated_at"],
+    "subscriptions": ["current_period_start", "current_period_end", "created_at", "updated_at"],
+    "payment_transactions": ["created_at", "updated_at"],
+    "subscription_rollovers": ["previous_period_end", "new_period_end", "created_at"],
+    "tenant_counters": ["reconciled_at", "updated_at"],
+    "conversation_states": ["pending_appointment.expires_at", "updated_at"],
+}
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value: Any) -> Optional[datetime]:
+    """
+    Normalize a stored or submitted date to an aware UTC datetime.
+    Accepts datetimes (naive means UTC), dates and ISO strings (with or without "Z").
+    Raises ValueError for strings that are not ISO dates.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if isinstance(value, str):
+        return as_utc(datetime.fromisoformat(value.strip().replace("Z", "+00:00")))
+    raise ValueError(f"Not a date: {value!r}")
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+async def migrate_collection_dates(db, collection: str, fields: List[str], batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Rewrite string date fields of one collection, batch by batch in _id order.
+    Progress (last _id) is saved after every batch so an interrupted run resumes.
+    Unparseable values are left as they are and logged; the collection then stays
+    pending and is rescanned from the start on the next run.
+    Returns: number of documents updated
+    """
+    from pymongo import UpdateOne
+
+    progress = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    state = progress.get("collections", {}).get(collection, {})
+    if state.get("done"):
+        return 0
+
+    query_fields = {f: {"$type": "string"} for f in fields}
+    projection = {f: 1 for f in fields}
+    last_id = state.get("last_id")
+    updated = 0
+    unparseable = 0
+
+    while True:
+        query = {"$or": [{f: cond} for f, cond in query_fields.items()]}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            changes = {}
+            for field in fields:
+                value = _get_path(doc, field)
+                if isinstance(value, str):
+                    try:
+                        changes[field] = as_utc(value)
+                    except ValueError:
+                        unparseable += 1
+                        logger.warning(f"Date migration: {collection}.{field} unparseable on {doc['_id']}: {value!r}")
+            if changes:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+
+        if operations:
+            result = await db[collection].bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"collections.{collection}.last_id": last_id, "updated_at": utc_now()}},
+            upsert=True
+        )
+        # Yield between batches so other startup tasks keep running
+        await asyncio.sleep(0)
+
+    state = {"done": not unparseable, "last_id": None, "unparseable": unparseable}
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {f"collections.{collection}": state, "updated_at": utc_now()}},
+        upsert=True
+    )
+    return updated
+
+
+async def migrate_datetime_fields(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Convert ISO-string date fields to BSON datetimes in every collection.
+    Idempotent and resumable; collections already finished are skipped. The run is
+    only marked complete once no collection has unparseable values left.
+    Returns: {collection: documents updated}
+    """
+    progress = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    if progress.get("completed_at"):
+        return {}
+
+    results = {}
+    for collection, fields in DATE_FIELDS.items():
+        results[collection] = await migrate_collection_dates(db, collection, fields, batch_size)
+
+    progress = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    pending = [c for c, state in progress.get("collections", {}).items() if not state.get("done")]
+    if pending:
+        logger.warning(f"Date migration left unparseable values in {pending}; will retry on next run")
+        return results
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": utc_now()}},
+        upsert=True
+    )
+    logger.info(f"Date migration finished: {results}")
+    return results
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    print(asyncio.run(migrate_datetime_fields(client[os.environ["DB_NAME"]])))
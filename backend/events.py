@@ -0,0 +1,120 @@
+"""
+VetFlow - Live Events Module
+In-process per-tenant pub/sub feeding the Server-Sent Events stream
+(new WhatsApp messages, status changes, appointment mutations)
+"""
+import os
+import asyncio
+import itertools
+from typing import Any, Dict, FrozenSet, Optional, Set
+
+from pydantic_core import to_json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "256"))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_RETRY_MS = 5000
+
+# Sent instead of the dropped events when a slow subscriber's queue overflows
+RESYNC_EVENT = "resync"
+
+_event_ids = itertools.count(1)
+
+
+class EventBroker:
+    """Fan-out of tenant events to that tenant's open streams. Publishing never blocks."""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.stats = {"published": 0, "delivered": 0, "overflows": 0}
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def publish(self, user_id: str, event_type: str, data: Any):
+        self.stats["published"] += 1
+        queues = self.subscribers.get(user_id)
+        if not queues:
+            return
+        event = (next(_event_ids), event_type, data)
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                # The client is too slow: drop its backlog and tell it to refetch
+                self.stats["overflows"] += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((next(_event_ids), RESYNC_EVENT, {}))
+
+
+_broker = EventBroker()
+
+
+def public_payload(doc: Optional[Dict]) -> Dict:
+    """A stored document as an event payload: Mongo's _id (added by insert_one) left out."""
+    return {k: v for k, v in (doc or {}).items() if k != "_id"}
+
+# Event types the change feed currently derives from Mongo for all workers;
+# local publishes of these are skipped so subscribers don't see them twice
+_feed_event_types: FrozenSet[str] = frozenset()
+
+
+def publish_event(user_id: Optional[str], event_type: str, data: Any):
+    """
+    Publish a tenant event to every open stream of that tenant in this process.
+    No-op for types the change feed is delivering (see set_feed_event_types).
+    Document payloads are sent without _id, as the change feed sends them.
+    """
+    if user_id and event_type not in _feed_event_types:
+        _broker.publish(user_id, event_type, public_payload(data) if isinstance(data, dict) else data)
+
+
+def set_feed_event_types(event_types: FrozenSet[str]):
+    """Called by the change feed when it starts (its types) and stops (empty)."""
+    global _feed_event_types
+    _feed_event_types = frozenset(event_types)
+
+
+def get_broker() -> EventBroker:
+    return _broker
+
+
+def format_sse(event_id: int, event_type: str, data: Any) -> bytes:
+    """One SSE frame. ObjectIds and other non-JSON values are rendered as strings."""
+    payload = to_json(data, fallback=str).decode()
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+
+async def event_stream(user_id: str, is_disconnected):
+    """
+    Yield SSE frames for a tenant until the client disconnects.
+    Comment heartbeats keep proxies from closing idle connections.
+    """
+    queue = _broker.subscribe(user_id)
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+        yield format_sse(0, "ready", {})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield b": ping\n\n"
+                continue
+            yield format_sse(*event)
+    finally:
+        _broker.unsubscribe(user_id, queue)
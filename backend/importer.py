@@ -0,0 +1,465 @@
+"""
+VetFlow - Bulk Import Module
+CSV/XLSX import of owners and their pets for clinics migrating from another
+system. The upload is spooled to disk as it arrives; a background job then
+validates, dedupes and writes it a chunk of rows at a time (each chunk with its
+own plan-limit reservation), keeping progress and the error report in import_jobs.
+"""
+import os
+import re
+import csv
+import asyncio
+import tempfile
+from datetime import datetime, timezone, timedelta
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+import logging
+
+from models import Customer, CustomerCreate, Pet, PetCreate, ImportJob
+from subscription import reserve_customer_slot, release_customer_slot
+from counters import increment_counter, ACTIVE_IMPORT_STATUSES, IMPORT_STALE_SECONDS
+from versions import bump_version
+from codec import to_document
+from dates import as_utc
+
+try:
+    from openpyxl import load_workbook
+except ModuleNotFoundError:
+    load_workbook = None
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", str(20 * 1024 * 1024)))
+IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "50000"))
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+# Row errors kept on the job document; error_count keeps counting past this
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_FORMATS = ("csv", "xlsx")
+
+# Column -> accepted headers, compared after _fold (Turkish and English exports)
+HEADER_ALIASES = {
+    "name": {"name", "owner", "owner_name", "customer", "customer_name", "ad_soyad", "adi_soyadi", "sahip", "sahip_adi", "musteri", "musteri_adi"},
+    "phone": {"phone", "phone_number", "mobile", "gsm", "telefon", "tel", "cep", "cep_telefonu"},
+    "email": {"email", "e_mail", "e_posta", "eposta", "mail"},
+    "address": {"address", "adres"},
+    "notes": {"notes", "note", "owner_notes", "notlar", "not", "musteri_notu"},
+    "pet_name": {"pet", "pet_name", "patient", "patient_name", "hayvan", "hayvan_adi", "hasta", "hasta_adi", "pet_adi"},
+    "species": {"species", "type", "tur", "cins", "hayvan_turu"},
+    "breed": {"breed", "irk"},
+    "birth_date": {"birth_date", "birthdate", "date_of_birth", "dob", "dogum_tarihi"},
+    "weight": {"weight", "kilo", "agirlik"},
+    "color": {"color", "colour", "renk"},
+    "microchip_id": {"microchip", "microchip_id", "chip", "cip", "cip_no", "mikrocip"},
+    "pet_notes": {"pet_notes", "patient_notes", "hayvan_notu", "hasta_notu"},
+}
+CUSTOMER_FIELDS = ("name", "phone", "email", "address", "notes")
+PET_FIELDS = ("species", "breed", "birth_date", "weight", "color", "microchip_id")
+
+SPECIES_ALIASES = {
+    "dog": "dog", "kopek": "dog", "kopegi": "dog",
+    "cat": "cat", "kedi": "cat", "kedisi": "cat",
+    "bird": "bird", "kus": "bird", "muhabbet_kusu": "bird", "papagan": "bird",
+    "rabbit": "rabbit", "tavsan": "rabbit",
+    "hamster": "hamster",
+    "fish": "fish", "balik": "fish",
+}
+
+_TURKISH_FOLD = str.maketrans("çğıöşüÇĞİÖŞÜâîû", "cgiosuCGIOSUaiu")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d")
+
+
+def _fold(text: str) -> str:
+    """Lowercase ASCII key for header/species matching ("Doğum Tarihi" -> "dogum_tarihi")."""
+    return _NON_WORD.sub("_", text.translate(_TURKISH_FOLD).lower()).strip("_")
+
+
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    """
+    Turkish numbers in the "90XXXXXXXXXX" form the WhatsApp webhook delivers.
+    0532..., +90 532..., 532... all normalize to 90532...; None if not a phone.
+    """
+    if not raw:
+        return None
+    digits = re.sub(r"\D", "", raw)
+    if digits.startswith("00"):
+        digits = digits[2:]
+    if len(digits) == 11 and digits.startswith("0"):
+        digits = "90" + digits[1:]
+    elif len(digits) == 10:
+        digits = "90" + digits
+    if len(digits) < 11 or len(digits) > 15:
+        return None
+    return digits
+
+
+def phone_key(phone: Optional[str]) -> Optional[str]:
+    """Dedupe key: the last 10 digits, as the webhook matches customers."""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def _cell(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    text = str(value).strip()
+    return text or None
+
+
+def _parse_date(value: str) -> datetime:
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:10], fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return as_utc(value)
+
+
+def map_headers(header: List) -> Dict[int, str]:
+    """Column index -> field for the recognised headers; unknown columns are ignored."""
+    lookup = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+    columns = {}
+    for index, value in enumerate(header):
+        field = lookup.get(_fold(_cell(value) or ""))
+        if field and field not in columns.values():
+            columns[index] = field
+    return columns
+
+
+def iter_csv_rows(path: str) -> Iterator[List]:
+    """Rows of a CSV export: UTF-8 (with or without BOM) or Windows-1254, delimiter sniffed."""
+    with open(path, "rb") as raw:
+        sample = raw.read(64 * 1024)
+    try:
+        sample.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still UTF-8
+        encoding = "utf-8-sig" if e.start >= len(sample) - 3 else "cp1254"
+
+    with open(path, encoding=encoding, errors="replace", newline="") as f:
+        first_line = f.readline()
+        delimiter = max(",;\t", key=first_line.count)
+        f.seek(0)
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def iter_xlsx_rows(path: str) -> Iterator[List]:
+    """Rows of the first sheet, read in streaming (read_only) mode."""
+    if load_workbook is None:
+        raise RuntimeError("XLSX import requires openpyxl")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def parse_row(values: List, columns: Dict[int, str]) -> Tuple[Optional[Dict], Optional[Dict], List[str]]:
+    """
+    One sheet row -> (customer fields, pet fields or None, errors).
+    Fields are validated with CustomerCreate / PetCreate like the single-record routes.
+    """
+    raw = {field: _cell(values[index]) if index < len(values) else None for index, field in columns.items()}
+    errors = []
+
+    phone = normalize_phone(raw.get("phone"))
+    if not phone:
+        errors.append(f"Geçersiz telefon: {raw['phone']}" if raw.get("phone") else "Telefon zorunlu")
+    customer_fields = {field: raw.get(field) for field in CUSTOMER_FIELDS if raw.get(field)}
+    customer_fields["phone"] = phone or ""
+    try:
+        customer = CustomerCreate(**customer_fields).model_dump()
+    except ValidationError as e:
+        customer = None
+        errors.extend(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+    pet = None
+    if raw.get("pet_name"):
+        pet_fields = {field: raw.get(field) for field in PET_FIELDS if raw.get(field)}
+        pet_fields["name"] = raw["pet_name"]
+        pet_fields["species"] = SPECIES_ALIASES.get(_fold(raw.get("species") or ""), "other")
+        if raw.get("pet_notes"):
+            pet_fields["notes"] = raw["pet_notes"]
+        if "weight" in pet_fields:
+            pet_fields["weight"] = pet_fields["weight"].replace(",", ".")
+        try:
+            if "birth_date" in pet_fields:
+                pet_fields["birth_date"] = _parse_date(pet_fields["birth_date"])
+            # customer_id is only known after dedupe
+            pet = PetCreate(**pet_fields, customer_id="-").model_dump(exclude={"customer_id"})
+        except ValueError as e:
+            # ValidationError is a ValueError; so are bad dates
+            messages = ([f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()]
+                        if isinstance(e, ValidationError) else [f"birth_date: {e}"])
+            errors.extend(messages)
+
+    return customer, pet, errors
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], suffix: str) -> Optional[str]:
+    """
+    Write the request body to a temporary file as it arrives.
+    Returns the path, or None (nothing left on disk) when it exceeds IMPORT_MAX_BYTES.
+    """
+    fd, path = tempfile.mkstemp(prefix="vetflow_import_", suffix=f".{suffix}")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    os.unlink(path)
+                    return None
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return path
+
+
+class ImportRun:
+    """State of one import while it runs; progress is mirrored to its import_jobs document."""
+
+    def __init__(self, db, job: ImportJob, path: str):
+        self.db = db
+        self.job = job
+        self.path = path
+        self.user_id = job.user_id
+        # Records of the chunk being processed; written and cleared by write_chunk
+        self.new_customers: List[Dict] = []
+        self.new_pets: List[Dict] = []
+        self.customer_ids: Dict[str, str] = {}  # phone key -> customer_id
+        self.pet_keys: Set[Tuple[str, str]] = set()  # (customer_id, folded name)
+
+    async def save(self, **changes):
+        now = datetime.now(timezone.utc)
+        for field, value in changes.items():
+            setattr(self.job, field, value)
+        self.job.updated_at = now
+        await self.db.import_jobs.update_one(
+            {"job_id": self.job.job_id},
+            {"$set": {**changes, "updated_at": now}}
+        )
+
+    def add_error(self, row: int, messages: List[str]):
+        self.job.error_count += 1
+        if len(self.job.errors) < IMPORT_MAX_ERRORS:
+            self.job.errors.append({"row": row, "errors": messages})
+
+    async def load_existing(self):
+        """Phone keys and pet names the tenant already has (one projected scan each)."""
+        async for customer in self.db.customers.find(
+            {"user_id": self.user_id}, {"_id": 0, "customer_id": 1, "phone": 1}
+        ):
+            key = phone_key(customer.get("phone"))
+            if key:
+                self.customer_ids.setdefault(key, customer["customer_id"])
+        async for pet in self.db.pets.find(
+            {"user_id": self.user_id}, {"_id": 0, "customer_id": 1, "name": 1}
+        ):
+            self.pet_keys.add((pet["customer_id"], (pet.get("name") or "").casefold()))
+
+    def plan_row(self, customer: Dict, pet: Optional[Dict]) -> bool:
+        """Queue the row's new records for the current chunk; False when it adds nothing (duplicate)."""
+        key = phone_key(customer["phone"])
+        added = False
+        customer_id = self.customer_ids.get(key)
+        if customer_id is None:
+            new_customer = Customer(**customer, user_id=self.user_id)
+            customer_id = self.customer_ids[key] = new_customer.customer_id
+            self.new_customers.append(to_document(new_customer))
+            added = True
+
+        if pet:
+            pet_key = (customer_id, pet["name"].casefold())
+            if pet_key not in self.pet_keys:
+                self.pet_keys.add(pet_key)
+                self.new_pets.append(to_document(Pet(**pet, customer_id=customer_id, user_id=self.user_id)))
+                added = True
+        return added
+
+    async def write_chunk(self, first_row: int) -> bool:
+        """
+        Write the records queued for one chunk: reserve their customer slots against
+        the plan limit, then ordered inserts (customers before the pets that reference them).
+        False when the plan limit is reached; the job is then failed.
+        """
+        customers, pets = self.new_customers, self.new_pets
+        self.new_customers, self.new_pets = [], []
+        if customers:
+            limit_check = await reserve_customer_slot(self.db, self.user_id, count=len(customers))
+            if not limit_check["can_add"]:
+                await self.fail(
+                    f"Müşteri limitine ulaşıldı ({limit_check['current']}/{limit_check['limit']}): "
+                    f"{first_row}. satırdan itibaren içe aktarılmadı. Paketinizi yükseltin."
+                )
+                return False
+
+        written = {"customers": 0, "pets": 0}
+        try:
+            for collection, docs in (("customers", customers), ("pets", pets)):
+                if docs:
+                    try:
+                        await self.db[collection].insert_many(docs, ordered=True)
+                        written[collection] = len(docs)
+                    except BulkWriteError as e:
+                        written[collection] = e.details.get("nInserted", 0)
+                        raise
+        finally:
+            if written["customers"] < len(customers):
+                await release_customer_slot(self.db, self.user_id, len(customers) - written["customers"])
+            if written["pets"]:
+                await increment_counter(self.db, self.user_id, "pets", written["pets"])
+            if written["customers"] or written["pets"]:
+                await bump_version(self.db, self.user_id, "customers", "pets")
+            await self.save(
+                customers_created=self.job.customers_created + written["customers"],
+                pets_created=self.job.pets_created + written["pets"]
+            )
+        return True
+
+    async def process(self):
+        """
+        Read, validate and dedupe the rows a chunk at a time, writing each chunk
+        before the next is read, so memory stays bounded by IMPORT_BATCH_SIZE.
+        """
+        rows = iter_xlsx_rows(self.path) if self.job.file_format == "xlsx" else iter_csv_rows(self.path)
+        try:
+            header = await asyncio.to_thread(next, rows, None)
+            columns = map_headers(header or [])
+            missing = {"name", "phone"} - set(columns.values())
+            if missing:
+                await self.fail(f"Eksik sütun: {', '.join(sorted(missing))}")
+                return
+
+            await self.load_existing()
+            await self.save(status="importing")
+            row_number = 1
+            duplicates = 0
+            too_many_rows = False
+            while not too_many_rows:
+                chunk = await asyncio.to_thread(lambda: list(islice(rows, IMPORT_BATCH_SIZE)))
+                if not chunk:
+                    break
+                first_row = row_number + 1
+                for values in chunk:
+                    row_number += 1
+                    if not any(_cell(value) for value in values):
+                        continue
+                    if row_number - 1 > IMPORT_MAX_ROWS:
+                        row_number -= 1
+                        too_many_rows = True
+                        break
+                    customer, pet, errors = parse_row(values, columns)
+                    if errors:
+                        self.add_error(row_number, errors)
+                    elif not self.plan_row(customer, pet):
+                        duplicates += 1
+
+                try:
+                    if not await self.write_chunk(first_row):
+                        return
+                except PyMongoError as e:
+                    await self.fail(f"Yazma hatası: {e}")
+                    return
+                await self.save(
+                    rows_processed=row_number - 1, duplicates_skipped=duplicates,
+                    error_count=self.job.error_count, errors=self.job.errors
+                )
+        except (csv.Error, RuntimeError, OSError, ValueError) as e:
+            # openpyxl raises InvalidFileException (an OSError) and zipfile/KeyError variants as ValueError
+            await self.fail(f"Dosya okunamadı: {e}")
+            return
+        finally:
+            rows.close()
+
+        if too_many_rows:
+            await self.fail(
+                f"Dosya en fazla {IMPORT_MAX_ROWS} satır içerebilir; "
+                f"ilk {IMPORT_MAX_ROWS} satır içe aktarıldı"
+            )
+            return
+        await self.save(
+            status="completed", rows_total=row_number - 1, completed_at=datetime.now(timezone.utc),
+            message=f"{self.job.customers_created} müşteri, {self.job.pets_created} hayvan eklendi"
+        )
+
+    async def fail(self, message: str):
+        logger.warning(f"Import {self.job.job_id} failed: {message}")
+        await self.save(status="failed", message=message, completed_at=datetime.now(timezone.utc))
+
+    async def run(self):
+        try:
+            await self.save(status="parsing")
+            await self.process()
+        except Exception as e:
+            logger.exception(f"Import {self.job.job_id} crashed")
+            await self.fail(f"Beklenmeyen hata: {e}")
+        finally:
+            os.unlink(self.path)
+
+
+# Strong references to the imports running in this worker (by job_id) so they
+# are not garbage collected mid-run
+_running: Dict[str, asyncio.Task] = {}
+
+
+async def start_import(db, user_id: str, path: str, file_format: str, filename: Optional[str]) -> ImportJob:
+    """Create the job document and process the spooled file in the background."""
+    job = ImportJob(user_id=user_id, file_format=file_format, filename=filename)
+    await db.import_jobs.insert_one(to_document(job))
+    task = asyncio.create_task(ImportRun(db, job, path).run())
+    _running[job.job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job.job_id, None))
+    return job
+
+
+async def fail_orphaned_imports(db) -> int:
+    """
+    Fail imports left active by a worker that restarted or crashed mid-run.
+    Imports running in this worker are kept; ones in other workers are still
+    saving progress, so only jobs idle for IMPORT_STALE_SECONDS are touched.
+    Returns the number of jobs failed.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.import_jobs.update_many(
+        {
+            "status": {"$in": ACTIVE_IMPORT_STATUSES},
+            "updated_at": {"$lt": now - timedelta(seconds=IMPORT_STALE_SECONDS)},
+            "job_id": {"$nin": list(_running)},
+        },
+        {"$set": {
+            "status": "failed",
+            "message": "İçe aktarma yarıda kaldı (sunucu yeniden başlatıldı); kalan satırlar için dosyayı tekrar yükleyin",
+            "completed_at": now,
+            "updated_at": now,
+        }}
+    )
+    if result.modified_count:
+        logger.warning(f"Marked {result.modified_count} orphaned import(s) as failed")
+    return result.modified_count
+
+
+async def ensure_import_indexes(db):
+    await db.import_jobs.create_index("job_id", unique=True)
+    await db.import_jobs.create_index([("user_id", 1), ("created_at", -1)])
+    await db.import_jobs.create_index([("status", 1), ("updated_at", 1)])
+    await fail_orphaned_imports(db)
+
+
+def import_format(file_format: Optional[str], filename: Optional[str]) -> Optional[str]:
+    """Explicit ?format= wins; otherwise the filename extension."""
+    if file_format:
+        return file_format.lower() if file_format.lower() in IMPORT_FORMATS else None
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return extension if extension in IMPORT_FORMATS else None
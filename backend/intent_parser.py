@@ -0,0 +1,181 @@
+"""
+VetFlow - Appointment Intent Parser Module
+Deterministic Turkish date/time extraction for clear booking requests,
+so the common "yarın 14:00 randevu" messages skip the LLM
+"""
+import os
+import re
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+CLINIC_TIMEZONE = ZoneInfo(os.environ.get("CLINIC_TIMEZONE", "Europe/Istanbul"))
+
+_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+WEEKDAYS = {
+    "pazartesi": 0, "sali": 1, "carsamba": 2, "persembe": 3,
+    "cuma": 4, "cumartesi": 5, "pazar": 6
+}
+MONTHS = {
+    "ocak": 1, "subat": 2, "mart": 3, "nisan": 4, "mayis": 5, "haziran": 6,
+    "temmuz": 7, "agustos": 8, "eylul": 9, "ekim": 10, "kasim": 11, "aralik": 12
+}
+SERVICES = (
+    ("asi", "Aşı"),
+    ("kontrol", "Kontrol"),
+    ("kisirlastirma", "Kısırlaştırma"),
+    ("tirnak", "Tırnak Kesimi"),
+    ("tiras", "Tıraş"),
+    ("muayene", "Muayene")
+)
+
+# "randevu", "randevusu", "gelmek istiyorum"... but not "randevum"/"randevunuz" (an existing booking)
+_BOOKING_INTENT = re.compile(
+    r"\brandevu(?![mn])"
+    r"|\bgelmek istiyorum\b|\bgelebilir miyim\b|\bgetirmek istiyorum\b|\bgetirebilir miyim\b"
+)
+# Anything about changing or cancelling goes to the model
+_NOT_A_BOOKING = re.compile(r"\b(iptal|degistir|erteleme|ertele|istemiyorum|kaydir)")
+
+_COLON_TIME = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_SAAT_TIME = re.compile(r"\bsaat\s*([01]?\d|2[0-3])(?:[.:]([0-5]\d))?\b")
+_DOT_TIME = re.compile(r"\b([01]?\d|2[0-3])\.(00|1[3-9]|[2-5]\d)\b(?!\.\d)")
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})[./](\d{1,2})(?:[./](\d{2,4}))?\b")
+_MONTH_DATE = re.compile(r"\b(\d{1,2})\s+(" + "|".join(MONTHS) + r")(?:\s+(\d{4}))?\b")
+_WEEKDAY = re.compile(r"\b(haftaya\s+)?(" + "|".join(sorted(WEEKDAYS, key=len, reverse=True)) + r")\b")
+_RELATIVE_DAY = re.compile(r"\b(bugun|yarin|obur gun|ertesi gun)\b")
+
+# Below this hour a bare "saat N" could mean morning or afternoon
+_UNAMBIGUOUS_FROM_HOUR = 8
+
+
+def normalize_text(text: str) -> str:
+    """Turkish-aware lowercase with diacritics folded; punctuation kept for times and dates."""
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    return " ".join(text.translate(_FOLD).split())
+
+
+def _extract_times(text: str) -> Tuple[List[Tuple[int, int]], str]:
+    """Find times and blank them out so they are not read again as dates."""
+    times = []
+    ambiguous = False
+
+    def take(pattern, text, allow_bare_hour=False):
+        def _sub(match):
+            nonlocal ambiguous
+            hour = int(match.group(1))
+            minute = int(match.group(2)) if match.group(2) else None
+            if minute is None and allow_bare_hour and hour < _UNAMBIGUOUS_FROM_HOUR:
+                ambiguous = True
+            times.append((hour, minute or 0))
+            return " " * len(match.group(0))
+
+        return pattern.sub(_sub, text)
+
+    text = take(_SAAT_TIME, text, allow_bare_hour=True)
+    text = take(_COLON_TIME, text)
+    text = take(_DOT_TIME, text)
+    if ambiguous:
+        return [], text
+    return times, text
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _future_date(today: date, month: int, day: int, year: Optional[int]) -> Optional[date]:
+    """A day/month without a year means its next occurrence."""
+    if year:
+        return _valid_date(year if year > 99 else 2000 + year, month, day)
+    candidate = _valid_date(today.year, month, day)
+    if candidate and candidate < today:
+        candidate = _valid_date(today.year + 1, month, day)
+    return candidate
+
+
+def _extract_dates(text: str, today: date) -> List[date]:
+    dates = []
+
+    for match in _ISO_DATE.finditer(text):
+        parsed = _valid_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        if parsed:
+            dates.append(parsed)
+    text = _ISO_DATE.sub(" ", text)
+
+    for match in _MONTH_DATE.finditer(text):
+        year = int(match.group(3)) if match.group(3) else None
+        parsed = _future_date(today, MONTHS[match.group(2)], int(match.group(1)), year)
+        if parsed:
+            dates.append(parsed)
+    text = _MONTH_DATE.sub(" ", text)
+
+    for match in _NUMERIC_DATE.finditer(text):
+        year = int(match.group(3)) if match.group(3) else None
+        parsed = _future_date(today, int(match.group(2)), int(match.group(1)), year)
+        if parsed:
+            dates.append(parsed)
+
+    for match in _RELATIVE_DAY.finditer(text):
+        offset = {"bugun": 0, "yarin": 1, "obur gun": 2, "ertesi gun": 2}[match.group(1)]
+        dates.append(today + timedelta(days=offset))
+
+    for match in _WEEKDAY.finditer(text):
+        target = WEEKDAYS[match.group(2)]
+        if match.group(1):
+            # "haftaya cuma": that weekday in next calendar week
+            next_monday = today + timedelta(days=7 - today.weekday())
+            dates.append(next_monday + timedelta(days=target))
+        else:
+            days_ahead = (target - today.weekday()) % 7
+            dates.append(today + timedelta(days=days_ahead))
+
+    return dates
+
+
+def parse_booking_request(text: str, now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Parse a clear booking request ("yarın 14:00 aşı için randevu").
+    Only answers when there is booking intent, exactly one date and exactly one
+    unambiguous time; everything else is left to the LLM.
+    Returns: {"date": "YYYY-MM-DD", "time": "HH:MM", "service": str} or None
+    """
+    normalized = normalize_text(text)
+    if not _BOOKING_INTENT.search(normalized) or _NOT_A_BOOKING.search(normalized):
+        return None
+
+    times, remainder = _extract_times(normalized)
+    if len(set(times)) != 1:
+        return None
+
+    local_now = (now or datetime.now(CLINIC_TIMEZONE)).astimezone(CLINIC_TIMEZONE)
+    dates = _extract_dates(remainder, local_now.date())
+    if len(set(dates)) != 1:
+        return None
+
+    hour, minute = times[0]
+    booking_date = dates[0]
+
+    # A weekday that is today but already past means next week
+    if booking_date == local_now.date() and (hour, minute) <= (local_now.hour, local_now.minute):
+        if _WEEKDAY.search(remainder) and not _RELATIVE_DAY.search(remainder):
+            booking_date = booking_date + timedelta(days=7)
+        else:
+            return None
+
+    service = "Muayene"
+    for keyword, label in SERVICES:
+        if re.search(rf"\b{keyword}", normalized):
+            service = label
+            break
+
+    return {
+        "date": booking_date.strftime("%Y-%m-%d"),
+        "time": f"{hour:02d}:{minute:02d}",
+        "service": service
+    }
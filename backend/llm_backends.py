@@ -0,0 +1,232 @@
+"""
+VetFlow - LLM Backends Module
+Pluggable chat backends: Emergent (production), a deterministic local stub
+for load tests, and record/replay of real conversations
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "emergent")  # emergent, stub, record, replay
+LLM_PROVIDER = "openai"
+LLM_MODEL = "gpt-5.2"
+
+
+class LLMSession(ABC):
+    """One conversation with a fixed system prompt."""
+
+    @abstractmethod
+    async def send(self, text: str) -> str:
+        """Send the next user message and return the model's reply."""
+
+
+class LLMBackend(ABC):
+    """Creates sessions; session_id lets the provider keep history and cache the prompt prefix."""
+
+    def is_configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    def create_session(self, session_id: str, system_message: str) -> LLMSession:
+        """Start a conversation with the given system prompt."""
+
+
+# ============ EMERGENT ============
+
+class EmergentSession(LLMSession):
+    def __init__(self, chat, message_class):
+        self._chat = chat
+        self._message_class = message_class
+
+    async def send(self, text: str) -> str:
+        return await self._chat.send_message(self._message_class(text=text))
+
+
+class EmergentBackend(LLMBackend):
+    """emergentintegrations LlmChat, imported on first use so other backends work without it."""
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def create_session(self, session_id: str, system_message: str) -> LLMSession:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(LLM_PROVIDER, LLM_MODEL)
+        return EmergentSession(chat, UserMessage)
+
+
+# ============ STUB ============
+
+class StubSession(LLMSession):
+    def __init__(self, backend: "StubBackend", session_id: str, system_message: str):
+        self.backend = backend
+        self.session_id = session_id
+        self.system_message = system_message
+
+    async def send(self, text: str) -> str:
+        return await self.backend.respond(self.system_message, text)
+
+
+class StubBackend(LLMBackend):
+    """
+    Offline stand-in with configurable latency and error rate.
+    Responses are a deterministic function of the prompt: booking prompts get a
+    [RANDEVU_TALEBI] block, batched reminder prompts get a JSON array, anything
+    else a fixed-shape answer.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def create_session(self, session_id: str, system_message: str) -> LLMSession:
+        return StubSession(self, session_id, system_message)
+
+    async def respond(self, system_message: str, text: str) -> str:
+        self.calls += 1
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise RuntimeError("Stub LLM injected error")
+        return stub_response(system_message, text)
+
+
+def stub_response(system_message: str, text: str) -> str:
+    """Deterministic reply for a prompt."""
+    items = re.search(r"Kayıtlar \(JSON\):\s*(\[.*?\])\s*\n", text, re.DOTALL)
+    if items:
+        rows = json.loads(items.group(1))
+        return json.dumps(
+            [{"id": row["id"], "mesaj": row.get("taslak", "")} for row in rows],
+            ensure_ascii=False
+        )
+
+    digest = hashlib.sha256(text.encode()).hexdigest()[:8]
+    if "[RANDEVU_TALEBI]" in system_message and "randevu" in text.lower():
+        return (
+            f"Randevu talebinizi aldım. ({digest})\n"
+            "[RANDEVU_TALEBI]\ntarih: 2030-01-07\nsaat: 10:00\nhizmet: Muayene\n[/RANDEVU_TALEBI]"
+        )
+    return f"Merhaba! Sorunuzu aldım, size yardımcı olmaktan memnuniyet duyarız. ({digest})"
+
+
+# ============ RECORD / REPLAY ============
+
+def _prompt_key(system_message: str, text: str) -> str:
+    return hashlib.sha256(f"{system_message}\x00{text}".encode()).hexdigest()
+
+
+class RecordReplaySession(LLMSession):
+    def __init__(self, backend: "RecordReplayBackend", inner: Optional[LLMSession], system_message: str):
+        self.backend = backend
+        self.inner = inner
+        self.system_message = system_message
+
+    async def send(self, text: str) -> str:
+        key = _prompt_key(self.system_message, text)
+        if self.backend.mode == "replay":
+            return self.backend.lookup(key, self.system_message, text)
+        response = await self.inner.send(text)
+        self.backend.append(key, response)
+        return response
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    record: forward to the inner backend and append every exchange to a JSONL file.
+    replay: answer from that file; unseen prompts fall back to the stub response.
+    """
+
+    def __init__(self, path: str, mode: str, inner: Optional[LLMBackend] = None):
+        self.path = Path(path)
+        self.mode = mode
+        self.inner = inner
+        self.recorded: Dict[str, str] = {}
+        self.misses = 0
+        if mode == "replay" and self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        self.recorded[row["key"]] = row["response"]
+
+    def is_configured(self) -> bool:
+        return self.mode == "replay" or (self.inner is not None and self.inner.is_configured())
+
+    def create_session(self, session_id: str, system_message: str) -> LLMSession:
+        inner = self.inner.create_session(session_id, system_message) if self.mode == "record" else None
+        return RecordReplaySession(self, inner, system_message)
+
+    def lookup(self, key: str, system_message: str, text: str) -> str:
+        if key in self.recorded:
+            return self.recorded[key]
+        self.misses += 1
+        return stub_response(system_message, text)
+
+    def append(self, key: str, response: str):
+        self.recorded[key] = response
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "response": response}, ensure_ascii=False) + "\n")
+
+
+# ============ SELECTION ============
+
+_backend: Optional[LLMBackend] = None
+
+
+def build_backend_from_env() -> LLMBackend:
+    """Build the backend selected by LLM_BACKEND and its LLM_STUB_* / LLM_REPLAY_PATH settings."""
+    name = os.environ.get("LLM_BACKEND", LLM_BACKEND)
+    if name == "stub":
+        return StubBackend(
+            latency_ms=float(os.environ.get("LLM_STUB_LATENCY_MS", "0")),
+            jitter_ms=float(os.environ.get("LLM_STUB_JITTER_MS", "0")),
+            error_rate=float(os.environ.get("LLM_STUB_ERROR_RATE", "0")),
+            seed=int(os.environ.get("LLM_STUB_SEED", "0"))
+        )
+    if name in ("record", "replay"):
+        path = os.environ.get("LLM_REPLAY_PATH", "llm_recordings.jsonl")
+        inner = EmergentBackend(os.environ.get("EMERGENT_LLM_KEY")) if name == "record" else None
+        return RecordReplayBackend(path, name, inner)
+    return EmergentBackend(os.environ.get("EMERGENT_LLM_KEY"))
+
+
+def get_llm_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        _backend = build_backend_from_env()
+        logger.info(f"LLM backend: {type(_backend).__name__}")
+    return _backend
+
+
+def set_llm_backend(backend: Optional[LLMBackend]):
+    """Swap the process-wide backend (benchmarks, local tools); None re-reads the environment."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,185 @@
+"""
+VetFlow - LLM Gateway Module
+Deadlines, concurrency limits, circuit breaker and latency histograms
+around every LLM call
+"""
+import os
+import time
+import asyncio
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import logging
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_TENANT_MAX_CONCURRENCY = int(os.environ.get("LLM_TENANT_MAX_CONCURRENCY", "4"))
+
+# Circuit breaker: open when, over the last CIRCUIT_WINDOW calls, the share of
+# failed or slow calls reaches CIRCUIT_FAILURE_RATE
+CIRCUIT_WINDOW = int(os.environ.get("LLM_CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.environ.get("LLM_CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_FAILURE_RATE = float(os.environ.get("LLM_CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_SECONDS = float(os.environ.get("LLM_CIRCUIT_SLOW_SECONDS", "10"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("LLM_CIRCUIT_OPEN_SECONDS", "30"))
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 60.0)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when a call is rejected by the breaker or misses its deadline."""
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram (seconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.total += seconds
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> Dict:
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": self.total, "count": self.count}
+
+
+class CircuitBreaker:
+    """closed -> open on too many bad calls -> half_open after a cool-down -> closed on a good probe."""
+
+    def __init__(self):
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.results = deque(maxlen=CIRCUIT_WINDOW)
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probe_in_flight = False
+            if ok:
+                self.state = "closed"
+                self.results.clear()
+                logger.info("LLM circuit closed")
+            else:
+                self._open()
+            return
+
+        self.results.append(ok)
+        if len(self.results) >= CIRCUIT_MIN_CALLS:
+            failures = self.results.count(False)
+            if failures / len(self.results) >= CIRCUIT_FAILURE_RATE:
+                self._open()
+
+    def release_probe(self):
+        """Let another probe through if the current one was cancelled without an outcome."""
+        self._probe_in_flight = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.results.clear()
+        logger.warning("LLM circuit opened - serving fallback responses")
+
+
+_global_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+# Entries disappear once no call holds or waits on a tenant's semaphore
+_tenant_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+_breaker = CircuitBreaker()
+_histograms: Dict[str, LatencyHistogram] = {}
+_outcomes: Dict[str, Dict[str, int]] = {}
+
+
+def _tenant_semaphore(tenant: str) -> asyncio.Semaphore:
+    semaphore = _tenant_semaphores.get(tenant)
+    if semaphore is None:
+        semaphore = _tenant_semaphores[tenant] = asyncio.Semaphore(LLM_TENANT_MAX_CONCURRENCY)
+    return semaphore
+
+
+def _record(operation: str, outcome: str, seconds: Optional[float] = None):
+    counts = _outcomes.setdefault(operation, {"ok": 0, "error": 0, "timeout": 0, "rejected": 0})
+    counts[outcome] += 1
+    if seconds is not None:
+        _histograms.setdefault(operation, LatencyHistogram()).observe(seconds)
+
+
+async def call_llm(
+    call: Callable[[], Awaitable[T]],
+    tenant: str = "system",
+    operation: str = "chat",
+    timeout: Optional[float] = None
+) -> T:
+    """
+    Run one LLM call under the gateway's limits.
+    The deadline covers queueing for a concurrency slot as well as the call.
+    Raises LLMUnavailableError when the breaker is open or the deadline passes;
+    provider errors are re-raised after being counted.
+    """
+    if not _breaker.allow():
+        _record(operation, "rejected")
+        raise LLMUnavailableError("LLM circuit open")
+
+    async def _run():
+        async with _global_semaphore:
+            async with _tenant_semaphore(tenant):
+                return await call()
+
+    started = time.monotonic()
+    try:
+        with span("llm.call", "client", **{"llm.operation": operation, "tenant": tenant}):
+            result = await asyncio.wait_for(_run(), timeout or LLM_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        elapsed = time.monotonic() - started
+        _record(operation, "timeout", elapsed)
+        _breaker.record(False)
+        raise LLMUnavailableError(f"LLM {operation} timed out after {elapsed:.1f}s")
+    except asyncio.CancelledError:
+        _breaker.release_probe()
+        raise
+    except Exception:
+        _record(operation, "error", time.monotonic() - started)
+        _breaker.record(False)
+        raise
+
+    elapsed = time.monotonic() - started
+    _record(operation, "ok", elapsed)
+    _breaker.record(elapsed < CIRCUIT_SLOW_SECONDS)
+    return result
+
+
+def get_gateway_stats() -> Dict:
+    """Breaker state, outcome counts and latency histograms per operation."""
+    return {
+        "circuit": _breaker.state,
+        "outcomes": {op: dict(counts) for op, counts in _outcomes.items()},
+        "latency": {op: histogram.snapshot() for op, histogram in _histograms.items()}
+    }
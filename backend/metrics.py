@@ -0,0 +1,280 @@
+"""
+VetFlow - Metrics Module
+Dependency-free counters and histograms rendered in the Prometheus text format:
+HTTP latency per route, Mongo command timings, scheduler jobs, WhatsApp sends
+and LLM calls
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pymongo import monitoring
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bearer token required by /metrics when set
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (seconds)."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[labels] = series
+            counts, total = series
+            total[0] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    return
+            counts[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = []
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                cumulative.append((bound, running))
+            lines.extend(render_histogram_series(self.name, self.label_names, labels, cumulative, total))
+        return lines
+
+
+def render_histogram_series(
+    name: str,
+    label_names: Tuple[str, ...],
+    labels: Labels,
+    cumulative: Iterable[Tuple[float, int]],
+    total: float
+) -> List[str]:
+    """Bucket, sum and count lines for one series from (upper bound, cumulative count) pairs."""
+    lines = []
+    count = 0
+    for bound, running in cumulative:
+        le = f'le="{_format_bound(bound)}"'
+        lines.append(f"{name}_bucket{_format_labels(label_names, labels, le)} {running}")
+        count = running
+    lines.append(f"{name}_sum{_format_labels(label_names, labels)} {total}")
+    lines.append(f"{name}_count{_format_labels(label_names, labels)} {count}")
+    return lines
+
+
+HTTP_REQUESTS = Counter(
+    "vetflow_http_requests_total", "HTTP requests by route and status.",
+    ("method", "route", "status")
+)
+HTTP_DURATION = Histogram(
+    "vetflow_http_request_duration_seconds", "HTTP request latency by route and status.",
+    ("method", "route", "status"), HTTP_BUCKETS
+)
+DB_COMMANDS = Counter(
+    "vetflow_db_commands_total", "MongoDB commands by collection, command and outcome.",
+    ("collection", "command", "outcome")
+)
+DB_DURATION = Histogram(
+    "vetflow_db_command_duration_seconds", "MongoDB command latency by collection and command.",
+    ("collection", "command"), DB_BUCKETS
+)
+JOB_RUNS = Counter(
+    "vetflow_scheduler_job_runs_total", "Scheduler job runs by outcome.",
+    ("job", "outcome")
+)
+JOB_DURATION = Histogram(
+    "vetflow_scheduler_job_duration_seconds", "Scheduler job duration.",
+    ("job",), JOB_BUCKETS
+)
+WHATSAPP_SENDS = Counter(
+    "vetflow_whatsapp_sends_total", "WhatsApp API sends by kind and outcome.",
+    ("kind", "outcome")
+)
+WHATSAPP_DURATION = Histogram(
+    "vetflow_whatsapp_send_duration_seconds", "WhatsApp API send latency.",
+    ("kind",), SEND_BUCKETS
+)
+
+_METRICS = (
+    HTTP_REQUESTS, HTTP_DURATION,
+    DB_COMMANDS, DB_DURATION,
+    JOB_RUNS, JOB_DURATION,
+    WHATSAPP_SENDS, WHATSAPP_DURATION,
+)
+
+# Extra renderers for stats that are kept elsewhere (e.g. the LLM gateway)
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.error(f"Metrics collector error: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _llm_collector() -> List[str]:
+    """LLM call outcomes and latencies from the gateway's own histograms."""
+    from llm_gateway import get_gateway_stats
+
+    stats = get_gateway_stats()
+    name = "vetflow_llm_calls_total"
+    lines = [f"# HELP {name} LLM calls by operation and outcome.", f"# TYPE {name} counter"]
+    for operation, outcomes in sorted(stats["outcomes"].items()):
+        for outcome, count in sorted(outcomes.items()):
+            lines.append(f"{name}{_format_labels(('operation', 'outcome'), (operation, outcome))} {count}")
+
+    name = "vetflow_llm_call_duration_seconds"
+    lines += [f"# HELP {name} LLM call latency by operation.", f"# TYPE {name} histogram"]
+    for operation, snapshot in sorted(stats["latency"].items()):
+        lines.extend(render_histogram_series(
+            name, ("operation",), (operation,), snapshot["buckets"], snapshot["sum"]
+        ))
+
+    name = "vetflow_llm_circuit_open"
+    lines += [f"# HELP {name} 1 while the LLM circuit breaker is not closed.", f"# TYPE {name} gauge"]
+    lines.append(f"{name} {0 if stats['circuit'] == 'closed' else 1}")
+    return lines
+
+
+register_collector(_llm_collector)
+
+
+def observe_job(job: str, seconds: float, ok: bool):
+    JOB_DURATION.observe(seconds, job)
+    JOB_RUNS.inc(job, "ok" if ok else "error")
+
+
+def observe_whatsapp_send(kind: str, seconds: float, ok: bool):
+    WHATSAPP_DURATION.observe(seconds, kind)
+    WHATSAPP_SENDS.inc(kind, "ok" if ok else "error")
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Times every Mongo command per collection. pymongo calls this from its own
+    threads, so it only touches lock-protected metrics.
+    """
+
+    def __init__(self):
+        # (connection, request id) -> collection of commands in flight
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        DB_COMMANDS.inc(collection, event.command_name, outcome)
+        DB_DURATION.observe(event.duration_micros / 1_000_000, collection, event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class MetricsMiddleware:
+    """
+    Counts and times every HTTP request. Routes are labelled with their path
+    template (/api/customers/{customer_id}) so ids don't explode the series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            labels = (scope["method"], route_path, str(status["code"]))
+            HTTP_REQUESTS.inc(*labels)
+            HTTP_DURATION.observe(time.perf_counter() - started, *labels)
+
+
+def authorized(authorization: Optional[str]) -> bool:
+    """True when no METRICS_TOKEN is configured or the bearer token matches."""
+    return not METRICS_TOKEN or authorization == f"Bearer {METRICS_TOKEN}"
@@ -0,0 +1,138 @@
+"""
+VetFlow - HTTP Middleware Module
+Response compression and ETag/conditional GET for read-heavy endpoints
+"""
+import os
+import re
+import hashlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+import logging
+
+from auth import resolve_user_id
+from versions import get_versions
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ModuleNotFoundError:
+    BrotliMiddleware = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+# Streams must reach the client line by line, never through a compressor's buffer
+STREAMING_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+# Bump when response shapes change so clients don't keep a stale 304
+RESPONSE_FORMAT_VERSION = "1"
+
+# GET path -> tenant collections whose versions decide the ETag
+ETAG_ROUTES: Tuple[Tuple[re.Pattern, Tuple[str, ...]], ...] = (
+    (re.compile(r"^/api/customers(/[^/]+)?$"), ("customers",)),
+    (re.compile(r"^/api/pets(/[^/]+)?$"), ("pets",)),
+    (re.compile(r"^/api/health-records$"), ("health_records",)),
+    (re.compile(r"^/api/appointments(/[^/]+)?$"), ("appointments",)),
+    (re.compile(r"^/api/appointments/[^/]+/details$"), ("appointments", "customers", "pets")),
+    (re.compile(r"^/api/pets/[^/]+/history$"), (
+        "pets", "customers", "health_records", "appointments", "pet_product_usages", "products"
+    )),
+    (re.compile(r"^/api/products$"), ("products",)),
+    (re.compile(r"^/api/pet-product-usage$"), ("pet_product_usages",)),
+    (re.compile(r"^/api/reminders$"), ("reminders",)),
+    (re.compile(r"^/api/transactions$"), ("transactions",)),
+    (re.compile(r"^/api/finance/summary$"), ("transactions",)),
+    (re.compile(r"^/api/whatsapp/messages$"), ("whatsapp_messages",)),
+)
+
+
+def _etag_collections(path: str) -> Optional[Tuple[str, ...]]:
+    for pattern, collections in ETAG_ROUTES:
+        if pattern.match(path):
+            return collections
+    return None
+
+
+class CompressionMiddleware:
+    """Brotli (gzip fallback) when brotli-asgi is installed, otherwise gzip; streams pass through."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            accept = Headers(scope=scope).get("accept", "")
+            if not any(media_type in accept for media_type in STREAMING_MEDIA_TYPES):
+                await self.compressed(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class ConditionalGetMiddleware:
+    """
+    Weak ETags for tenant-scoped GETs, derived from the tenant's collection versions.
+    Versions are read before the handler runs, so a write racing the handler can
+    only make the ETag older than the body, never newer. A matching If-None-Match
+    is answered with 304 without running the handler.
+    """
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        collections = _etag_collections(scope["path"])
+        if not collections:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        user_id = await resolve_user_id(request, self.db)
+        if not user_id:
+            # Let the handler produce its 401
+            await self.app(scope, receive, send)
+            return
+
+        versions = await get_versions(self.db, user_id)
+        fingerprint = "|".join([
+            RESPONSE_FORMAT_VERSION,
+            user_id,
+            scope["path"],
+            scope.get("query_string", b"").decode("latin-1"),
+            request.headers.get("accept", ""),
+            *(f"{name}:{versions.get(name, 0)}" for name in collections)
+        ])
+        etag = f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()[:20]}"'
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", etag.encode()),
+                    (b"cache-control", b"private, no-cache"),
+                ]
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                headers["ETag"] = etag
+                headers["Cache-Control"] = "private, no-cache"
+                headers.append("Vary", "Authorization, Cookie")
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
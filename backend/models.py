@@ -2,7 +2,7 @@
 VetFlow - Pydantic Models
 """
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, timezone
 from enum import Enum
 import uuid
@@ -332,6 +332,8 @@ class AISettings(BaseModel):
     services: Optional[str] = None
     working_hours: Optional[str] = None
     custom_instructions: Optional[str] = None
+    personalize_reminders: bool = False  # opt-in LLM rewrite of reminder templates
+    reminder_templates: Optional[Dict[str, str]] = None  # reminder_type -> template override
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -344,6 +346,50 @@ class AISettingsUpdate(BaseModel):
     services: Optional[str] = None
     working_hours: Optional[str] = None
     custom_instructions: Optional[str] = None
+    personalize_reminders: Optional[bool] = None
+    reminder_templates: Optional[Dict[str, str]] = None
+
+
+# FAQ Models (staff-curated answers for the WhatsApp assistant)
+class FAQEntry(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    faq_id: str = Field(default_factory=lambda: generate_id("faq_"))
+    user_id: str
+    question: str
+    answer: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class FAQEntryCreate(BaseModel):
+    question: str
+    answer: str
+
+
+class FAQEntryUpdate(BaseModel):
+    question: Optional[str] = None
+    answer: Optional[str] = None
+
+
+# Import Models
+class ImportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    job_id: str = Field(default_factory=lambda: generate_id("imp_"))
+    user_id: str
+    filename: Optional[str] = None
+    file_format: str  # csv, xlsx
+    status: str = "pending"  # pending, parsing, importing, completed, failed
+    rows_total: int = 0
+    rows_processed: int = 0
+    customers_created: int = 0
+    pets_created: int = 0
+    duplicates_skipped: int = 0
+    error_count: int = 0
+    errors: List[Dict] = Field(default_factory=list)  # [{"row": int, "errors": [str]}]
+    message: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    completed_at: Optional[datetime] = None
 
 
 # Response Models
@@ -0,0 +1,161 @@
+"""
+VetFlow - Profiling Module
+On-demand sampling profiles (pyinstrument) of a single request or of the next
+run of a scheduler job, stored in Mongo for download by admins.
+Nothing is sampled unless a profile was asked for.
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, Set
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+import logging
+
+from auth import resolve_user_id
+from models import generate_id
+
+try:
+    from pyinstrument import Profiler
+except ModuleNotFoundError:
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+# Users allowed to profile requests, arm jobs and download profiles
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("ADMIN_EMAILS", "").split(",") if e.strip()}
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_SECONDS", "0.001"))
+PROFILE_RETENTION_DAYS = int(os.environ.get("PROFILE_RETENTION_DAYS", "7"))
+# Per rendering; both together must stay under Mongo's 16 MB document limit
+PROFILE_MAX_OUTPUT_BYTES = int(os.environ.get("PROFILE_MAX_OUTPUT_BYTES", str(6 * 1024 * 1024)))
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "__profile"
+
+# Scheduler jobs whose next run in this worker should be profiled
+_armed_jobs: Set[str] = set()
+
+
+def profiler_available() -> bool:
+    return Profiler is not None
+
+
+async def ensure_profile_indexes(db):
+    await db.profiles.create_index("created_at", expireAfterSeconds=PROFILE_RETENTION_DAYS * 86400)
+
+
+async def is_admin(db, user_id: Optional[str]) -> bool:
+    if not user_id or not ADMIN_EMAILS:
+        return False
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "email": 1})
+    return bool(user) and user.get("email", "").lower() in ADMIN_EMAILS
+
+
+def arm_job(job_id: str):
+    _armed_jobs.add(job_id)
+
+
+def armed_jobs() -> Set[str]:
+    return set(_armed_jobs)
+
+
+def _truncate(text: str, limit: int) -> str:
+    encoded = text.encode("utf-8")
+    if len(encoded) <= limit:
+        return text
+    return encoded[:limit].decode("utf-8", errors="ignore") + "\n... (truncated)\n"
+
+
+async def _store(db, profile_id: str, profiler, target: str, kind: str, requested_by: Optional[str], seconds: float):
+    """
+    Save a finished profile. Never raises: it runs in `finally` blocks, where an
+    error would replace the profiled request's or job's own result.
+    Text output is truncated to PROFILE_MAX_OUTPUT_BYTES; HTML that is too big
+    (truncating it would break the page) is left out.
+    """
+    try:
+        html = profiler.output_html()
+        if len(html.encode("utf-8")) > PROFILE_MAX_OUTPUT_BYTES:
+            html = None
+        text = _truncate(profiler.output_text(unicode=True, color=False), PROFILE_MAX_OUTPUT_BYTES)
+        await db.profiles.insert_one({
+            "profile_id": profile_id,
+            "kind": kind,
+            "target": target,
+            "requested_by": requested_by,
+            "duration_ms": round(seconds * 1000, 1),
+            "html": html,
+            "text": text,
+            "created_at": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        logger.error(f"Could not store profile {profile_id} for {kind} {target}: {e}")
+        return
+    logger.info(f"Stored profile {profile_id} for {kind} {target} ({seconds * 1000:.0f} ms)")
+
+
+@asynccontextmanager
+async def profiled_job(db, job_id: str):
+    """Profile this job run if it was armed; otherwise a plain pass-through."""
+    if job_id not in _armed_jobs or Profiler is None:
+        yield
+        return
+    _armed_jobs.discard(job_id)
+    profile_id = generate_id("prof_")
+    profiler = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        await _store(db, profile_id, profiler, job_id, "job", None, time.perf_counter() - started)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles one request when an admin asks with `X-Profile: 1` or `?__profile=1`.
+    The response carries X-Profile-ID; the profile is stored once the body is sent.
+    Requests without the flag only pay for the header/query check.
+    """
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode() and value not in (b"", b"0"):
+                return True
+        query = scope.get("query_string", b"")
+        return PROFILE_QUERY_PARAM.encode() in query and f"{PROFILE_QUERY_PARAM}=0".encode() not in query
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = await resolve_user_id(Request(scope), self.db)
+        if Profiler is None or not await is_admin(self.db, user_id):
+            if Profiler is None:
+                logger.warning("Profile requested but pyinstrument is not installed")
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = generate_id("prof_")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-ID"] = profile_id
+            await send(message)
+
+        profiler = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            target = f"{scope['method']} {scope['path']}"
+            await _store(self.db, profile_id, profiler, target, "request", user_id, time.perf_counter() - started)
@@ -0,0 +1,210 @@
+"""
+VetFlow - Query Recorder Module
+Request-scoped Mongo query recording for development and staging: query counts
+and time per request, repeated same-shape queries (N+1) and slow queries with
+their explain plans
+"""
+import os
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+import logging
+
+logger = logging.getLogger(__name__)
+
+APP_ENV = os.environ.get("APP_ENV", "production").lower()
+# Off in production: no listener is registered and nothing is recorded
+QUERY_RECORDER_ENABLED = APP_ENV != "production"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+# Same collection, command and filter shape this many times in one request -> N+1 warning
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Where each command keeps its filter
+_FILTER_PATHS = {
+    "find": ("filter",),
+    "count": ("query",),
+    "distinct": ("query",),
+    "findAndModify": ("query",),
+    "update": ("updates", 0, "q"),
+    "delete": ("deletes", 0, "q"),
+    "aggregate": ("pipeline", 0, "$match"),
+}
+_EXPLAINABLE = {"find", "count", "distinct", "findAndModify", "update", "delete", "aggregate"}
+# Driver/session fields that explain must not be given back
+_DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "cursor"}
+
+
+def query_shape(value: Any) -> Any:
+    """The filter with values replaced by placeholders, so {"pet_id": "pet_1"} and "pet_2" match."""
+    if isinstance(value, dict):
+        return {key: query_shape(value[key]) if key.startswith("$") or isinstance(value[key], dict) else "?"
+                for key in sorted(value)}
+    if isinstance(value, list):
+        return [query_shape(item) for item in value[:1]]
+    return "?"
+
+
+def _extract_filter(command_name: str, command: Dict) -> Optional[Dict]:
+    value: Any = command
+    for step in _FILTER_PATHS.get(command_name, ()):
+        try:
+            value = value[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value if isinstance(value, dict) else None
+
+
+class QueryRecorder:
+    """Queries issued while one request (or scheduler job) runs."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes: Dict[Tuple[str, str, str], int] = {}
+        self.slow: List[Dict] = []
+        # (connection, request id) -> started command, filled by the listener thread
+        self._in_flight: Dict[Tuple, Tuple[str, str, Optional[Dict], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._in_flight[(event.connection_id, event.request_id)] = (
+                collection, event.command_name, _extract_filter(event.command_name, command), command
+            )
+
+    def finished(self, event):
+        with self._lock:
+            started = self._in_flight.pop((event.connection_id, event.request_id), None)
+            if started is None:
+                return
+            collection, command_name, query, command = started
+            duration_ms = event.duration_micros / 1000
+            shape = repr(query_shape(query)) if query is not None else "-"
+            key = (collection, command_name, shape)
+
+            self.count += 1
+            self.total_ms += duration_ms
+            self.shapes[key] = self.shapes.get(key, 0) + 1
+            if duration_ms >= SLOW_QUERY_MS:
+                self.slow.append({
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "ms": duration_ms,
+                    "body": {k: v for k, v in command.items() if k not in _DRIVER_FIELDS}
+                })
+
+    def repeated(self) -> List[Tuple[Tuple[str, str, str], int]]:
+        return [(key, count) for key, count in self.shapes.items() if count >= N_PLUS_ONE_THRESHOLD]
+
+
+_current: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+
+
+class QueryRecorderListener(monitoring.CommandListener):
+    """
+    Routes command events to the recorder of the request that issued them.
+    Motor runs pymongo in executor threads with a copy of the caller's context,
+    so the request's context variable is visible here.
+    """
+
+    def started(self, event):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.started(event)
+
+    def succeeded(self, event):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.finished(event)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+def _plan_summary(explain: Dict) -> str:
+    """Stage chain of the winning plan, outermost first (e.g. FETCH <- IXSCAN pet_id_1)."""
+    planner = explain.get("queryPlanner") or (explain.get("stages") or [{}])[0].get("$cursor", {}).get("queryPlanner", {})
+    stage = planner.get("winningPlan", {})
+    stage = stage.get("queryPlan", stage)
+    stages = []
+    while stage:
+        name = stage.get("stage", "?")
+        if stage.get("indexName"):
+            name += f" {stage['indexName']}"
+        stages.append(name)
+        stage = stage.get("inputStage")
+    return " <- ".join(stages) or "unknown"
+
+
+async def _explain(db, slow: Dict) -> str:
+    if slow["command"] not in _EXPLAINABLE:
+        return "-"
+    token = _current.set(None)
+    try:
+        explain = await db.command({"explain": slow["body"], "verbosity": "queryPlanner"})
+        return _plan_summary(explain)
+    except Exception as e:
+        return f"explain failed: {e}"
+    finally:
+        _current.reset(token)
+
+
+async def report(db, recorder: QueryRecorder):
+    """Log N+1 patterns and slow queries (with their plans) for a finished request or job."""
+    for (collection, command_name, shape), count in recorder.repeated():
+        logger.warning(
+            f"N+1 suspect in {recorder.label}: {count}x {collection}.{command_name} {shape}"
+        )
+    for slow in recorder.slow:
+        plan = await _explain(db, slow)
+        logger.warning(
+            f"Slow query in {recorder.label}: {slow['collection']}.{slow['command']} "
+            f"{slow['shape']} took {slow['ms']:.1f} ms, plan: {plan}"
+        )
+
+
+@asynccontextmanager
+async def recording(db, label: str):
+    """Record the queries of the enclosed block; yields None when the recorder is off."""
+    if not QUERY_RECORDER_ENABLED:
+        yield None
+        return
+    recorder = QueryRecorder(label)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        await report(db, recorder)
+
+
+class QueryRecorderMiddleware:
+    """Records each request's queries and adds X-DB-Queries / X-DB-Time (ms) to the response."""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_RECORDER_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        async with recording(self.db, f"{scope['method']} {scope['path']}") as recorder:
+            async def send_with_counts(message):
+                if message["type"] == "http.response.start":
+                    # Queries made while a streaming body is produced are not in these totals
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Queries"] = str(recorder.count)
+                    headers["X-DB-Time"] = f"{recorder.total_ms:.1f}"
+                await send(message)
+
+            await self.app(scope, receive, send_with_counts)
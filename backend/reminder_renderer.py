@@ -0,0 +1,187 @@
+"""
+VetFlow - Reminder Rendering Module
+Template-first reminder messages with opt-in, batched LLM personalization
+"""
+import os
+import time
+import asyncio
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REMINDER_TEMPLATES = {
+    "appointment": "Sayın {customer_name}, {pet_name} için randevunuz yaklaşıyor. {details}",
+    "vaccination": "Sayın {customer_name}, {pet_name}'in aşı zamanı geldi. {details}",
+    "food": "Sayın {customer_name}, {pet_name}'in maması bitmek üzere. {details}",
+    "medication": "Sayın {customer_name}, {pet_name}'in ilacı bitmek üzere. {details}",
+    "checkup": "Sayın {customer_name}, {pet_name} için kontrol zamanı. {details}"
+}
+GENERIC_REMINDER_TEMPLATE = "Sayın {customer_name}, {pet_name} için hatırlatma: {details}"
+TEMPLATE_FIELDS = {"customer_name", "pet_name", "details", "clinic_name"}
+
+# Per-run LLM budget for personalization
+REMINDER_LLM_BATCH_SIZE = int(os.environ.get("REMINDER_LLM_BATCH_SIZE", "20"))
+REMINDER_LLM_CONCURRENCY = int(os.environ.get("REMINDER_LLM_CONCURRENCY", "3"))
+REMINDER_LLM_MAX_CALLS = int(os.environ.get("REMINDER_LLM_MAX_CALLS", "20"))
+REMINDER_LLM_MAX_SECONDS = float(os.environ.get("REMINDER_LLM_MAX_SECONDS", "60"))
+
+# (user_id, settings version) -> {reminder_type: template}
+_template_cache: Dict[Tuple[str, str], Dict[str, str]] = {}
+
+
+def _is_valid_template(template: str) -> bool:
+    """
+    A custom template may only reference the known placeholders, bare: format specs
+    ("{details:>1000000000}") and conversions would let a tenant blow up rendering.
+    """
+    try:
+        parsed = list(Formatter().parse(template))
+    except ValueError:
+        return False
+    for _, name, format_spec, conversion in parsed:
+        if name is None:
+            continue
+        if name not in TEMPLATE_FIELDS or format_spec or conversion:
+            return False
+    return True
+
+
+def get_tenant_templates(ai_settings: dict) -> Dict[str, str]:
+    """
+    Get the tenant's compiled reminder templates: defaults overlaid with any valid
+    reminder_templates from AI settings. Cached per settings version.
+    """
+    user_id = ai_settings.get("user_id", "system")
+    key = (user_id, str(ai_settings.get("updated_at", "")))
+    cached = _template_cache.get(key)
+    if cached is not None:
+        return cached
+
+    templates = dict(DEFAULT_REMINDER_TEMPLATES)
+    for reminder_type, template in (ai_settings.get("reminder_templates") or {}).items():
+        if isinstance(template, str) and _is_valid_template(template):
+            templates[reminder_type] = template
+        else:
+            logger.warning(f"Ignoring invalid reminder template '{reminder_type}' for {user_id}")
+
+    # Only the latest version per tenant is worth keeping
+    for stale in [k for k in _template_cache if k[0] == user_id]:
+        del _template_cache[stale]
+    _template_cache[key] = templates
+    return templates
+
+
+def render_reminder(
+    ai_settings: dict,
+    reminder_type: str,
+    customer_name: str,
+    pet_name: str,
+    details: str
+) -> str:
+    """Render a reminder from the tenant's template for its type."""
+    templates = get_tenant_templates(ai_settings)
+    template = templates.get(reminder_type, GENERIC_REMINDER_TEMPLATE)
+    return template.format(
+        customer_name=customer_name,
+        pet_name=pet_name,
+        details=details,
+        clinic_name=ai_settings.get("clinic_info") or "VetFlow Veteriner Kliniği"
+    )
+
+
+class ReminderRenderer:
+    """
+    Renders a scheduler run's reminders.
+    Every job gets its template text first. Tenants with personalize_reminders
+    enabled then get LLM rewrites in batches, bounded by a concurrency limit and
+    a per-run call and time budget. Anything over budget or failing keeps its template.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = REMINDER_LLM_BATCH_SIZE,
+        concurrency: int = REMINDER_LLM_CONCURRENCY,
+        max_calls: int = REMINDER_LLM_MAX_CALLS,
+        max_seconds: float = REMINDER_LLM_MAX_SECONDS
+    ):
+        self.batch_size = batch_size
+        self.max_calls = max_calls
+        self.max_seconds = max_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._started = None
+        self.stats = {"templated": 0, "personalized": 0, "llm_calls": 0, "llm_failures": 0, "over_budget": 0}
+
+    def _remaining_seconds(self) -> float:
+        return self.max_seconds - (time.monotonic() - self._started)
+
+    async def _personalize_batch(self, ai_settings: dict, batch: List[Dict], messages: Dict[str, str]):
+        from ai_chat import generate_reminder_messages_batch
+
+        async with self._semaphore:
+            remaining = self._remaining_seconds()
+            if self.stats["llm_calls"] >= self.max_calls or remaining <= 0:
+                self.stats["over_budget"] += len(batch)
+                return
+            self.stats["llm_calls"] += 1
+
+            try:
+                rewritten = await asyncio.wait_for(
+                    generate_reminder_messages_batch(ai_settings, batch),
+                    timeout=remaining
+                )
+            except Exception as e:
+                self.stats["llm_failures"] += 1
+                logger.error(f"Reminder personalization error: {str(e)}")
+                return
+
+        for job in batch:
+            text = rewritten.get(job["key"])
+            if text:
+                messages[job["key"]] = text
+                self.stats["personalized"] += 1
+
+    async def render_all(self, jobs: List[Dict]) -> Dict[str, str]:
+        """
+        Render a list of jobs.
+        Each job: {"key", "ai_settings", "reminder_type", "customer_name", "pet_name", "details"}
+        Returns: {key: message}
+        """
+        from llm_backends import get_llm_backend
+
+        self._started = time.monotonic()
+        messages = {}
+        by_tenant: Dict[str, List[Dict]] = {}
+
+        for job in jobs:
+            ai_settings = job["ai_settings"]
+            messages[job["key"]] = render_reminder(
+                ai_settings,
+                job["reminder_type"],
+                job["customer_name"],
+                job["pet_name"],
+                job["details"]
+            )
+            self.stats["templated"] += 1
+            if ai_settings.get("personalize_reminders"):
+                by_tenant.setdefault(ai_settings.get("user_id", "system"), []).append(
+                    {**job, "template_message": messages[job["key"]]}
+                )
+
+        if by_tenant and get_llm_backend().is_configured():
+            tasks = []
+            for tenant_jobs in by_tenant.values():
+                ai_settings = tenant_jobs[0]["ai_settings"]
+                for i in range(0, len(tenant_jobs), self.batch_size):
+                    tasks.append(self._personalize_batch(ai_settings, tenant_jobs[i:i + self.batch_size], messages))
+            await asyncio.gather(*tasks)
+
+        elapsed = time.monotonic() - self._started
+        logger.info(f"Reminders rendered in {elapsed:.2f}s: {self.stats}")
+        return messages
+
+
+async def render_reminders(jobs: List[Dict], renderer: Optional[ReminderRenderer] = None) -> Dict[str, str]:
+    """Render jobs with a fresh per-run renderer unless one is supplied."""
+    return await (renderer or ReminderRenderer()).render_all(jobs)
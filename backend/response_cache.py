@@ -0,0 +1,182 @@
+"""
+VetFlow - WhatsApp Response Cache Module
+Per-tenant answer cache for frequent questions using character n-gram similarity,
+with a staff-curated FAQ layer on top
+"""
+import os
+import re
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.85"))
+FAQ_MATCH_THRESHOLD = float(os.environ.get("FAQ_MATCH_THRESHOLD", "0.75"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "200"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Very short messages ("evet", "tamam") depend on the conversation, never cache them
+MIN_CACHEABLE_CHARS = 12
+
+_TURKISH_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_NON_WORD = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase (Turkish-aware), fold diacritics, drop punctuation and collapse spaces."""
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    text = text.translate(_TURKISH_FOLD)
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def _trigram_vector(normalized: str) -> Tuple[Counter, float]:
+    padded = f"  {normalized} "
+    vector = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    norm = math.sqrt(sum(count * count for count in vector.values()))
+    return vector, norm
+
+
+def _similarity(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> float:
+    if not a[1] or not b[1]:
+        return 0.0
+    small, large = (a[0], b[0]) if len(a[0]) < len(b[0]) else (b[0], a[0])
+    dot = sum(count * large.get(gram, 0) for gram, count in small.items())
+    return dot / (a[1] * b[1])
+
+
+class TenantAnswerIndex:
+    """
+    Answers for one tenant at one AI settings version.
+    FAQ entries are always kept; generated answers are LRU-bounded and expire.
+    """
+
+    def __init__(self, version: str, faq_entries: List[Dict]):
+        self.version = version
+        self.faq: List[Tuple[Tuple[Counter, float], str, str]] = []
+        self.generated: "OrderedDict[str, Tuple[Tuple[Counter, float], str, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "faq_hits": 0, "misses": 0, "stored": 0}
+
+        for entry in faq_entries:
+            normalized = normalize_message(entry.get("question", ""))
+            if normalized and entry.get("answer"):
+                self.faq.append((_trigram_vector(normalized), entry["answer"], entry.get("faq_id")))
+
+    def lookup(self, normalized: str, include_generated: bool) -> Optional[Tuple[str, str]]:
+        """Returns: (answer, source) or None"""
+        vector = _trigram_vector(normalized)
+
+        best = None
+        best_score = FAQ_MATCH_THRESHOLD
+        for faq_vector, answer, _ in self.faq:
+            score = _similarity(vector, faq_vector)
+            if score >= best_score:
+                best, best_score = answer, score
+        if best:
+            self.stats["faq_hits"] += 1
+            return best, "faq"
+
+        if include_generated and len(normalized) >= MIN_CACHEABLE_CHARS:
+            now = time.monotonic()
+            exact = self.generated.get(normalized)
+            if exact and exact[2] > now:
+                self.generated.move_to_end(normalized)
+                self.stats["hits"] += 1
+                return exact[1], "cache"
+
+            best_key = None
+            best_score = RESPONSE_CACHE_THRESHOLD
+            for key, (cached_vector, _, expires_at) in self.generated.items():
+                if expires_at <= now:
+                    continue
+                score = _similarity(vector, cached_vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key:
+                self.generated.move_to_end(best_key)
+                self.stats["hits"] += 1
+                return self.generated[best_key][1], "cache"
+
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, normalized: str, answer: str):
+        if len(normalized) < MIN_CACHEABLE_CHARS:
+            return
+        self.generated[normalized] = (
+            _trigram_vector(normalized),
+            answer,
+            time.monotonic() + RESPONSE_CACHE_TTL_SECONDS
+        )
+        self.generated.move_to_end(normalized)
+        while len(self.generated) > RESPONSE_CACHE_MAX_ENTRIES:
+            self.generated.popitem(last=False)
+        self.stats["stored"] += 1
+
+
+# user_id -> index
+_indexes: Dict[str, TenantAnswerIndex] = {}
+
+
+async def get_answer_index(db, user_id: str, ai_settings: dict) -> TenantAnswerIndex:
+    """Get the tenant's index, rebuilding it (and reloading FAQ) when AI settings change."""
+    version = str(ai_settings.get("updated_at", ""))
+    index = _indexes.get(user_id)
+    if index is None or index.version != version:
+        faq_entries = await db.faq_entries.find({"user_id": user_id}, {"_id": 0}).to_list(500)
+        index = TenantAnswerIndex(version, faq_entries)
+        _indexes[user_id] = index
+    return index
+
+
+@traced("answer_cache.lookup")
+async def lookup_cached_answer(
+    db,
+    user_id: str,
+    ai_settings: dict,
+    message: str,
+    include_generated: bool = True
+) -> Optional[Tuple[str, str]]:
+    """
+    Find an answer for a message from the FAQ layer or, if allowed, from previously generated answers.
+    Returns: (answer, "faq" | "cache") or None
+    """
+    normalized = normalize_message(message)
+    if not normalized:
+        return None
+    index = await get_answer_index(db, user_id, ai_settings)
+    return index.lookup(normalized, include_generated)
+
+
+async def store_generated_answer(db, user_id: str, ai_settings: dict, message: str, answer: str):
+    """Remember an LLM answer for similar future questions."""
+    index = await get_answer_index(db, user_id, ai_settings)
+    index.store(normalize_message(message), answer)
+
+
+def invalidate_answer_cache(user_id: Optional[str] = None):
+    """Drop one tenant's index (e.g. after FAQ edits), or all indexes when user_id is None."""
+    if user_id is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(user_id, None)
+
+
+def get_cache_stats(user_id: str) -> Dict:
+    """Hit/miss counters for a tenant since its index was last built."""
+    index = _indexes.get(user_id)
+    if index is None:
+        return {"hits": 0, "faq_hits": 0, "misses": 0, "stored": 0, "hit_rate": 0.0, "entries": 0, "faq_entries": 0}
+
+    stats = dict(index.stats)
+    total = stats["hits"] + stats["faq_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["faq_hits"]) / total, 4) if total else 0.0
+    stats["entries"] = len(index.generated)
+    stats["faq_entries"] = len(index.faq)
+    return stats
@@ -3,6 +3,7 @@ VetFlow - Scheduler Module for automated reminders
 Uses APScheduler for background task scheduling
 """
 import asyncio
+import time
 from datetime import datetime, timezone, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -10,18 +11,42 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 
+from dates import as_utc
+from counters import reconcile_all_tenant_counters
+from versions import bump_version
+from metrics import observe_job
+from querylog import recording
+from tracing import root_span, new_trace_id
+from profiling import profiled_job
+from events import publish_event
+from subscription import rollover_subscription_periods
+from importer import fail_orphaned_imports
+
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
 
+async def _find_by_ids(db, collection: str, id_field: str, ids) -> dict:
+    """Load the documents for a set of ids in one query, keyed by id."""
+    unique_ids = list({i for i in ids if i})
+    if not unique_ids:
+        return {}
+    docs = await db[collection].find(
+        {id_field: {"$in": unique_ids}},
+        {"_id": 0}
+    ).to_list(len(unique_ids))
+    return {doc[id_field]: doc for doc in docs}
+
+
 async def check_and_send_reminders(db):
     """
     Check for upcoming reminders and send WhatsApp messages.
     Runs every hour.
     """
-    from whatsapp import send_text_message, is_whatsapp_configured
-    from ai_chat import generate_reminder_message
+    from whatsapp import send_text_message
+    from reminder_renderer import render_reminders
+    from counters import increment_counter
     
     try:
         now = datetime.now(timezone.utc)
@@ -29,45 +54,41 @@ async def check_and_send_reminders(db):
         
         # Find reminders due in the next 2 days that haven't been sent
         reminders = await db.reminders.find({
-            "due_date": {"$lte": reminder_window.isoformat(), "$gte": now.isoformat()},
+            "due_date": {"$lte": reminder_window, "$gte": now},
             "sent": False
         }, {"_id": 0}).to_list(100)
         
+        # Load customers, pets and AI settings for the whole run at once
+        customers = await _find_by_ids(db, "customers", "customer_id", [r.get("customer_id") for r in reminders])
+        pets = await _find_by_ids(db, "pets", "pet_id", [r.get("pet_id") for r in reminders])
+        settings = await _find_by_ids(db, "ai_settings", "user_id", [r.get("user_id") for r in reminders])
+        
+        jobs = []
         for reminder in reminders:
+            customer = customers.get(reminder["customer_id"])
+            if not customer:
+                continue
+            
+            pet = pets.get(reminder.get("pet_id"))
+            jobs.append({
+                "key": reminder["reminder_id"],
+                "reminder": reminder,
+                "customer": customer,
+                "ai_settings": settings.get(reminder["user_id"], {}),
+                "reminder_type": reminder["reminder_type"],
+                "customer_name": customer["name"],
+                "pet_name": pet["name"] if pet else "evcil hayvanınız",
+                "details": reminder["message"]
+            })
+        
+        # Template-first rendering, LLM personalization only where enabled
+        messages = await render_reminders(jobs)
+        
+        for job in jobs:
+            reminder = job["reminder"]
+            customer = job["customer"]
             try:
-                # Get customer info
-                customer = await db.customers.find_one(
-                    {"customer_id": reminder["customer_id"]},
-                    {"_id": 0}
-                )
-                
-                if not customer:
-                    continue
-                
-                # Get pet info if applicable
-                pet_name = "evcil hayvanınız"
-                if reminder.get("pet_id"):
-                    pet = await db.pets.find_one(
-                        {"pet_id": reminder["pet_id"]},
-                        {"_id": 0}
-                    )
-                    if pet:
-                        pet_name = pet["name"]
-                
-                # Get AI settings for the user
-                ai_settings = await db.ai_settings.find_one(
-                    {"user_id": reminder["user_id"]},
-                    {"_id": 0}
-                ) or {}
-                
-                # Generate personalized message
-                message = await generate_reminder_message(
-                    reminder_type=reminder["reminder_type"],
-                    customer_name=customer["name"],
-                    pet_name=pet_name,
-                    details=reminder["message"],
-                    ai_settings=ai_settings
-                )
+                message = messages[job["key"]]
                 
                 # Send WhatsApp message
                 result = await send_text_message(customer["phone"], message)
@@ -78,13 +99,14 @@ async def check_and_send_reminders(db):
                     {
                         "$set": {
                             "sent": True,
-                            "sent_at": now.isoformat()
+                            "sent_at": now
                         }
                     }
                 )
+                await bump_version(db, reminder["user_id"], "reminders")
                 
                 # Log message
-                await db.whatsapp_messages.insert_one({
+                message_doc = {
                     "message_id": f"msg_{datetime.now().timestamp()}",
                     "user_id": reminder["user_id"],
                     "direction": "outbound",
@@ -93,8 +115,12 @@ async def check_and_send_reminders(db):
                     "message_type": "text",
                     "status": "sent" if result.get("success") else "failed",
                     "customer_id": customer["customer_id"],
-                    "created_at": now.isoformat()
-                })
+                    "created_at": now
+                }
+                await db.whatsapp_messages.insert_one(message_doc)
+                await increment_counter(db, reminder["user_id"], "messages")
+                await bump_version(db, reminder["user_id"], "whatsapp_messages")
+                publish_event(reminder["user_id"], "message.created", message_doc)
                 
                 logger.info(f"Reminder sent: {reminder['reminder_id']}")
                 
@@ -111,7 +137,7 @@ async def check_food_reminders(db):
     Runs daily at 9 AM.
     """
     from whatsapp import send_text_message
-    from ai_chat import generate_reminder_message
+    from reminder_renderer import render_reminders
     
     try:
         now = datetime.now(timezone.utc)
@@ -122,12 +148,11 @@ async def check_food_reminders(db):
             {"_id": 0}
         ).to_list(1000)
         
+        due_usages = []
         for usage in usages:
             try:
                 # Calculate remaining days
-                last_purchase = datetime.fromisoformat(usage["last_purchase_date"].replace("Z", "+00:00"))
-                if last_purchase.tzinfo is None:
-                    last_purchase = last_purchase.replace(tzinfo=timezone.utc)
+                last_purchase = as_utc(usage["last_purchase_date"])
                 
                 days_since_purchase = (now - last_purchase).days
                 total_consumed = days_since_purchase * usage["daily_consumption"]
@@ -141,68 +166,78 @@ async def check_food_reminders(db):
                         "pet_id": usage["pet_id"],
                         "product_id": usage["product_id"],
                         "reminder_type": "food",
-                        "due_date": {"$gte": (now - timedelta(days=1)).isoformat()}
+                        "due_date": {"$gte": now - timedelta(days=1)}
                     })
                     
                     if existing_reminder:
                         continue
                     
-                    # Get customer and pet info
-                    customer = await db.customers.find_one(
-                        {"customer_id": usage["customer_id"]},
-                        {"_id": 0}
-                    )
-                    pet = await db.pets.find_one(
-                        {"pet_id": usage["pet_id"]},
-                        {"_id": 0}
-                    )
-                    product = await db.products.find_one(
-                        {"product_id": usage["product_id"]},
-                        {"_id": 0}
-                    )
-                    
-                    if not all([customer, pet, product]):
-                        continue
-                    
-                    # Get AI settings
-                    ai_settings = await db.ai_settings.find_one(
-                        {"user_id": usage["user_id"]},
-                        {"_id": 0}
-                    ) or {}
-                    
-                    # Generate message
-                    details = f"{product['name']} yaklaşık {int(remaining_days)} gün içinde bitecek."
-                    message = await generate_reminder_message(
-                        reminder_type="food",
-                        customer_name=customer["name"],
-                        pet_name=pet["name"],
-                        details=details,
-                        ai_settings=ai_settings
-                    )
-                    
-                    # Send message
-                    result = await send_text_message(customer["phone"], message)
-                    
-                    # Create reminder record
-                    await db.reminders.insert_one({
-                        "reminder_id": f"rem_{datetime.now().timestamp()}",
-                        "user_id": usage["user_id"],
-                        "reminder_type": "food",
-                        "title": f"{pet['name']} - Mama Hatırlatması",
-                        "message": details,
-                        "due_date": now.isoformat(),
-                        "customer_id": customer["customer_id"],
-                        "pet_id": pet["pet_id"],
-                        "product_id": product["product_id"],
-                        "sent": True,
-                        "sent_at": now.isoformat(),
-                        "created_at": now.isoformat()
-                    })
-                    
-                    logger.info(f"Food reminder sent for pet {pet['pet_id']}")
+                    due_usages.append((usage, remaining_days))
                     
             except Exception as e:
                 logger.error(f"Error processing food usage {usage.get('usage_id')}: {str(e)}")
+        
+        # Load customers, pets, products and AI settings for the whole run at once
+        customers = await _find_by_ids(db, "customers", "customer_id", [u["customer_id"] for u, _ in due_usages])
+        pets = await _find_by_ids(db, "pets", "pet_id", [u["pet_id"] for u, _ in due_usages])
+        products = await _find_by_ids(db, "products", "product_id", [u["product_id"] for u, _ in due_usages])
+        settings = await _find_by_ids(db, "ai_settings", "user_id", [u["user_id"] for u, _ in due_usages])
+        
+        jobs = []
+        for usage, remaining_days in due_usages:
+            customer = customers.get(usage["customer_id"])
+            pet = pets.get(usage["pet_id"])
+            product = products.get(usage["product_id"])
+            
+            if not all([customer, pet, product]):
+                continue
+            
+            details = f"{product['name']} yaklaşık {int(remaining_days)} gün içinde bitecek."
+            jobs.append({
+                "key": usage["usage_id"],
+                "usage": usage,
+                "customer": customer,
+                "pet": pet,
+                "product": product,
+                "ai_settings": settings.get(usage["user_id"], {}),
+                "reminder_type": "food",
+                "customer_name": customer["name"],
+                "pet_name": pet["name"],
+                "details": details
+            })
+        
+        messages = await render_reminders(jobs)
+        
+        for job in jobs:
+            usage = job["usage"]
+            customer = job["customer"]
+            pet = job["pet"]
+            product = job["product"]
+            try:
+                # Send message
+                result = await send_text_message(customer["phone"], messages[job["key"]])
+                
+                # Create reminder record
+                await db.reminders.insert_one({
+                    "reminder_id": f"rem_{datetime.now().timestamp()}",
+                    "user_id": usage["user_id"],
+                    "reminder_type": "food",
+                    "title": f"{pet['name']} - Mama Hatırlatması",
+                    "message": job["details"],
+                    "due_date": now,
+                    "customer_id": customer["customer_id"],
+                    "pet_id": pet["pet_id"],
+                    "product_id": product["product_id"],
+                    "sent": True,
+                    "sent_at": now,
+                    "created_at": now
+                })
+                await bump_version(db, usage["user_id"], "reminders")
+                
+                logger.info(f"Food reminder sent for pet {pet['pet_id']}")
+                
+            except Exception as e:
+                logger.error(f"Error processing food usage {usage.get('usage_id')}: {str(e)}")
                 
     except Exception as e:
         logger.error(f"Food reminder check error: {str(e)}")
@@ -214,7 +249,7 @@ async def check_appointment_reminders(db):
     Runs every 2 hours.
     """
     from whatsapp import send_text_message
-    from ai_chat import generate_reminder_message
+    from reminder_renderer import render_reminders
     
     try:
         now = datetime.now(timezone.utc)
@@ -222,47 +257,55 @@ async def check_appointment_reminders(db):
         
         # Find appointments in the next 2 days that haven't had reminders sent
         appointments = await db.appointments.find({
-            "date": {"$lte": reminder_window.isoformat(), "$gte": now.isoformat()},
+            "date": {"$lte": reminder_window, "$gte": now},
             "reminder_sent": False,
             "status": {"$in": ["scheduled", "confirmed"]}
         }, {"_id": 0}).to_list(100)
         
+        customers = await _find_by_ids(db, "customers", "customer_id", [a["customer_id"] for a in appointments])
+        pets = await _find_by_ids(db, "pets", "pet_id", [a["pet_id"] for a in appointments])
+        settings = await _find_by_ids(db, "ai_settings", "user_id", [a["user_id"] for a in appointments])
+        
+        jobs = []
         for apt in appointments:
+            customer = customers.get(apt["customer_id"])
+            pet = pets.get(apt["pet_id"])
+            
+            if not all([customer, pet]):
+                continue
+            
             try:
-                customer = await db.customers.find_one(
-                    {"customer_id": apt["customer_id"]},
-                    {"_id": 0}
-                )
-                pet = await db.pets.find_one(
-                    {"pet_id": apt["pet_id"]},
-                    {"_id": 0}
-                )
-                
-                if not all([customer, pet]):
-                    continue
-                
-                ai_settings = await db.ai_settings.find_one(
-                    {"user_id": apt["user_id"]},
-                    {"_id": 0}
-                ) or {}
-                
-                apt_date = datetime.fromisoformat(apt["date"].replace("Z", "+00:00"))
-                details = f"{apt['title']} - {apt_date.strftime('%d/%m/%Y %H:%M')}"
-                
-                message = await generate_reminder_message(
-                    reminder_type="appointment",
-                    customer_name=customer["name"],
-                    pet_name=pet["name"],
-                    details=details,
-                    ai_settings=ai_settings
-                )
-                
-                result = await send_text_message(customer["phone"], message)
+                apt_date = as_utc(apt["date"])
+            except Exception as e:
+                logger.error(f"Error sending appointment reminder: {str(e)}")
+                continue
+            
+            jobs.append({
+                "key": apt["appointment_id"],
+                "appointment": apt,
+                "customer": customer,
+                "ai_settings": settings.get(apt["user_id"], {}),
+                "reminder_type": "appointment",
+                "customer_name": customer["name"],
+                "pet_name": pet["name"],
+                "details": f"{apt['title']} - {apt_date.strftime('%d/%m/%Y %H:%M')}"
+            })
+        
+        messages = await render_reminders(jobs)
+        
+        for job in jobs:
+            apt = job["appointment"]
+            try:
+                result = await send_text_message(job["customer"]["phone"], messages[job["key"]])
                 
                 await db.appointments.update_one(
                     {"appointment_id": apt["appointment_id"]},
                     {"$set": {"reminder_sent": True}}
                 )
+                await bump_version(db, apt["user_id"], "appointments")
+                publish_event(apt["user_id"], "appointment.updated", {
+                    "appointment_id": apt["appointment_id"], "reminder_sent": True
+                })
                 
                 logger.info(f"Appointment reminder sent: {apt['appointment_id']}")
                 
@@ -273,12 +316,34 @@ async def check_appointment_reminders(db):
         logger.error(f"Appointment reminder check error: {str(e)}")
 
 
+def timed_job(job_id: str, func):
+    """
+    Wrap a job coroutine (called with db first) so every run is traced under its
+    own correlation id, its duration and outcome are recorded, its queries are
+    checked like a request's, and it is profiled when an admin armed it.
+    """
+    async def run(db, *args, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            with root_span(f"job {job_id}", request_id=f"job-{job_id}-{new_trace_id()[:8]}", **{"job.id": job_id}):
+                async with recording(db, f"job {job_id}"), profiled_job(db, job_id):
+                    result = await func(db, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            observe_job(job_id, time.perf_counter() - started, ok)
+
+    run.__name__ = func.__name__
+    return run
+
+
 def setup_scheduler(db):
     """Setup and start the scheduler with all jobs."""
     
     # Check reminders every hour
     scheduler.add_job(
-        check_and_send_reminders,
+        timed_job("check_reminders", check_and_send_reminders),
         CronTrigger(minute=0),
         args=[db],
         id="check_reminders",
@@ -287,7 +352,7 @@ def setup_scheduler(db):
     
     # Check food reminders daily at 9 AM
     scheduler.add_job(
-        check_food_reminders,
+        timed_job("check_food_reminders", check_food_reminders),
         CronTrigger(hour=9, minute=0),
         args=[db],
         id="check_food_reminders",
@@ -296,13 +361,40 @@ def setup_scheduler(db):
     
     # Check appointment reminders every 2 hours
     scheduler.add_job(
-        check_appointment_reminders,
+        timed_job("check_appointment_reminders", check_appointment_reminders),
         CronTrigger(hour="*/2", minute=30),
         args=[db],
         id="check_appointment_reminders",
         replace_existing=True
     )
     
+    # Roll over ended subscription periods every hour
+    scheduler.add_job(
+        timed_job("rollover_subscriptions", rollover_subscription_periods),
+        CronTrigger(minute=15),
+        args=[db],
+        id="rollover_subscriptions",
+        replace_existing=True
+    )
+    
+    # Fail imports orphaned by a worker restart every hour
+    scheduler.add_job(
+        timed_job("fail_orphaned_imports", fail_orphaned_imports),
+        CronTrigger(minute=45),
+        args=[db],
+        id="fail_orphaned_imports",
+        replace_existing=True
+    )
+    
+    # Reconcile denormalized tenant counters daily at 3 AM
+    scheduler.add_job(
+        timed_job("reconcile_tenant_counters", reconcile_all_tenant_counters),
+        CronTrigger(hour=3, minute=0),
+        args=[db],
+        id="reconcile_tenant_counters",
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Scheduler started with reminder jobs")
 
@@ -4,9 +4,11 @@ FastAPI Backend Server
 """
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Query
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
@@ -24,21 +26,57 @@ from models import (
     Reminder, ReminderCreate, ReminderType,
     Transaction, TransactionCreate, TransactionType,
     WhatsAppMessage, AISettings, AISettingsUpdate,
+    FAQEntry, FAQEntryCreate, FAQEntryUpdate, ImportJob,
     generate_id
 )
 from auth import (
     hash_password, verify_password, create_jwt_token,
     get_current_user, exchange_emergent_session,
-    set_session_cookie, clear_session_cookie
+    set_session_cookie, clear_session_cookie,
+    create_stream_ticket, decode_stream_ticket, STREAM_TICKET_SECONDS
 )
 from subscription import (
-    SUBSCRIPTION_PLANS, RESPONSE_PACKAGES,
+    SUBSCRIPTION_PLANS, RESPONSE_PACKAGES, SUBSCRIPTION_PERIOD_DAYS,
     Subscription, SubscriptionCreate, PaymentTransaction,
     generate_subscription_id, generate_transaction_id,
-    check_customer_limit, check_whatsapp_response_limit,
-    use_whatsapp_response, add_extra_responses,
+    check_customer_limit,
+    reserve_customer_slot, release_customer_slot,
+    reserve_whatsapp_response, refund_whatsapp_response, add_extra_responses,
     create_trial_subscription
 )
+from counters import increment_counter, get_tenant_counters
+from versions import bump_version
+from events import publish_event, event_stream
+from changefeed import run_change_feed
+from metrics import (
+    CommandMetricsListener, MetricsMiddleware, METRICS_CONTENT_TYPE,
+    render_metrics, authorized as metrics_authorized
+)
+from querylog import QUERY_RECORDER_ENABLED, QueryRecorderListener, QueryRecorderMiddleware
+from tracing import (
+    TRACING_ENABLED, MongoSpanListener, TracingMiddleware,
+    install_log_correlation, get_exporter
+)
+from profiling import (
+    ProfilingMiddleware, ensure_profile_indexes, is_admin,
+    profiler_available, arm_job, armed_jobs
+)
+from importer import (
+    IMPORT_MAX_BYTES, import_format, spool_upload, start_import, ensure_import_indexes
+)
+from dates import as_utc, migrate_datetime_fields
+from middleware import CompressionMiddleware, ConditionalGetMiddleware
+from codec import get_codec, to_document, wants_ndjson, FastJSONResponse
+from tenant_context import TenantContext, load_tenant_context, invalidate_tenant_context
+from conversation import (
+    load_conversation, classify_confirmation,
+    get_pending_appointment, save_pending_appointment, clear_pending_appointment
+)
+from intent_parser import parse_booking_request
+from response_cache import (
+    lookup_cached_answer, store_generated_answer,
+    invalidate_answer_cache, get_cache_stats
+)
 try:
     from emergentintegrations.payments.stripe.checkout import (
         StripeCheckout, CheckoutSessionRequest, CheckoutSessionResponse, CheckoutStatusResponse
@@ -54,21 +92,27 @@ except ModuleNotFoundError:
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection (dates are stored as BSON datetimes and read back as aware UTC)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+command_listeners = [CommandMetricsListener()]
+if QUERY_RECORDER_ENABLED:
+    command_listeners.append(QueryRecorderListener())
+if TRACING_ENABLED:
+    command_listeners.append(MongoSpanListener())
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=command_listeners)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app
-app = FastAPI(title="VetFlow API", version="1.0.0")
+app = FastAPI(title="VetFlow API", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure logging
+# Configure logging (request_id correlates the lines of one request or job)
+install_log_correlation()
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 )
 logger = logging.getLogger(__name__)
 
@@ -78,6 +122,26 @@ async def get_user(request: Request) -> User:
     return await get_current_user(request, db)
 
 
+# Dependency to get the tenant's subscription/plan/AI settings bundle (once per request)
+async def get_tenant(user: User = Depends(get_user)) -> TenantContext:
+    return await load_tenant_context(db, user.user_id)
+
+
+def date_range_filter(start_date: Optional[str], end_date: Optional[str]) -> Optional[dict]:
+    """Build a {"$gte", "$lte"} datetime filter from ISO date query parameters."""
+    try:
+        start, end = as_utc(start_date), as_utc(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    
+    date_filter = {}
+    if start:
+        date_filter["$gte"] = start
+    if end:
+        date_filter["$lte"] = end
+    return date_filter or None
+
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -94,17 +158,14 @@ async def register(user_data: UserCreate, response: Response):
         name=user_data.name,
         clinic_name=user_data.clinic_name
     )
-    user_dict = user.model_dump()
+    user_dict = to_document(user)
     user_dict["password_hash"] = hash_password(user_data.password)
-    user_dict["created_at"] = user_dict["created_at"].isoformat()
     
     await db.users.insert_one(user_dict)
     
     # Create default AI settings
     ai_settings = AISettings(user_id=user.user_id)
-    ai_dict = ai_settings.model_dump()
-    ai_dict["created_at"] = ai_dict["created_at"].isoformat()
-    ai_dict["updated_at"] = ai_dict["updated_at"].isoformat()
+    ai_dict = to_document(ai_settings)
     await db.ai_settings.insert_one(ai_dict)
     
     # Generate token
@@ -159,15 +220,12 @@ async def google_auth(request: Request, response: Response):
     else:
         # Create new user
         user = User(email=email, name=name, picture=picture)
-        user_dict = user.model_dump()
-        user_dict["created_at"] = user_dict["created_at"].isoformat()
+        user_dict = to_document(user)
         await db.users.insert_one(user_dict)
         
         # Create default AI settings
         ai_settings = AISettings(user_id=user.user_id)
-        ai_dict = ai_settings.model_dump()
-        ai_dict["created_at"] = ai_dict["created_at"].isoformat()
-        ai_dict["updated_at"] = ai_dict["updated_at"].isoformat()
+        ai_dict = to_document(ai_settings)
         await db.ai_settings.insert_one(ai_dict)
     
     # Store session
@@ -176,8 +234,8 @@ async def google_auth(request: Request, response: Response):
         "session_id": generate_id("sess_"),
         "user_id": user.user_id,
         "session_token": session_token,
-        "expires_at": expires_at.isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "expires_at": expires_at,
+        "created_at": datetime.now(timezone.utc)
     })
     
     set_session_cookie(response, session_token)
@@ -216,15 +274,20 @@ async def get_customers(
             {"email": {"$regex": search, "$options": "i"}}
         ]
     
-    customers = await db.customers.find(query, {"_id": 0}).to_list(limit)
-    return customers
+    codec = get_codec(Customer)
+    customers = await db.customers.find(query, codec.projection).to_list(limit)
+    return codec.list_response(customers)
 
 
 @api_router.post("/customers", response_model=Customer)
-async def create_customer(data: CustomerCreate, user: User = Depends(get_user)):
+async def create_customer(
+    data: CustomerCreate,
+    user: User = Depends(get_user),
+    tenant: TenantContext = Depends(get_tenant)
+):
     """Create a new customer."""
-    # Check subscription limit
-    limit_check = await check_customer_limit(db, user.user_id)
+    # Claim a slot against the subscription limit (atomic conditional increment)
+    limit_check = await reserve_customer_slot(db, user.user_id, tenant)
     if not limit_check["can_add"]:
         raise HTTPException(
             status_code=403, 
@@ -232,18 +295,15 @@ async def create_customer(data: CustomerCreate, user: User = Depends(get_user)):
         )
     
     customer = Customer(**data.model_dump(), user_id=user.user_id)
-    doc = customer.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
+    doc = to_document(customer)
     
-    await db.customers.insert_one(doc)
-    
-    # Update customer count in subscription
-    await db.subscriptions.update_one(
-        {"user_id": user.user_id, "status": {"$in": ["active", "trial"]}},
-        {"$inc": {"customer_count": 1}}
-    )
+    try:
+        await db.customers.insert_one(doc)
+    except Exception:
+        await release_customer_slot(db, user.user_id)
+        raise
     
+    await bump_version(db, user.user_id, "customers")
     return customer
 
 
@@ -262,8 +322,7 @@ async def get_customer(customer_id: str, user: User = Depends(get_user)):
 @api_router.put("/customers/{customer_id}", response_model=Customer)
 async def update_customer(customer_id: str, data: CustomerUpdate, user: User = Depends(get_user)):
     """Update a customer."""
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data = get_codec(Customer).update(data)
     
     result = await db.customers.update_one(
         {"customer_id": customer_id, "user_id": user.user_id},
@@ -273,6 +332,7 @@ async def update_customer(customer_id: str, data: CustomerUpdate, user: User = D
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
     
+    await bump_version(db, user.user_id, "customers")
     return await db.customers.find_one({"customer_id": customer_id}, {"_id": 0})
 
 
@@ -284,6 +344,8 @@ async def delete_customer(customer_id: str, user: User = Depends(get_user)):
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
+    await increment_counter(db, user.user_id, "customers", -1)
+    await bump_version(db, user.user_id, "customers")
     return {"message": "Customer deleted"}
 
 
@@ -300,8 +362,9 @@ async def get_pets(
     if customer_id:
         query["customer_id"] = customer_id
     
-    pets = await db.pets.find(query, {"_id": 0}).to_list(limit)
-    return pets
+    codec = get_codec(Pet)
+    pets = await db.pets.find(query, codec.projection).to_list(limit)
+    return codec.list_response(pets)
 
 
 @api_router.post("/pets", response_model=Pet)
@@ -315,13 +378,11 @@ async def create_pet(data: PetCreate, user: User = Depends(get_user)):
         raise HTTPException(status_code=404, detail="Customer not found")
     
     pet = Pet(**data.model_dump(), user_id=user.user_id)
-    doc = pet.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
-    if doc.get("birth_date"):
-        doc["birth_date"] = doc["birth_date"].isoformat()
+    doc = to_document(pet)
     
     await db.pets.insert_one(doc)
+    await increment_counter(db, user.user_id, "pets")
+    await bump_version(db, user.user_id, "pets")
     return pet
 
 
@@ -340,10 +401,7 @@ async def get_pet(pet_id: str, user: User = Depends(get_user)):
 @api_router.put("/pets/{pet_id}", response_model=Pet)
 async def update_pet(pet_id: str, data: PetUpdate, user: User = Depends(get_user)):
     """Update a pet."""
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-    if update_data.get("birth_date"):
-        update_data["birth_date"] = update_data["birth_date"].isoformat()
+    update_data = get_codec(Pet).update(data)
     
     result = await db.pets.update_one(
         {"pet_id": pet_id, "user_id": user.user_id},
@@ -353,6 +411,7 @@ async def update_pet(pet_id: str, data: PetUpdate, user: User = Depends(get_user
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Pet not found")
     
+    await bump_version(db, user.user_id, "pets")
     return await db.pets.find_one({"pet_id": pet_id}, {"_id": 0})
 
 
@@ -364,9 +423,53 @@ async def delete_pet(pet_id: str, user: User = Depends(get_user)):
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Pet not found")
+    await increment_counter(db, user.user_id, "pets", -1)
+    await bump_version(db, user.user_id, "pets")
     return {"message": "Pet deleted"}
 
 
+# ============ IMPORT ROUTES ============
+
+@api_router.post("/imports", response_model=ImportJob, status_code=202)
+async def create_import(
+    request: Request,
+    file_format: Optional[str] = Query(None, alias="format"),
+    filename: Optional[str] = None,
+    user: User = Depends(get_user)
+):
+    """
+    Bulk import owners and pets from a CSV/XLSX file sent as the raw request body.
+    The body is streamed to disk; poll GET /imports/{job_id} for progress and row errors.
+    """
+    file_format = import_format(file_format, filename)
+    if not file_format:
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+    
+    path = await spool_upload(request.stream(), file_format)
+    if path is None:
+        raise HTTPException(status_code=413, detail=f"File larger than {IMPORT_MAX_BYTES // (1024 * 1024)} MB")
+    
+    return await start_import(db, user.user_id, path, file_format, filename)
+
+
+@api_router.get("/imports", response_model=List[ImportJob])
+async def get_imports(user: User = Depends(get_user), limit: int = Query(default=20, le=100)):
+    """Recent import jobs, newest first (without the row error report)."""
+    jobs = await db.import_jobs.find(
+        {"user_id": user.user_id}, {"_id": 0, "errors": 0}
+    ).sort("created_at", -1).to_list(limit)
+    return jobs
+
+
+@api_router.get("/imports/{job_id}", response_model=ImportJob)
+async def get_import(job_id: str, user: User = Depends(get_user)):
+    """Progress, counts and row errors of an import job."""
+    job = await db.import_jobs.find_one({"job_id": job_id, "user_id": user.user_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
+
 # ============ HEALTH RECORD ROUTES ============
 
 @api_router.get("/health-records", response_model=List[HealthRecord])
@@ -380,8 +483,9 @@ async def get_health_records(
     if pet_id:
         query["pet_id"] = pet_id
     
-    records = await db.health_records.find(query, {"_id": 0}).to_list(limit)
-    return records
+    codec = get_codec(HealthRecord)
+    records = await db.health_records.find(query, codec.projection).to_list(limit)
+    return codec.list_response(records)
 
 
 @api_router.post("/health-records", response_model=HealthRecord)
@@ -395,13 +499,10 @@ async def create_health_record(data: HealthRecordCreate, user: User = Depends(ge
         raise HTTPException(status_code=404, detail="Pet not found")
     
     record = HealthRecord(**data.model_dump(), user_id=user.user_id)
-    doc = record.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["date"] = doc["date"].isoformat()
-    if doc.get("next_due_date"):
-        doc["next_due_date"] = doc["next_due_date"].isoformat()
+    doc = to_document(record)
     
     await db.health_records.insert_one(doc)
+    await bump_version(db, user.user_id, "health_records")
     
     # Create reminder if next_due_date is set
     if data.next_due_date:
@@ -418,10 +519,9 @@ async def create_health_record(data: HealthRecordCreate, user: User = Depends(ge
             customer_id=customer["customer_id"],
             pet_id=data.pet_id
         )
-        rem_doc = reminder.model_dump()
-        rem_doc["created_at"] = rem_doc["created_at"].isoformat()
-        rem_doc["due_date"] = rem_doc["due_date"].isoformat()
+        rem_doc = to_document(reminder)
         await db.reminders.insert_one(rem_doc)
+        await bump_version(db, user.user_id, "reminders")
     
     return record
 
@@ -439,18 +539,15 @@ async def get_appointments(
     """Get appointments."""
     query = {"user_id": user.user_id}
     
-    if start_date:
-        query["date"] = {"$gte": start_date}
-    if end_date:
-        if "date" in query:
-            query["date"]["$lte"] = end_date
-        else:
-            query["date"] = {"$lte": end_date}
+    date_filter = date_range_filter(start_date, end_date)
+    if date_filter:
+        query["date"] = date_filter
     if status:
         query["status"] = status
     
-    appointments = await db.appointments.find(query, {"_id": 0}).sort("date", 1).to_list(limit)
-    return appointments
+    codec = get_codec(Appointment)
+    appointments = await db.appointments.find(query, codec.projection).sort("date", 1).to_list(limit)
+    return codec.list_response(appointments)
 
 
 @api_router.post("/appointments", response_model=Appointment)
@@ -470,12 +567,12 @@ async def create_appointment(data: AppointmentCreate, user: User = Depends(get_u
         raise HTTPException(status_code=404, detail="Pet not found")
     
     appointment = Appointment(**data.model_dump(), user_id=user.user_id)
-    doc = appointment.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
-    doc["date"] = doc["date"].isoformat()
+    doc = to_document(appointment)
     
     await db.appointments.insert_one(doc)
+    await increment_counter(db, user.user_id, "appointments")
+    await bump_version(db, user.user_id, "appointments")
+    publish_event(user.user_id, "appointment.created", doc)
     return appointment
 
 
@@ -486,10 +583,7 @@ async def update_appointment(
     user: User = Depends(get_user)
 ):
     """Update an appointment."""
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-    if update_data.get("date"):
-        update_data["date"] = update_data["date"].isoformat()
+    update_data = get_codec(Appointment).update(data)
     
     result = await db.appointments.update_one(
         {"appointment_id": appointment_id, "user_id": user.user_id},
@@ -499,7 +593,10 @@ async def update_appointment(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    return await db.appointments.find_one({"appointment_id": appointment_id}, {"_id": 0})
+    await bump_version(db, user.user_id, "appointments")
+    updated = await db.appointments.find_one({"appointment_id": appointment_id}, {"_id": 0})
+    publish_event(user.user_id, "appointment.updated", updated)
+    return updated
 
 
 @api_router.delete("/appointments/{appointment_id}")
@@ -510,6 +607,9 @@ async def delete_appointment(appointment_id: str, user: User = Depends(get_user)
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    await increment_counter(db, user.user_id, "appointments", -1)
+    await bump_version(db, user.user_id, "appointments")
+    publish_event(user.user_id, "appointment.deleted", {"appointment_id": appointment_id})
     return {"message": "Appointment deleted"}
 
 
@@ -580,9 +680,13 @@ async def cancel_appointment_with_notification(
         {"appointment_id": appointment_id},
         {"$set": {
             "status": "cancelled",
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
+    await bump_version(db, user.user_id, "appointments")
+    publish_event(user.user_id, "appointment.updated", {
+        "appointment_id": appointment_id, "status": "cancelled"
+    })
     
     # Get AI settings for message tone
     ai_settings = await db.ai_settings.find_one({"user_id": user.user_id}, {"_id": 0}) or {}
@@ -591,12 +695,7 @@ async def cancel_appointment_with_notification(
     # Parse appointment date
     apt_date = appointment.get("date", "")
     try:
-        if isinstance(apt_date, str):
-            from datetime import datetime as dt
-            apt_dt = dt.fromisoformat(apt_date.replace("Z", "+00:00"))
-            formatted_date = apt_dt.strftime("%d/%m/%Y %H:%M")
-        else:
-            formatted_date = str(apt_date)
+        formatted_date = as_utc(apt_date).strftime("%d/%m/%Y %H:%M")
     except:
         formatted_date = apt_date
     
@@ -614,7 +713,7 @@ Yeni randevu almak için bizimle iletişime geçebilirsiniz.
     whatsapp_result = await send_text_message(customer["phone"], cancel_message)
     
     # Log the message
-    await db.whatsapp_messages.insert_one({
+    message_doc = {
         "message_id": generate_id("msg_"),
         "user_id": user.user_id,
         "direction": "outbound",
@@ -623,8 +722,12 @@ Yeni randevu almak için bizimle iletişime geçebilirsiniz.
         "message_type": "text",
         "status": "sent" if whatsapp_result.get("success") else "failed",
         "customer_id": customer["customer_id"],
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.whatsapp_messages.insert_one(message_doc)
+    await increment_counter(db, user.user_id, "messages")
+    await bump_version(db, user.user_id, "whatsapp_messages")
+    publish_event(user.user_id, "message.created", message_doc)
     
     return {
         "message": "Randevu iptal edildi ve müşteriye bildirim gönderildi",
@@ -706,25 +809,26 @@ async def get_products(
     if category:
         query["category"] = category
     
-    products = await db.products.find(query, {"_id": 0}).to_list(limit)
-    return products
+    codec = get_codec(Product)
+    products = await db.products.find(query, codec.projection).to_list(limit)
+    return codec.list_response(products)
 
 
 @api_router.post("/products", response_model=Product)
 async def create_product(data: ProductCreate, user: User = Depends(get_user)):
     """Create a new product."""
     product = Product(**data.model_dump(), user_id=user.user_id)
-    doc = product.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
+    doc = to_document(product)
     
     await db.products.insert_one(doc)
+    await bump_version(db, user.user_id, "products")
     return product
 
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, data: ProductUpdate, user: User = Depends(get_user)):
     """Update a product."""
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
+    update_data = get_codec(Product).update(data)
     
     result = await db.products.update_one(
         {"product_id": product_id, "user_id": user.user_id},
@@ -734,6 +838,7 @@ async def update_product(product_id: str, data: ProductUpdate, user: User = Depe
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await bump_version(db, user.user_id, "products")
     return await db.products.find_one({"product_id": product_id}, {"_id": 0})
 
 
@@ -745,6 +850,7 @@ async def delete_product(product_id: str, user: User = Depends(get_user)):
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await bump_version(db, user.user_id, "products")
     return {"message": "Product deleted"}
 
 
@@ -760,8 +866,9 @@ async def get_pet_product_usage(
     if pet_id:
         query["pet_id"] = pet_id
     
-    usages = await db.pet_product_usages.find(query, {"_id": 0}).to_list(100)
-    return usages
+    codec = get_codec(PetProductUsage)
+    usages = await db.pet_product_usages.find(query, codec.projection).to_list(100)
+    return codec.list_response(usages)
 
 
 @api_router.post("/pet-product-usage", response_model=PetProductUsage)
@@ -781,12 +888,10 @@ async def create_pet_product_usage(data: PetProductUsageCreate, user: User = Dep
         user_id=user.user_id,
         start_date=datetime.now(timezone.utc)
     )
-    doc = usage.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["start_date"] = doc["start_date"].isoformat()
-    doc["last_purchase_date"] = doc["last_purchase_date"].isoformat()
+    doc = to_document(usage)
     
     await db.pet_product_usages.insert_one(doc)
+    await bump_version(db, user.user_id, "pet_product_usages")
     return usage
 
 
@@ -803,19 +908,19 @@ async def get_reminders(
     if sent is not None:
         query["sent"] = sent
     
-    reminders = await db.reminders.find(query, {"_id": 0}).sort("due_date", 1).to_list(limit)
-    return reminders
+    codec = get_codec(Reminder)
+    reminders = await db.reminders.find(query, codec.projection).sort("due_date", 1).to_list(limit)
+    return codec.list_response(reminders)
 
 
 @api_router.post("/reminders", response_model=Reminder)
 async def create_reminder(data: ReminderCreate, user: User = Depends(get_user)):
     """Create a new reminder."""
     reminder = Reminder(**data.model_dump(), user_id=user.user_id)
-    doc = reminder.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["due_date"] = doc["due_date"].isoformat()
+    doc = to_document(reminder)
     
     await db.reminders.insert_one(doc)
+    await bump_version(db, user.user_id, "reminders")
     return reminder
 
 
@@ -827,6 +932,7 @@ async def delete_reminder(reminder_id: str, user: User = Depends(get_user)):
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Reminder not found")
+    await bump_version(db, user.user_id, "reminders")
     return {"message": "Reminder deleted"}
 
 
@@ -834,38 +940,37 @@ async def delete_reminder(reminder_id: str, user: User = Depends(get_user)):
 
 @api_router.get("/transactions", response_model=List[Transaction])
 async def get_transactions(
+    request: Request,
     user: User = Depends(get_user),
     transaction_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: int = Query(default=100, le=500)
 ):
-    """Get transactions."""
+    """Get transactions. Send Accept: application/x-ndjson to stream them line by line."""
     query = {"user_id": user.user_id}
     
     if transaction_type:
         query["transaction_type"] = transaction_type
-    if start_date:
-        query["date"] = {"$gte": start_date}
-    if end_date:
-        if "date" in query:
-            query["date"]["$lte"] = end_date
-        else:
-            query["date"] = {"$lte": end_date}
+    date_filter = date_range_filter(start_date, end_date)
+    if date_filter:
+        query["date"] = date_filter
     
-    transactions = await db.transactions.find(query, {"_id": 0}).sort("date", -1).to_list(limit)
-    return transactions
+    codec = get_codec(Transaction)
+    cursor = db.transactions.find(query, codec.projection).sort("date", -1).limit(limit)
+    if wants_ndjson(request):
+        return codec.stream_ndjson(cursor)
+    return codec.list_response(await cursor.to_list(limit))
 
 
 @api_router.post("/transactions", response_model=Transaction)
 async def create_transaction(data: TransactionCreate, user: User = Depends(get_user)):
     """Create a new transaction."""
     transaction = Transaction(**data.model_dump(), user_id=user.user_id)
-    doc = transaction.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["date"] = doc["date"].isoformat()
+    doc = to_document(transaction)
     
     await db.transactions.insert_one(doc)
+    await bump_version(db, user.user_id, "transactions")
     return transaction
 
 
@@ -878,12 +983,9 @@ async def get_finance_summary(
     """Get finance summary."""
     query = {"user_id": user.user_id}
     
-    if start_date or end_date:
-        query["date"] = {}
-        if start_date:
-            query["date"]["$gte"] = start_date
-        if end_date:
-            query["date"]["$lte"] = end_date
+    date_filter = date_range_filter(start_date, end_date)
+    if date_filter:
+        query["date"] = date_filter
     
     transactions = await db.transactions.find(query, {"_id": 0}).to_list(10000)
     
@@ -933,10 +1035,9 @@ async def whatsapp_webhook_receive(request: Request):
     from whatsapp import parse_webhook_message, send_text_message
     from ai_chat import (
         get_ai_response, check_appointment_availability,
-        create_whatsapp_appointment, generate_appointment_response
+        create_whatsapp_appointment, generate_appointment_response,
+        AI_UNAVAILABLE_MESSAGE, AI_ERROR_MESSAGE
     )
-    from subscription import check_whatsapp_response_limit, use_whatsapp_response
-    
     payload = await request.json()
     message_data = parse_webhook_message(payload)
     
@@ -945,10 +1046,17 @@ async def whatsapp_webhook_receive(request: Request):
     
     if message_data["type"] == "status":
         # Update message status
-        await db.whatsapp_messages.update_one(
+        updated = await db.whatsapp_messages.find_one_and_update(
             {"message_id": message_data["message_id"]},
-            {"$set": {"status": message_data["status"]}}
+            {"$set": {"status": message_data["status"]}},
+            projection={"_id": 0, "user_id": 1}
         )
+        if updated:
+            await bump_version(db, updated.get("user_id"), "whatsapp_messages")
+            publish_event(updated.get("user_id"), "message.status", {
+                "message_id": message_data["message_id"],
+                "status": message_data["status"]
+            })
         return {"status": "ok"}
     
     # Process incoming message
@@ -965,90 +1073,163 @@ async def whatsapp_webhook_receive(request: Request):
     
     if customer:
         user_id = customer.get("user_id")
-        ai_settings = await db.ai_settings.find_one({"user_id": user_id}, {"_id": 0})
+        tenant = await load_tenant_context(db, user_id)
+        ai_settings = tenant.ai_settings or None
     
     if not ai_settings:
         ai_settings = await db.ai_settings.find_one({}, {"_id": 0}) or {}
         user_id = ai_settings.get("user_id") or "system"
     
-    # Check subscription response limits
-    response_limit = await check_whatsapp_response_limit(db, user_id, phone)
-    
-    # Store incoming message
-    await db.whatsapp_messages.insert_one({
-        "message_id": message_data["message_id"],
-        "user_id": user_id,
-        "direction": "inbound",
-        "phone_number": phone,
-        "message_text": text,
-        "message_type": message_data["message_type"],
-        "status": "received",
-        "customer_id": customer["customer_id"] if customer else None,
-        "is_registered": is_registered,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
-    
-    # Check if can respond
-    if not response_limit["can_respond"]:
-        logger.warning(f"Response limit reached for user {user_id}, phone {phone}")
-        return {"status": "ok", "limited": True}
-    
-    # Generate AI response with appointment capability for registered customers
-    response_text, appointment_request = await get_ai_response(
-        text, 
-        ai_settings, 
-        is_registered=is_registered
-    )
-    
-    # Handle appointment request for registered customers
-    if appointment_request and is_registered and customer:
-        # Get customer's first pet (or could be smarter about this)
-        pet = await db.pets.find_one(
-            {"customer_id": customer["customer_id"]},
-            {"_id": 0}
-        )
-        
-        if pet:
-            # Check availability
-            availability = await check_appointment_availability(
-                db, user_id,
-                appointment_request.get("date"),
-                appointment_request.get("time")
+    # Registered customers reply for free; others take a credit in one round trip.
+    # Only model-generated replies are billed: FAQ/cache answers and any failure
+    # before the reply is delivered (DB, LLM, booking, send) refund it.
+    reservation = None
+    delivered = False
+    generated = False
+    try:
+        if not is_registered:
+            reservation = await reserve_whatsapp_response(db, user_id)
+    
+        # Store incoming message
+        message_doc = {
+            "message_id": message_data["message_id"],
+            "user_id": user_id,
+            "direction": "inbound",
+            "phone_number": phone,
+            "message_text": text,
+            "message_type": message_data["message_type"],
+            "status": "received",
+            "customer_id": customer["customer_id"] if customer else None,
+            "is_registered": is_registered,
+            "created_at": datetime.now(timezone.utc)
+        }
+        await db.whatsapp_messages.insert_one(message_doc)
+        await increment_counter(db, user_id, "messages")
+        await bump_version(db, user_id, "whatsapp_messages")
+        publish_event(user_id, "message.created", message_doc)
+    
+        # Check if can respond
+        if reservation is not None and not reservation["reserved"]:
+            logger.warning(f"Response limit reached for user {user_id}, phone {phone}")
+            return {"status": "ok", "limited": True}
+    
+        # A yes/no to a slot we offered earlier is a state transition, not a new LLM parse
+        pending = None
+        decision = None
+        if is_registered:
+            pending = await get_pending_appointment(db, user_id, phone)
+            if pending:
+                decision = classify_confirmation(text)
+    
+        # Clear booking requests ("yarın 14:00 randevu") are parsed without the model
+        fast_request = None
+        if is_registered and decision is None:
+            fast_request = parse_booking_request(text)
+    
+        appointment_request = None
+        if decision == "yes":
+            await clear_pending_appointment(db, user_id, phone)
+            appointment_request = pending
+            response_text = "Üzgünüm, randevunuzu şu anda oluşturamadım. Lütfen kliniği arayın."
+        elif decision == "no":
+            await clear_pending_appointment(db, user_id, phone)
+            response_text = "Anlaşıldı. Size uygun başka bir tarih ve saat yazabilirsiniz."
+        elif fast_request:
+            appointment_request = fast_request
+            response_text = "Üzgünüm, randevunuzu şu anda oluşturamadım. Lütfen kliniği arayın."
+        else:
+            # Answer from the FAQ layer or, for unregistered customers, previously generated answers
+            cached = await lookup_cached_answer(
+                db, user_id, ai_settings, text,
+                include_generated=not is_registered
             )
+        
+            if cached:
+                response_text = cached[0]
+            else:
+                history = await load_conversation(
+                    db, user_id, phone,
+                    exclude_message_id=message_data["message_id"]
+                )
             
-            if availability.get("available"):
-                # Create the appointment
-                apt_result = await create_whatsapp_appointment(
-                    db, user_id,
-                    customer["customer_id"],
-                    pet["pet_id"],
-                    appointment_request.get("date"),
-                    appointment_request.get("time"),
-                    appointment_request.get("service", "Muayene")
+                # Generate AI response with appointment capability for registered customers
+                generated = True
+                response_text, appointment_request = await get_ai_response(
+                    text, 
+                    ai_settings, 
+                    is_registered=is_registered,
+                    conversation_history=history,
+                    user_id=user_id,
+                    phone=phone
                 )
-                
-                response_text = await generate_appointment_response(
-                    availability, apt_result, ai_settings
+            
+                # Only context-free answers to unregistered customers are reusable
+                if (not is_registered and not history
+                        and response_text not in (AI_UNAVAILABLE_MESSAGE, AI_ERROR_MESSAGE)):
+                    await store_generated_answer(db, user_id, ai_settings, text, response_text)
+    
+        # Handle appointment request for registered customers
+        if appointment_request and is_registered and customer:
+            if appointment_request.get("pet_id"):
+                # Accepted proposal already knows the pet
+                pet = await db.pets.find_one(
+                    {"pet_id": appointment_request["pet_id"], "customer_id": customer["customer_id"]},
+                    {"_id": 0}
                 )
             else:
-                # Offer alternative
-                response_text = await generate_appointment_response(
-                    availability, None, ai_settings
+                # Get customer's first pet (or could be smarter about this)
+                pet = await db.pets.find_one(
+                    {"customer_id": customer["customer_id"]},
+                    {"_id": 0}
                 )
-    
-    # Send response
-    result = await send_text_message(phone, response_text)
-    
-    # Use response credit (only for unregistered)
-    if result.get("success") or result.get("mocked"):
-        await use_whatsapp_response(
-            db, user_id, 
-            is_registered, 
-            response_limit.get("use_extra", False)
-        )
+        
+            if pet:
+                # Check availability
+                availability = await check_appointment_availability(
+                    db, user_id,
+                    appointment_request.get("date"),
+                    appointment_request.get("time")
+                )
+            
+                if availability.get("available"):
+                    # Create the appointment
+                    apt_result = await create_whatsapp_appointment(
+                        db, user_id,
+                        customer["customer_id"],
+                        pet["pet_id"],
+                        appointment_request.get("date"),
+                        appointment_request.get("time"),
+                        appointment_request.get("service", "Muayene")
+                    )
+                
+                    response_text = await generate_appointment_response(
+                        availability, apt_result, ai_settings
+                    )
+                else:
+                    # Offer alternative and remember it for the customer's answer
+                    response_text = await generate_appointment_response(
+                        availability, None, ai_settings
+                    )
+                
+                    alternative = availability.get("alternative")
+                    if alternative:
+                        await save_pending_appointment(db, user_id, phone, {
+                            "date": alternative["date"],
+                            "time": alternative["time"],
+                            "service": appointment_request.get("service", "Muayene"),
+                            "customer_id": customer["customer_id"],
+                            "pet_id": pet["pet_id"]
+                        })
+    
+        # Send response
+        result = await send_text_message(phone, response_text)
+        delivered = bool(result.get("success") or result.get("mocked"))
+    finally:
+        if reservation and not (delivered and generated):
+            await refund_whatsapp_response(db, user_id, reservation)
     
     # Store outgoing message
-    await db.whatsapp_messages.insert_one({
+    message_doc = {
         "message_id": generate_id("msg_"),
         "user_id": user_id,
         "direction": "outbound",
@@ -1058,25 +1239,33 @@ async def whatsapp_webhook_receive(request: Request):
         "status": "sent" if result.get("success") else "failed",
         "customer_id": customer["customer_id"] if customer else None,
         "is_registered": is_registered,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.whatsapp_messages.insert_one(message_doc)
+    await increment_counter(db, user_id, "messages")
+    await bump_version(db, user_id, "whatsapp_messages")
+    publish_event(user_id, "message.created", message_doc)
     
     return {"status": "ok"}
 
 
 @api_router.get("/whatsapp/messages", response_model=List[WhatsAppMessage])
 async def get_whatsapp_messages(
+    request: Request,
     user: User = Depends(get_user),
     phone: Optional[str] = None,
     limit: int = Query(default=100, le=500)
 ):
-    """Get WhatsApp messages."""
+    """Get WhatsApp messages. Send Accept: application/x-ndjson to stream them line by line."""
     query = {"user_id": user.user_id}
     if phone:
         query["phone_number"] = {"$regex": phone}
     
-    messages = await db.whatsapp_messages.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
-    return messages
+    codec = get_codec(WhatsAppMessage)
+    cursor = db.whatsapp_messages.find(query, codec.projection).sort("created_at", -1).limit(limit)
+    if wants_ndjson(request):
+        return codec.stream_ndjson(cursor)
+    return codec.list_response(await cursor.to_list(limit))
 
 
 @api_router.post("/whatsapp/send")
@@ -1094,7 +1283,7 @@ async def send_whatsapp_message(request: Request, user: User = Depends(get_user)
     result = await send_text_message(phone, message)
     
     # Store message
-    await db.whatsapp_messages.insert_one({
+    message_doc = {
         "message_id": generate_id("msg_"),
         "user_id": user.user_id,
         "direction": "outbound",
@@ -1102,12 +1291,41 @@ async def send_whatsapp_message(request: Request, user: User = Depends(get_user)
         "message_text": message,
         "message_type": "text",
         "status": "sent" if result.get("success") else "failed",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.whatsapp_messages.insert_one(message_doc)
+    await increment_counter(db, user.user_id, "messages")
+    await bump_version(db, user.user_id, "whatsapp_messages")
+    publish_event(user.user_id, "message.created", message_doc)
     
     return result
 
 
+# ============ LIVE EVENTS ============
+
+@api_router.post("/events/ticket")
+async def create_events_ticket(user: User = Depends(get_user)):
+    """Short-lived ticket for opening the event stream (EventSource cannot send headers)."""
+    return {
+        "ticket": create_stream_ticket(user.user_id),
+        "expires_in": STREAM_TICKET_SECONDS
+    }
+
+
+@api_router.get("/events/stream")
+async def stream_events(request: Request, ticket: str = Query(...)):
+    """Server-Sent Events: new/updated WhatsApp messages and appointment changes of the tenant."""
+    user_id = decode_stream_ticket(ticket)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired ticket")
+
+    return StreamingResponse(
+        event_stream(user_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ============ AI SETTINGS ROUTES ============
 
 @api_router.get("/ai-settings", response_model=AISettings)
@@ -1117,10 +1335,9 @@ async def get_ai_settings(user: User = Depends(get_user)):
     if not settings:
         # Create default settings
         default = AISettings(user_id=user.user_id)
-        doc = default.model_dump()
-        doc["created_at"] = doc["created_at"].isoformat()
-        doc["updated_at"] = doc["updated_at"].isoformat()
+        doc = to_document(default)
         await db.ai_settings.insert_one(doc)
+        invalidate_tenant_context(user.user_id)
         return default
     return settings
 
@@ -1128,18 +1345,74 @@ async def get_ai_settings(user: User = Depends(get_user)):
 @api_router.put("/ai-settings", response_model=AISettings)
 async def update_ai_settings(data: AISettingsUpdate, user: User = Depends(get_user)):
     """Update AI settings."""
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data = get_codec(AISettings).update(data)
     
     await db.ai_settings.update_one(
         {"user_id": user.user_id},
         {"$set": update_data},
         upsert=True
     )
+    invalidate_tenant_context(user.user_id)
     
     return await db.ai_settings.find_one({"user_id": user.user_id}, {"_id": 0})
 
 
+# ============ FAQ ROUTES ============
+
+@api_router.get("/faq", response_model=List[FAQEntry])
+async def get_faq_entries(user: User = Depends(get_user)):
+    """Get staff-curated FAQ answers used by the WhatsApp assistant."""
+    codec = get_codec(FAQEntry)
+    entries = await db.faq_entries.find({"user_id": user.user_id}, codec.projection).to_list(500)
+    return codec.list_response(entries)
+
+
+@api_router.post("/faq", response_model=FAQEntry)
+async def create_faq_entry(data: FAQEntryCreate, user: User = Depends(get_user)):
+    """Create a FAQ answer."""
+    entry = FAQEntry(**data.model_dump(), user_id=user.user_id)
+    doc = to_document(entry)
+    
+    await db.faq_entries.insert_one(doc)
+    invalidate_answer_cache(user.user_id)
+    return entry
+
+
+@api_router.put("/faq/{faq_id}", response_model=FAQEntry)
+async def update_faq_entry(faq_id: str, data: FAQEntryUpdate, user: User = Depends(get_user)):
+    """Update a FAQ answer."""
+    update_data = get_codec(FAQEntry).update(data)
+    
+    result = await db.faq_entries.update_one(
+        {"faq_id": faq_id, "user_id": user.user_id},
+        {"$set": update_data}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="FAQ entry not found")
+    
+    invalidate_answer_cache(user.user_id)
+    return await db.faq_entries.find_one({"faq_id": faq_id}, {"_id": 0})
+
+
+@api_router.delete("/faq/{faq_id}")
+async def delete_faq_entry(faq_id: str, user: User = Depends(get_user)):
+    """Delete a FAQ answer."""
+    result = await db.faq_entries.delete_one(
+        {"faq_id": faq_id, "user_id": user.user_id}
+    )
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="FAQ entry not found")
+    invalidate_answer_cache(user.user_id)
+    return {"message": "FAQ entry deleted"}
+
+
+@api_router.get("/ai/response-cache/stats")
+async def get_response_cache_stats(user: User = Depends(get_user)):
+    """Get WhatsApp answer cache hit rate for the current tenant."""
+    return get_cache_stats(user.user_id)
+
+
 # ============ DASHBOARD ROUTES ============
 
 @api_router.get("/dashboard/stats")
@@ -1156,20 +1429,20 @@ async def get_dashboard_stats(user: User = Depends(get_user)):
     # Today's appointments
     today_appointments = await db.appointments.count_documents({
         "user_id": user.user_id,
-        "date": {"$gte": today_start.isoformat(), "$lt": (today_start + timedelta(days=1)).isoformat()}
+        "date": {"$gte": today_start, "$lt": today_start + timedelta(days=1)}
     })
     
     # Pending reminders
     pending_reminders = await db.reminders.count_documents({
         "user_id": user.user_id,
         "sent": False,
-        "due_date": {"$lte": (now + timedelta(days=7)).isoformat()}
+        "due_date": {"$lte": now + timedelta(days=7)}
     })
     
     # Monthly income
     monthly_transactions = await db.transactions.find({
         "user_id": user.user_id,
-        "date": {"$gte": month_start.isoformat()}
+        "date": {"$gte": month_start}
     }, {"_id": 0}).to_list(10000)
     
     monthly_income = sum(t["amount"] for t in monthly_transactions if t["transaction_type"] == "income")
@@ -1177,7 +1450,7 @@ async def get_dashboard_stats(user: User = Depends(get_user)):
     
     # Recent appointments
     recent_appointments = await db.appointments.find(
-        {"user_id": user.user_id, "date": {"$gte": now.isoformat()}},
+        {"user_id": user.user_id, "date": {"$gte": now}},
         {"_id": 0}
     ).sort("date", 1).to_list(5)
     
@@ -1211,18 +1484,18 @@ async def get_subscription_plans():
 
 
 @api_router.get("/subscription/current")
-async def get_current_subscription(user: User = Depends(get_user)):
+async def get_current_subscription(
+    user: User = Depends(get_user),
+    tenant: TenantContext = Depends(get_tenant)
+):
     """Get current user's subscription."""
-    subscription = await db.subscriptions.find_one(
-        {"user_id": user.user_id, "status": {"$in": ["active", "trial"]}},
-        {"_id": 0}
-    )
+    subscription = tenant.subscription
     
     if not subscription:
         return {"subscription": None, "has_subscription": False}
     
     plan_config = SUBSCRIPTION_PLANS.get(subscription.get("plan", "starter"))
-    limit_check = await check_customer_limit(db, user.user_id)
+    limit_check = await check_customer_limit(db, user.user_id, tenant)
     
     return {
         "subscription": subscription,
@@ -1233,14 +1506,14 @@ async def get_current_subscription(user: User = Depends(get_user)):
 
 
 @api_router.get("/subscription/limits")
-async def get_subscription_limits(user: User = Depends(get_user)):
+async def get_subscription_limits(
+    user: User = Depends(get_user),
+    tenant: TenantContext = Depends(get_tenant)
+):
     """Get current subscription limits and usage."""
-    customer_limit = await check_customer_limit(db, user.user_id)
+    customer_limit = await check_customer_limit(db, user.user_id, tenant)
     
-    subscription = await db.subscriptions.find_one(
-        {"user_id": user.user_id, "status": {"$in": ["active", "trial"]}},
-        {"_id": 0}
-    )
+    subscription = tenant.subscription
     
     if not subscription:
         return {
@@ -1322,16 +1595,18 @@ async def create_subscription_checkout(request: Request, user: User = Depends(ge
         metadata={"plan_name": plan["name"]}
     )
     
-    doc = transaction.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
+    doc = to_document(transaction)
     await db.payment_transactions.insert_one(doc)
     
     return {"url": session.url, "session_id": session.session_id}
 
 
 @api_router.post("/subscription/response-pack/checkout")
-async def create_response_pack_checkout(request: Request, user: User = Depends(get_user)):
+async def create_response_pack_checkout(
+    request: Request,
+    user: User = Depends(get_user),
+    tenant: TenantContext = Depends(get_tenant)
+):
     """Create a Stripe checkout session for response pack purchase."""
     body = await request.json()
     pack_id = body.get("pack_id")
@@ -1344,12 +1619,7 @@ async def create_response_pack_checkout(request: Request, user: User = Depends(g
         raise HTTPException(status_code=400, detail="origin_url required")
     
     # Check if user has active subscription
-    subscription = await db.subscriptions.find_one(
-        {"user_id": user.user_id, "status": {"$in": ["active", "trial"]}},
-        {"_id": 0}
-    )
-    
-    if not subscription:
+    if not tenant.has_subscription:
         raise HTTPException(status_code=403, detail="Aktif abonelik gerekli")
     
     pack = RESPONSE_PACKAGES[pack_id]
@@ -1394,9 +1664,7 @@ async def create_response_pack_checkout(request: Request, user: User = Depends(g
         metadata={"pack_name": pack["name"], "responses": pack["responses"]}
     )
     
-    doc = transaction.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
+    doc = to_document(transaction)
     await db.payment_transactions.insert_one(doc)
     
     return {"url": session.url, "session_id": session.session_id}
@@ -1433,7 +1701,7 @@ async def get_payment_status(session_id: str, user: User = Depends(get_user)):
             {"stripe_session_id": session_id},
             {"$set": {
                 "payment_status": status.payment_status,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }}
         )
         
@@ -1458,36 +1726,35 @@ async def get_payment_status(session_id: str, user: User = Depends(get_user)):
                         {"$set": {
                             "plan": plan_id,
                             "status": "active",
-                            "current_period_start": now.isoformat(),
-                            "current_period_end": (now + timedelta(days=30)).isoformat(),
+                            "current_period_start": now,
+                            "current_period_end": now + timedelta(days=SUBSCRIPTION_PERIOD_DAYS),
                             "unregistered_responses_used": 0,
-                            "updated_at": now.isoformat()
+                            "updated_at": now
                         }}
                     )
                 else:
                     # Create new subscription
-                    customer_count = await db.customers.count_documents({"user_id": user.user_id})
+                    counters = await get_tenant_counters(db, user.user_id)
+                    customer_count = counters.get("customers", 0)
                     subscription = Subscription(
                         subscription_id=generate_subscription_id(),
                         user_id=user.user_id,
                         plan=plan_id,
                         status="active",
                         current_period_start=now,
-                        current_period_end=now + timedelta(days=30),
+                        current_period_end=now + timedelta(days=SUBSCRIPTION_PERIOD_DAYS),
                         customer_count=customer_count
                     )
                     
-                    doc = subscription.model_dump()
-                    doc["created_at"] = doc["created_at"].isoformat()
-                    doc["updated_at"] = doc["updated_at"].isoformat()
-                    doc["current_period_start"] = doc["current_period_start"].isoformat()
-                    doc["current_period_end"] = doc["current_period_end"].isoformat()
+                    doc = to_document(subscription)
                     await db.subscriptions.insert_one(doc)
             
             elif tx_type == "response_pack":
                 # Add response credits
                 responses = int(existing_tx.get("metadata", {}).get("responses", 0))
                 await add_extra_responses(db, user.user_id, responses)
+            
+            invalidate_tenant_context(user.user_id)
         
         return {
             "status": status.payment_status,
@@ -1530,7 +1797,7 @@ async def stripe_webhook(request: Request):
                 {"stripe_session_id": session_id},
                 {"$set": {
                     "payment_status": "paid",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
+                    "updated_at": datetime.now(timezone.utc)
                 }}
             )
 
@@ -1547,10 +1814,10 @@ async def stripe_webhook(request: Request):
                     {"$set": {
                         "plan": plan_id,
                         "status": "active",
-                        "current_period_start": now.isoformat(),
-                        "current_period_end": (now + timedelta(days=30)).isoformat(),
+                        "current_period_start": now,
+                        "current_period_end": now + timedelta(days=SUBSCRIPTION_PERIOD_DAYS),
                         "unregistered_responses_used": 0,
-                        "updated_at": now.isoformat()
+                        "updated_at": now
                     }},
                     upsert=True
                 )
@@ -1559,6 +1826,9 @@ async def stripe_webhook(request: Request):
                 responses = int(metadata.get("responses", 0))
                 await add_extra_responses(db, user_id, responses)
 
+            if user_id:
+                invalidate_tenant_context(user_id)
+
         return {"status": "ok"}
 
     except Exception as e:
@@ -1580,6 +1850,7 @@ async def start_trial(user: User = Depends(get_user)):
         raise HTTPException(status_code=400, detail="Zaten bir aboneliğiniz var")
     
     subscription = await create_trial_subscription(db, user.user_id)
+    invalidate_tenant_context(user.user_id)
     
     return {
         "message": "7 günlük deneme başlatıldı",
@@ -1587,9 +1858,74 @@ async def start_trial(user: User = Depends(get_user)):
     }
 
 
+# ============ ADMIN PROFILING ROUTES ============
+
+async def get_admin(user: User = Depends(get_user)) -> User:
+    if not await is_admin(db, user.user_id):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
+
+
+@api_router.get("/admin/profiles")
+async def list_profiles(limit: int = Query(50, le=200), admin: User = Depends(get_admin)):
+    """Stored request/job profiles, newest first (without the reports)."""
+    profiles = await db.profiles.find(
+        {}, {"_id": 0, "html": 0, "text": 0}
+    ).sort("created_at", -1).to_list(limit)
+    return {"profiler_available": profiler_available(), "armed_jobs": sorted(armed_jobs()), "profiles": profiles}
+
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = Query("html"), admin: User = Depends(get_admin)):
+    """Download a profile as an HTML flame/call tree or as plain text."""
+    if format not in ("html", "text"):
+        raise HTTPException(status_code=400, detail="format must be html or text")
+    profile = await db.profiles.find_one({"profile_id": profile_id}, {"_id": 0, format: 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if profile.get(format) is None:
+        raise HTTPException(status_code=404, detail="Profile too large for HTML; download it as text")
+    media_type = "text/html" if format == "html" else "text/plain"
+    extension = "html" if format == "html" else "txt"
+    return Response(
+        content=profile[format],
+        media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.{extension}"'}
+    )
+
+
+@api_router.post("/admin/profiles/jobs/{job_id}")
+async def arm_job_profile(job_id: str, admin: User = Depends(get_admin)):
+    """Profile the next run of a scheduler job in this worker."""
+    from scheduler import scheduler
+    if not profiler_available():
+        raise HTTPException(status_code=503, detail="pyinstrument is not installed")
+    if scheduler.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    arm_job(job_id)
+    return {"message": f"Next run of {job_id} will be profiled", "job_id": job_id}
+
+
+# ============ METRICS ============
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Prometheus scrape endpoint (bearer METRICS_TOKEN when configured)."""
+    if not metrics_authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost first: ETags are computed on the raw body, compression wraps them, the query
+# recorder (non-production) counts every query including the ETag lookups, CORS wraps
+# everything, metrics time the whole stack, an admin-requested profile covers all of it and
+# tracing sets the correlation id for everything
+app.add_middleware(ConditionalGetMiddleware, db=db)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryRecorderMiddleware, db=db)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1597,12 +1933,33 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware, db=db)
+app.add_middleware(TracingMiddleware)
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize scheduler on startup."""
+    """Initialize indexes and scheduler on startup."""
     from scheduler import setup_scheduler
+    from counters import ensure_counter_indexes
+    from subscription import ensure_subscription_indexes
+    from conversation import ensure_conversation_indexes
+    from versions import ensure_version_indexes
+    await ensure_counter_indexes(db)
+    await ensure_subscription_indexes(db)
+    await ensure_conversation_indexes(db)
+    await ensure_version_indexes(db)
+    await ensure_profile_indexes(db)
+    await ensure_import_indexes(db)
+    # Date-range queries and sorts assume native datetimes, so legacy ISO-string
+    # dates are rewritten before serving (or beforehand with `python dates.py`);
+    # resumes where a previous run stopped and is a no-op once completed
+    await migrate_datetime_fields(db)
+    # Cross-worker cache invalidation and live events; stays off on standalone servers
+    app.state.change_feed = asyncio.create_task(run_change_feed(db))
+    if TRACING_ENABLED:
+        app.state.trace_exporter = asyncio.create_task(get_exporter().run())
     setup_scheduler(db)
     logger.info("VetFlow API started")
 
@@ -1612,5 +1969,11 @@ async def shutdown_event():
     """Cleanup on shutdown."""
     from scheduler import shutdown_scheduler
     shutdown_scheduler()
+    for task_name in ("change_feed", "trace_exporter"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    if TRACING_ENABLED:
+        await get_exporter().flush()
     client.close()
     logger.info("VetFlow API shutdown")
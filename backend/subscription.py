@@ -6,9 +6,14 @@ import os
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict
 from pydantic import BaseModel, Field
+from pymongo import ReturnDocument, UpdateOne
 from enum import Enum
 import logging
 
+from dates import as_utc
+from codec import to_document
+from counters import get_tenant_counters, try_increment_counter, increment_counter
+
 logger = logging.getLogger(__name__)
 
 # Subscription Plans Configuration
@@ -65,6 +70,9 @@ SUBSCRIPTION_PLANS = {
     }
 }
 
+# Length of one billing period
+SUBSCRIPTION_PERIOD_DAYS = 30
+
 # Extra response packages (for unregistered customers)
 RESPONSE_PACKAGES = {
     "pack_10": {
@@ -132,16 +140,31 @@ def generate_transaction_id():
     return f"pay_{uuid.uuid4().hex[:12]}"
 
 
-async def check_customer_limit(db, user_id: str) -> Dict:
+def generate_rollover_id():
+    import uuid
+    return f"roll_{uuid.uuid4().hex[:12]}"
+
+
+async def get_active_subscription(db, user_id: str, context=None) -> Optional[Dict]:
     """
-    Check if user can add more customers based on their subscription.
-    Returns: {"can_add": bool, "current": int, "limit": int, "plan": str}
+    Get user's active or trial subscription.
+    A loaded TenantContext can be passed to reuse its subscription instead of querying.
     """
-    # Get user's subscription (active or trial)
-    subscription = await db.subscriptions.find_one(
+    if context is not None:
+        return context.subscription
+    return await db.subscriptions.find_one(
         {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
         {"_id": 0}
     )
+
+
+async def check_customer_limit(db, user_id: str, context=None) -> Dict:
+    """
+    Check if user can add more customers based on their subscription.
+    Returns: {"can_add": bool, "current": int, "limit": int, "plan": str}
+    """
+    # Get user's subscription (active or trial)
+    subscription = await get_active_subscription(db, user_id, context)
     
     if not subscription:
         # No subscription - can't add customers
@@ -157,8 +180,9 @@ async def check_customer_limit(db, user_id: str) -> Dict:
     plan_config = SUBSCRIPTION_PLANS.get(plan, SUBSCRIPTION_PLANS["starter"])
     customer_limit = plan_config["customer_limit"]
     
-    # Count current customers
-    customer_count = await db.customers.count_documents({"user_id": user_id})
+    # Read the denormalized customer counter
+    counters = await get_tenant_counters(db, user_id)
+    customer_count = counters.get("customers", 0)
     
     if customer_limit == -1:  # Unlimited
         return {
@@ -180,99 +204,220 @@ async def check_customer_limit(db, user_id: str) -> Dict:
     }
 
 
-async def check_whatsapp_response_limit(db, user_id: str, customer_phone: str) -> Dict:
+async def reserve_customer_slot(db, user_id: str, context=None, count: int = 1) -> Dict:
     """
-    Check if user can respond to a WhatsApp message.
-    Registered customers: unlimited responses
-    Unregistered customers: limited by plan + extra packages
-    Returns: {"can_respond": bool, "is_registered": bool, "responses_left": int}
+    Atomically claim `count` customer slots against the plan limit (all or none).
+    Same shape as check_customer_limit; when can_add is True the counter
+    has already been incremented and must be released if the insert fails.
     """
-    # Check if customer is registered
-    customer = await db.customers.find_one(
-        {"user_id": user_id, "phone": {"$regex": customer_phone[-10:]}},
-        {"_id": 0}
-    )
-    
-    if customer:
-        # Registered customer - unlimited responses
-        return {
-            "can_respond": True,
-            "is_registered": True,
-            "responses_left": -1,
-            "message": "Kayıtlı müşteri - sınırsız yanıt"
-        }
-    
-    # Unregistered customer - check limits
-    subscription = await db.subscriptions.find_one(
-        {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
-        {"_id": 0}
-    )
+    subscription = await get_active_subscription(db, user_id, context)
     
     if not subscription:
         return {
-            "can_respond": False,
-            "is_registered": False,
-            "responses_left": 0,
+            "can_add": False,
+            "current": 0,
+            "limit": 0,
+            "plan": None,
             "message": "Aktif abonelik bulunamadı"
         }
     
     plan = subscription.get("plan", "starter")
     plan_config = SUBSCRIPTION_PLANS.get(plan, SUBSCRIPTION_PLANS["starter"])
-    monthly_limit = plan_config["unregistered_response_limit"]
+    customer_limit = plan_config["customer_limit"]
+    
+    can_add, customer_count = await try_increment_counter(db, user_id, "customers", customer_limit, count)
+    
+    if customer_limit == -1:
+        return {
+            "can_add": True,
+            "current": customer_count,
+            "limit": -1,
+            "plan": plan,
+            "message": "Sınırsız müşteri"
+        }
     
-    used = subscription.get("unregistered_responses_used", 0)
-    extra_balance = subscription.get("extra_responses_balance", 0)
+    return {
+        "can_add": can_add,
+        "current": customer_count,
+        "limit": customer_limit,
+        "plan": plan,
+        "message": f"{customer_count}/{customer_limit} müşteri" if can_add else "Müşteri limitine ulaşıldı"
+    }
+
+
+async def release_customer_slot(db, user_id: str, count: int = 1):
+    """Give back slots claimed by reserve_customer_slot."""
+    await increment_counter(db, user_id, "customers", -count)
+
+
+def _monthly_response_limit_expr() -> Dict:
+    """Aggregation expression resolving a subscription's monthly response limit from its plan."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$plan", plan_id]}, "then": config["unregistered_response_limit"]}
+                for plan_id, config in SUBSCRIPTION_PLANS.items()
+            ],
+            "default": SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        }
+    }
+
+
+def _invalidate_context(user_id: str):
+    """Every subscription write drops the tenant's cached context (tenant_context imports this module)."""
+    from tenant_context import invalidate_tenant_context
+    invalidate_tenant_context(user_id)
+
+
+async def reserve_whatsapp_response(db, user_id: str) -> Dict:
+    """
+    Atomically take one unregistered-customer response credit.
+    Monthly allowance is used first, then extra_responses_balance. The guard and
+    the debit run in a single find_one_and_update, so concurrent webhooks can
+    never overspend. The debit is final once made; call refund_whatsapp_response
+    if the reply could not be delivered.
+    Returns: {"reserved": bool, "source": "monthly" | "extra" | None, "responses_left": int}
+    """
+    used = {"$ifNull": ["$unregistered_responses_used", 0]}
+    extra = {"$ifNull": ["$extra_responses_balance", 0]}
+    has_monthly = {"$lt": [used, _monthly_response_limit_expr()]}
     
-    # Total available = monthly limit - used + extra balance
-    available = (monthly_limit - used) + extra_balance
+    before = await db.subscriptions.find_one_and_update(
+        {
+            "user_id": user_id,
+            "status": {"$in": ["active", "trial"]},
+            "$expr": {"$or": [has_monthly, {"$gt": [extra, 0]}]}
+        },
+        [{"$set": {
+            "unregistered_responses_used": {"$cond": [has_monthly, {"$add": [used, 1]}, used]},
+            "extra_responses_balance": {"$cond": [has_monthly, extra, {"$subtract": [extra, 1]}]}
+        }}],
+        projection={"_id": 0, "plan": 1, "unregistered_responses_used": 1, "extra_responses_balance": 1},
+        return_document=ReturnDocument.BEFORE
+    )
     
-    if available > 0:
+    if not before:
         return {
-            "can_respond": True,
-            "is_registered": False,
-            "responses_left": available,
-            "use_extra": used >= monthly_limit,
-            "message": f"{available} yanıt hakkı kaldı"
+            "reserved": False,
+            "source": None,
+            "responses_left": 0,
+            "message": "Kayıtsız müşteri yanıt limitine ulaşıldı. Ek paket satın alabilirsiniz."
         }
+    _invalidate_context(user_id)
+    
+    plan_config = SUBSCRIPTION_PLANS.get(before.get("plan", "starter"), SUBSCRIPTION_PLANS["starter"])
+    monthly_limit = plan_config["unregistered_response_limit"]
+    used_before = before.get("unregistered_responses_used", 0)
+    extra_before = before.get("extra_responses_balance", 0)
+    available = max(monthly_limit - used_before, 0) + extra_before - 1
     
     return {
-        "can_respond": False,
-        "is_registered": False,
-        "responses_left": 0,
-        "message": "Kayıtsız müşteri yanıt limitine ulaşıldı. Ek paket satın alabilirsiniz."
+        "reserved": True,
+        "source": "monthly" if used_before < monthly_limit else "extra",
+        "responses_left": available,
+        "message": f"{available} yanıt hakkı kaldı"
     }
 
 
-async def use_whatsapp_response(db, user_id: str, is_registered: bool, use_extra: bool = False):
+async def refund_whatsapp_response(db, user_id: str, reservation: Dict):
     """
-    Decrement response counter after sending a response to unregistered customer.
+    Return a credit taken by reserve_whatsapp_response to the bucket it came from.
     """
-    if is_registered:
-        return  # No counting for registered customers
+    if not reservation.get("reserved"):
+        return
     
-    if use_extra:
-        # Use from extra balance
+    if reservation.get("source") == "extra":
         await db.subscriptions.update_one(
             {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
-            {"$inc": {"extra_responses_balance": -1}}
+            {"$inc": {"extra_responses_balance": 1}}
         )
     else:
-        # Use from monthly limit
         await db.subscriptions.update_one(
-            {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
-            {"$inc": {"unregistered_responses_used": 1}}
+            {
+                "user_id": user_id,
+                "status": {"$in": ["active", "trial"]},
+                "unregistered_responses_used": {"$gt": 0}
+            },
+            {"$inc": {"unregistered_responses_used": -1}}
         )
+    _invalidate_context(user_id)
+
 
+async def ensure_subscription_indexes(db):
+    """Create indexes used by limit checks and the period rollover job."""
+    await db.subscriptions.create_index([("user_id", 1), ("status", 1)])
+    await db.subscriptions.create_index([("status", 1), ("current_period_end", 1)])
 
-async def reset_monthly_counters(db):
+
+async def rollover_subscription_periods(db, batch_size: int = 500) -> Dict:
     """
-    Reset monthly unregistered response counters.
-    Should be called on subscription renewal.
+    Expire every active/trial subscription whose current period has ended.
+    Paid periods are one-off Stripe Checkout payments of SUBSCRIPTION_PERIOD_DAYS;
+    nothing renews automatically. Paying again reactivates the subscription with a
+    new period (payment status check / Stripe webhook). Each batch is one
+    bulk_write plus one audit insert into subscription_rollovers.
+    Runs hourly.
+    Returns: {"expired": int}
     """
-    await db.subscriptions.update_many(
-        {"status": "active"},
-        {"$set": {"unregistered_responses_used": 0}}
-    )
+    totals = {"expired": 0}
+    
+    try:
+        now = datetime.now(timezone.utc)
+        
+        while True:
+            due = await db.subscriptions.find(
+                {
+                    "status": {"$in": ["active", "trial"]},
+                    "current_period_end": {"$lte": now}
+                },
+                {"_id": 0}
+            ).sort("current_period_end", 1).limit(batch_size).to_list(batch_size)
+            
+            if not due:
+                break
+            
+            operations = []
+            audits = []
+            
+            for sub in due:
+                # Match the exact state we read so a concurrent payment is never overwritten
+                operations.append(UpdateOne(
+                    {
+                        "user_id": sub["user_id"],
+                        "status": sub["status"],
+                        "current_period_end": sub["current_period_end"]
+                    },
+                    {"$set": {"status": "expired", "unregistered_responses_used": 0, "updated_at": now}}
+                ))
+                audits.append({
+                    "rollover_id": generate_rollover_id(),
+                    "subscription_id": sub.get("subscription_id"),
+                    "user_id": sub["user_id"],
+                    "plan": sub.get("plan"),
+                    "action": "expired",
+                    "previous_status": sub["status"],
+                    "previous_period_end": as_utc(sub["current_period_end"]),
+                    "unregistered_responses_used": sub.get("unregistered_responses_used", 0),
+                    "created_at": now
+                })
+            
+            await db.subscriptions.bulk_write(operations, ordered=False)
+            await db.subscription_rollovers.insert_many(audits)
+            totals["expired"] += len(due)
+            
+            for sub in due:
+                _invalidate_context(sub["user_id"])
+            
+            if len(due) < batch_size:
+                break
+        
+        if totals["expired"]:
+            logger.info(f"Subscription rollover: {totals['expired']} expired")
+        
+    except Exception as e:
+        logger.error(f"Subscription rollover error: {str(e)}")
+    
+    return totals
 
 
 async def add_extra_responses(db, user_id: str, responses: int):
@@ -283,6 +428,7 @@ async def add_extra_responses(db, user_id: str, responses: int):
         {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
         {"$inc": {"extra_responses_balance": responses}}
     )
+    _invalidate_context(user_id)
 
 
 async def create_trial_subscription(db, user_id: str):
@@ -299,11 +445,8 @@ async def create_trial_subscription(db, user_id: str):
         current_period_end=now + timedelta(days=7)
     )
     
-    doc = subscription.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
-    doc["current_period_start"] = doc["current_period_start"].isoformat()
-    doc["current_period_end"] = doc["current_period_end"].isoformat()
+    doc = to_document(subscription)
     
     await db.subscriptions.insert_one(doc)
+    _invalidate_context(user_id)
     return subscription
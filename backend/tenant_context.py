@@ -0,0 +1,73 @@
+"""
+VetFlow - Tenant Context Module
+Per-tenant bundle of subscription, resolved plan and AI settings,
+cached in-process with a short TTL
+"""
+import os
+import time
+from typing import Optional, Dict, Tuple
+from pydantic import BaseModel, Field
+import logging
+
+from subscription import SUBSCRIPTION_PLANS
+
+logger = logging.getLogger(__name__)
+
+TENANT_CONTEXT_TTL_SECONDS = float(os.environ.get("TENANT_CONTEXT_TTL_SECONDS", "30"))
+
+# user_id -> (expires_at monotonic, context)
+_context_cache: Dict[str, Tuple[float, "TenantContext"]] = {}
+
+
+class TenantContext(BaseModel):
+    user_id: str
+    subscription: Optional[Dict] = None
+    plan_id: Optional[str] = None
+    plan: Optional[Dict] = None
+    ai_settings: Dict = Field(default_factory=dict)
+
+    @property
+    def has_subscription(self) -> bool:
+        return self.subscription is not None
+
+
+async def load_tenant_context(db, user_id: str, use_cache: bool = True) -> TenantContext:
+    """
+    Get the tenant context, reading subscription and AI settings only on a cache miss.
+    Callers get their own copy; the cached instance is shared between requests.
+    """
+    now = time.monotonic()
+    if use_cache:
+        cached = _context_cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1].model_copy(deep=True)
+
+    subscription = await db.subscriptions.find_one(
+        {"user_id": user_id, "status": {"$in": ["active", "trial"]}},
+        {"_id": 0}
+    )
+    ai_settings = await db.ai_settings.find_one({"user_id": user_id}, {"_id": 0}) or {}
+
+    plan_id = None
+    plan = None
+    if subscription:
+        plan_id = subscription.get("plan", "starter")
+        plan = SUBSCRIPTION_PLANS.get(plan_id, SUBSCRIPTION_PLANS["starter"])
+
+    context = TenantContext(
+        user_id=user_id,
+        subscription=subscription,
+        plan_id=plan_id,
+        plan=plan,
+        ai_settings=ai_settings
+    )
+    _context_cache[user_id] = (now + TENANT_CONTEXT_TTL_SECONDS, context)
+    return context.model_copy(deep=True)
+
+
+def invalidate_tenant_context(user_id: Optional[str] = None):
+    """Drop the cached context for one tenant, or for all tenants when user_id is None."""
+    if user_id is None:
+        _context_cache.clear()
+    else:
+        _context_cache.pop(user_id, None)
@@ -0,0 +1,348 @@
+"""
+VetFlow - Tracing Module
+OpenTelemetry-style span trees for requests, webhooks and scheduler jobs, with
+child spans for Mongo commands, LLM calls and outbound HTTP, exported to a
+JSONL file or an OTLP/HTTP JSON collector. Every log record carries the
+current correlation id.
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# none | file | otlp
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORT_INTERVAL_SECONDS = float(os.environ.get("TRACE_EXPORT_INTERVAL_SECONDS", "2"))
+TRACE_MAX_QUEUE = 10_000
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "vetflow-api")
+
+TRACING_ENABLED = TRACE_EXPORTER in ("file", "otlp")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_REQUEST_ID = re.compile(r"^[\w.\-]{1,64}$")
+_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = "internal",
+                 attributes: Optional[Dict[str, Any]] = None, start_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+        _exporter.enqueue(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# Current span (None when untraced) and correlation id of the request or job
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def get_request_id() -> str:
+    return _request_id.get()
+
+
+def new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """
+    Child span of the current one. No-op (yields None) outside a sampled trace,
+    so call sites don't need to check whether tracing is on.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorator: run an async function inside a child span."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def root_span(name: str, kind: str = "internal", request_id: Optional[str] = None,
+              trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+    """
+    Start a trace (a request, webhook or job) and set its correlation id for logs.
+    Yields the span, or None when tracing is off or the trace isn't sampled.
+    """
+    trace_id = trace_id or new_trace_id()
+    request_token = _request_id.set(request_id or trace_id[:16])
+    sampled = TRACING_ENABLED and (parent_id is not None or random.random() < TRACE_SAMPLE_RATE)
+    root = Span(name, trace_id, parent_id, kind, attributes) if sampled else None
+    span_token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        if root:
+            root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _request_id.reset(request_token)
+        if root:
+            root.end()
+
+
+class SpanExporter:
+    """
+    Finished spans are queued from any thread (Mongo events arrive on driver threads)
+    and written in batches by a background task on the event loop.
+    """
+
+    def __init__(self):
+        self.queue: deque = deque(maxlen=TRACE_MAX_QUEUE)
+        self.stats = {"exported": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def enqueue(self, finished: Span):
+        with self._lock:
+            self.queue.append(finished)
+
+    def drain(self) -> List[Span]:
+        with self._lock:
+            spans = list(self.queue)
+            self.queue.clear()
+        return spans
+
+    async def flush(self):
+        spans = self.drain()
+        if not spans:
+            return
+        try:
+            if TRACE_EXPORTER == "file":
+                await asyncio.to_thread(self._write_file, spans)
+            elif TRACE_EXPORTER == "otlp":
+                await self._post_otlp(spans)
+            self.stats["exported"] += len(spans)
+        except Exception as e:
+            self.stats["failed"] += len(spans)
+            logger.error(f"Trace export failed ({len(spans)} spans): {e}")
+
+    def _write_file(self, spans: List[Span]):
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            for finished in spans:
+                f.write(json.dumps(finished.to_dict(), default=str, ensure_ascii=False) + "\n")
+
+    async def _post_otlp(self, spans: List[Span]):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.post(TRACE_OTLP_ENDPOINT, json=otlp_payload(spans))
+            response.raise_for_status()
+
+    async def run(self):
+        """Flush every TRACE_EXPORT_INTERVAL_SECONDS until cancelled, then flush once more."""
+        try:
+            while True:
+                await asyncio.sleep(TRACE_EXPORT_INTERVAL_SECONDS)
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+_exporter = SpanExporter()
+
+
+def get_exporter() -> SpanExporter:
+    return _exporter
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span]) -> Dict:
+    """OTLP/HTTP JSON body for a batch of spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "vetflow"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": _KINDS.get(s.kind, 1),
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in spans]
+        }]
+    }]}
+
+
+class MongoSpanListener(monitoring.CommandListener):
+    """
+    One client span per Mongo command under the span that issued it. Motor runs
+    pymongo with a copy of the caller's context, so the parent span is visible here.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple, Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        target = event.command.get(event.command_name)
+        child = Span(f"mongo.{event.command_name}", parent.trace_id, parent.span_id, "client", {
+            "db.system": "mongodb",
+            "db.operation": event.command_name,
+            "db.collection": target if isinstance(target, str) else "-",
+        })
+        with self._lock:
+            self._in_flight[(event.connection_id, event.request_id)] = child
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            child = self._in_flight.pop((event.connection_id, event.request_id), None)
+        if child is None:
+            return
+        child.error = error
+        child.end(child.start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "failed")))
+
+
+def install_log_correlation():
+    """Give every log record a request_id attribute (usable in formats as %(request_id)s)."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "_vetflow_correlation", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.request_id = _request_id.get()
+        return record
+
+    record_factory._vetflow_correlation = True
+    logging.setLogRecordFactory(record_factory)
+
+
+class TracingMiddleware:
+    """
+    Root span and correlation id per HTTP request. Honours an incoming W3C
+    traceparent and X-Request-ID, and echoes both back on the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        trace_id = parent_id = None
+        match = _TRACEPARENT.match(headers.get("traceparent", ""))
+        if match:
+            trace_id, parent_id = match.group(1), match.group(2)
+        request_id = headers.get("x-request-id", "")
+        if not _REQUEST_ID.match(request_id):
+            request_id = None
+
+        with root_span(
+            f"{scope['method']} {scope['path']}", "server", request_id, trace_id, parent_id,
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        ) as root:
+            correlation_id = get_request_id()
+
+            async def send_with_ids(message):
+                if message["type"] == "http.response.start":
+                    response_headers = MutableHeaders(scope=message)
+                    response_headers["X-Request-ID"] = correlation_id
+                    if root:
+                        response_headers["traceparent"] = f"00-{root.trace_id}-{root.span_id}-01"
+                        root.set("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_ids)
+            finally:
+                if root:
+                    route = scope.get("route")
+                    route_path = getattr(route, "path_format", None) or getattr(route, "path", None)
+                    if route_path:
+                        root.name = f"{scope['method']} {route_path}"
+                        root.set("http.route", route_path)
@@ -0,0 +1,85 @@
+"""
+VetFlow - Collection Versions Module
+Per-tenant version counters bumped on every API write, so caches can tell
+whether a tenant's data changed with one counter check instead of re-querying
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from pymongo import ReturnDocument
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSIONED_COLLECTIONS = (
+    "customers",
+    "pets",
+    "appointments",
+    "health_records",
+    "products",
+    "pet_product_usages",
+    "transactions",
+    "reminders",
+    "whatsapp_messages",
+)
+
+# Bounds how long another worker's write can go unseen by this worker
+VERSION_CACHE_TTL_SECONDS = float(os.environ.get("VERSION_CACHE_TTL_SECONDS", "2"))
+
+# user_id -> (versions, fetched at monotonic)
+_cache: Dict[str, Tuple[Dict[str, int], float]] = {}
+
+
+async def ensure_version_indexes(db):
+    await db.tenant_versions.create_index("user_id", unique=True)
+
+
+async def bump_version(db, user_id: str, *collections: str):
+    """Increment the tenant's version of each collection after a write."""
+    if not user_id:
+        return
+    doc = await db.tenant_versions.find_one_and_update(
+        {"user_id": user_id},
+        {
+            "$inc": {f"versions.{collection}": 1 for collection in collections},
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        },
+        projection={"_id": 0, "versions": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Concurrent bumps can return out of order; never let the cache go backwards
+    cached = _cache.get(user_id)
+    versions = dict(cached[0]) if cached else {}
+    for name, value in doc.get("versions", {}).items():
+        if value > versions.get(name, 0):
+            versions[name] = value
+    _cache[user_id] = (versions, time.monotonic())
+
+
+async def get_versions(db, user_id: str) -> Dict[str, int]:
+    """
+    All of the tenant's collection versions. Missing collections are 0.
+    Served from the in-process cache when fresh, otherwise one read.
+    """
+    cached = _cache.get(user_id)
+    if cached and time.monotonic() - cached[1] < VERSION_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    doc = await db.tenant_versions.find_one({"user_id": user_id}, {"_id": 0, "versions": 1})
+    versions = (doc or {}).get("versions", {})
+    _cache[user_id] = (versions, time.monotonic())
+    return versions
+
+
+async def get_version(db, user_id: str, collection: str) -> int:
+    return (await get_versions(db, user_id)).get(collection, 0)
+
+
+def invalidate_versions(user_id: Optional[str] = None):
+    """Forget cached versions for one tenant, or all tenants when user_id is None."""
+    if user_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(user_id, None)
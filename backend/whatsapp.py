@@ -6,11 +6,15 @@ Currently MOCKED for development - real integration requires:
 - WHATSAPP_PHONE_NUMBER_ID
 """
 import os
+import time
 import httpx
 import logging
 from typing import Optional
 from datetime import datetime, timezone
 
+from metrics import observe_whatsapp_send
+from tracing import traced
+
 logger = logging.getLogger(__name__)
 
 WHATSAPP_ACCESS_TOKEN = os.environ.get("WHATSAPP_ACCESS_TOKEN", "")
@@ -24,6 +28,7 @@ def is_whatsapp_configured() -> bool:
     return bool(WHATSAPP_ACCESS_TOKEN and WHATSAPP_PHONE_NUMBER_ID)
 
 
+@traced("whatsapp.send_text", "client")
 async def send_text_message(phone_number: str, message: str) -> dict:
     """
     Send a text message via WhatsApp Business API.
@@ -58,8 +63,14 @@ async def send_text_message(phone_number: str, message: str) -> dict:
     }
     
     try:
+        started = time.perf_counter()
         async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=payload)
+            try:
+                response = await client.post(url, headers=headers, json=payload)
+            except Exception:
+                observe_whatsapp_send("text", time.perf_counter() - started, False)
+                raise
+            observe_whatsapp_send("text", time.perf_counter() - started, response.status_code == 200)
             
             if response.status_code == 200:
                 data = response.json()
@@ -84,6 +95,7 @@ async def send_text_message(phone_number: str, message: str) -> dict:
         }
 
 
+@traced("whatsapp.send_template", "client")
 async def send_template_message(
     phone_number: str,
     template_name: str,
@@ -130,8 +142,14 @@ async def send_template_message(
     }
     
     try:
+        started = time.perf_counter()
         async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=payload)
+            try:
+                response = await client.post(url, headers=headers, json=payload)
+            except Exception:
+                observe_whatsapp_send("template", time.perf_counter() - started, False)
+                raise
+            observe_whatsapp_send("template", time.perf_counter() - started, response.status_code == 200)
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,69 @@
+import { useEffect, useRef } from "react";
+import { eventsAPI } from "../lib/api";
+
+const RECONNECT_DELAY_MS = 5000;
+
+/**
+ * Sunucudan canlı olayları (SSE) dinler.
+ * handlers: { "message.created": (data) => ..., "resync": () => ... }
+ * EventSource header gönderemediği için her bağlantıda kısa ömürlü bir ticket alınır.
+ */
+export function useLiveEvents(handlers) {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const scheduleReconnect = () => {
+      if (closed) return;
+      retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+    };
+
+    const connect = async () => {
+      if (closed || typeof EventSource === "undefined") return;
+      try {
+        const { data } = await eventsAPI.getTicket();
+        if (closed) return;
+        source = new EventSource(eventsAPI.streamUrl(data.ticket));
+      } catch (error) {
+        scheduleReconnect();
+        return;
+      }
+
+      // Kopukluk sırasında kaçan olaylar için yeniden bağlanınca listeyi tazele
+      source.addEventListener("ready", () => {
+        if (reconnecting && handlersRef.current.resync) handlersRef.current.resync({});
+        reconnecting = false;
+      });
+
+      Object.keys(handlersRef.current).forEach((type) => {
+        source.addEventListener(type, (event) => {
+          const handler = handlersRef.current[type];
+          if (handler) handler(JSON.parse(event.data || "{}"));
+        });
+      });
+
+      // Ticket kısa ömürlü: tarayıcının kendi yeniden bağlanması yerine yeni ticket ile bağlan
+      source.onerror = () => {
+        source.close();
+        source = null;
+        reconnecting = true;
+        scheduleReconnect();
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, []);
+}
+
+export default useLiveEvents;
@@ -15,7 +15,7 @@ const RAW =
     : "https://vet-crm-fc39.onrender.com";
 
 // baseURL: https://.../api (sonunda slash olmasın)
-const BASE_URL = `${RAW.replace(/\/$/, "")}/api`;
+export const BASE_URL = `${RAW.replace(/\/$/, "")}/api`;
 
 const api = axios.create({
   baseURL: BASE_URL,
@@ -125,6 +125,12 @@ export const whatsappAPI = {
   sendMessage: (phone, message) => api.post("/whatsapp/send", { phone, message }),
 };
 
+// ===================== LIVE EVENTS =====================
+export const eventsAPI = {
+  getTicket: () => api.post("/events/ticket"),
+  streamUrl: (ticket) => `${BASE_URL}/events/stream?ticket=${encodeURIComponent(ticket)}`,
+};
+
 // ===================== AI SETTINGS =====================
 export const aiSettingsAPI = {
   get: () => api.get("/ai-settings"),
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useTranslation } from 'react-i18next';
 import { appointmentsAPI, customersAPI, petsAPI } from '../lib/api';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -66,6 +67,13 @@ const AppointmentsPage = () => {
     fetchData();
   }, [selectedDate]);
 
+  useLiveEvents({
+    'appointment.created': () => fetchData(),
+    'appointment.updated': () => fetchData(),
+    'appointment.deleted': () => fetchData(),
+    resync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const start = startOfMonth(selectedDate);
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useTranslation } from 'react-i18next';
 import { whatsappAPI, aiSettingsAPI } from '../lib/api';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -40,6 +41,20 @@ const WhatsAppPage = () => {
     fetchData();
   }, []);
 
+  useLiveEvents({
+    'message.created': (message) => {
+      setMessages((prev) =>
+        prev.some((m) => m.message_id === message.message_id) ? prev : [message, ...prev]
+      );
+    },
+    'message.status': ({ message_id, status }) => {
+      setMessages((prev) =>
+        prev.map((m) => (m.message_id === message_id ? { ...m, status } : m))
+      );
+    },
+    resync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const [messagesRes, settingsRes] = await Promise.all([
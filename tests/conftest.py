@@ -0,0 +1,69 @@
+"""
+Shared fixtures. Backend modules are imported the way server.py imports them
+(top-level names from backend/).
+
+Database tests run against mongomock-motor by default; set TEST_MONGO_URL to a
+MongoDB (single-node replica set for the change feed tests) to run them, and
+the tests marked `requires_mongo`, against a real server.
+"""
+import os
+import sys
+import uuid
+import asyncio
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "vetflow_test")
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "requires_mongo: needs a real MongoDB at TEST_MONGO_URL")
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_MONGO_URL:
+        return
+    skip = pytest.mark.skip(reason="TEST_MONGO_URL not set")
+    for item in items:
+        if "requires_mongo" in item.keywords:
+            item.add_marker(skip)
+
+
+def make_client():
+    """A client for the current event loop (create it inside the test's coroutine)."""
+    if TEST_MONGO_URL:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(TEST_MONGO_URL, tz_aware=True)
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+
+
+@pytest.fixture
+def run_with_db():
+    """
+    run_with_db(test) runs `async def test(db)` on a fresh event loop against a
+    throwaway database (with the app's indexes), which is dropped afterwards.
+    """
+    def run(test):
+        async def wrapper():
+            from counters import ensure_counter_indexes
+            from subscription import ensure_subscription_indexes
+
+            client = make_client()
+            db = client[f"vetflow_test_{uuid.uuid4().hex[:8]}"]
+            try:
+                await ensure_counter_indexes(db)
+                await ensure_subscription_indexes(db)
+                return await test(db)
+            finally:
+                await client.drop_database(db.name)
+                client.close()
+        return asyncio.run(wrapper())
+    return run
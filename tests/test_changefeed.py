@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import changefeed
+import versions
+from events import get_broker
+from versions import get_versions
+
+EVENT_TIMEOUT = 10
+
+
+async def wait_for(condition, timeout=EVENT_TIMEOUT):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.05)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def next_event(queue, event_type):
+    while True:
+        _, received_type, data = await asyncio.wait_for(queue.get(), EVENT_TIMEOUT)
+        if received_type == event_type:
+            return data
+
+
+async def start_feed(db):
+    task = asyncio.create_task(changefeed.run_change_feed(db))
+    await wait_for(lambda: changefeed._state["running"])
+    return task
+
+
+async def stop_feed(task):
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.requires_mongo
+def test_change_feed_invalidates_publishes_and_resumes(run_with_db, monkeypatch):
+    monkeypatch.setattr(changefeed, "CHANGE_FEED_ID", "test-feed")
+    monkeypatch.setattr(changefeed, "CHANGE_FEED_ENABLED", True)
+
+    async def test(db):
+        if "setName" not in await db.client.admin.command("hello"):
+            pytest.skip("change streams need a replica set")
+
+        broker = get_broker()
+        queue = broker.subscribe("u1")
+        task = await start_feed(db)
+        try:
+            # Another worker's write: the cached versions must be dropped
+            await get_versions(db, "u1")
+            assert "u1" in versions._cache
+            await db.tenant_versions.update_one(
+                {"user_id": "u1"}, {"$inc": {"versions.customers": 1}}, upsert=True
+            )
+            await wait_for(lambda: "u1" not in versions._cache)
+
+            await db.appointments.insert_one({"user_id": "u1", "appointment_id": "apt_1"})
+            created = await next_event(queue, "appointment.created")
+            assert created["appointment_id"] == "apt_1"
+        finally:
+            await stop_feed(task)
+
+        stored = await db.change_feed_tokens.find_one({"_id": "test-feed"})
+        assert stored and stored["token"]
+
+        # Written while the feed is down; only a resumed stream delivers it
+        await db.appointments.insert_one({"user_id": "u1", "appointment_id": "apt_2"})
+        task = await start_feed(db)
+        try:
+            missed = await next_event(queue, "appointment.created")
+            assert missed["appointment_id"] == "apt_2"
+        finally:
+            await stop_feed(task)
+            broker.unsubscribe("u1", queue)
+            versions.invalidate_versions()
+
+    run_with_db(test)
+
+
+def test_default_feed_id_is_unique_per_worker_process(monkeypatch):
+    import importlib
+    import os
+
+    monkeypatch.delenv("CHANGE_FEED_ID", raising=False)
+    try:
+        assert importlib.reload(changefeed).CHANGE_FEED_ID.endswith(f"-{os.getpid()}")
+    finally:
+        importlib.reload(changefeed)
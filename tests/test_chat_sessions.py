@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+import ai_chat
+from llm_backends import LLMBackend, LLMSession, set_llm_backend
+
+SETTINGS = {"user_id": "u1", "updated_at": "v1"}
+
+
+class RecordingSession(LLMSession):
+    def __init__(self, backend, session_id):
+        self.backend = backend
+        self.session_id = session_id
+
+    async def send(self, text: str) -> str:
+        self.backend.active += 1
+        self.backend.max_active = max(self.backend.max_active, self.backend.active)
+        try:
+            await asyncio.sleep(self.backend.delay)
+            self.backend.sent.append((self, text))
+            return f"yanıt {len(self.backend.sent)}"
+        finally:
+            self.backend.active -= 1
+
+
+class RecordingBackend(LLMBackend):
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent = []
+        self.active = 0
+        self.max_active = 0
+
+    def create_session(self, session_id: str, system_message: str) -> LLMSession:
+        return RecordingSession(self, session_id)
+
+
+@pytest.fixture
+def backend():
+    ai_chat._chat_sessions.clear()
+    backend = RecordingBackend()
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+    ai_chat._chat_sessions.clear()
+
+
+async def turn(message, history):
+    reply, _ = await ai_chat.get_ai_response(
+        message, SETTINGS, conversation_history=history, user_id="u1", phone="905320000000"
+    )
+    return reply
+
+
+def test_warm_session_is_reused_while_in_sync(backend):
+    async def run():
+        history = [{"role": "user", "content": "önceki"}, {"role": "assistant", "content": "cevap"}]
+        reply = await turn("merhaba", history)
+        history += [{"role": "user", "content": "merhaba"}, {"role": "assistant", "content": reply}]
+        await turn("nasılsınız", history)
+
+    asyncio.run(run())
+    (first, seeded), (second, bare) = backend.sent
+    assert first is second
+    assert "önceki" in seeded
+    assert bare == "nasılsınız"
+
+
+def test_session_is_rebuilt_when_thread_moved_on_without_it(backend):
+    async def run():
+        reply = await turn("merhaba", [])
+        # An answer-cache reply was stored in between
+        history = [
+            {"role": "user", "content": "merhaba"}, {"role": "assistant", "content": reply},
+            {"role": "user", "content": "adres?"}, {"role": "assistant", "content": "Cadde 1"},
+        ]
+        await turn("teşekkürler", history)
+
+    asyncio.run(run())
+    (first, _), (second, seeded) = backend.sent
+    assert first is not second
+    assert "Cadde 1" in seeded
+
+
+def test_session_is_rebuilt_after_max_turns(backend, monkeypatch):
+    monkeypatch.setattr(ai_chat, "CHAT_SESSION_MAX_TURNS", 2)
+
+    async def run():
+        history = []
+        for message in ("bir", "iki", "üç"):
+            reply = await turn(message, history)
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+
+    asyncio.run(run())
+    sessions = [session for session, _ in backend.sent]
+    assert sessions[0] is sessions[1]
+    assert sessions[2] is not sessions[1]
+    assert "iki" in backend.sent[2][1]
+
+
+def test_turns_of_one_conversation_are_serialized(backend):
+    backend.delay = 0.01
+
+    async def run():
+        await asyncio.gather(*(turn(f"mesaj {i}", None) for i in range(5)))
+
+    asyncio.run(run())
+    assert len(backend.sent) == 5
+    assert backend.max_active == 1
@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timezone
+
+from codec import NDJSON_MEDIA_TYPE, get_codec, to_document
+from models import Customer, CustomerUpdate
+
+CREATED = datetime(2026, 1, 5, 8, 0, tzinfo=timezone.utc)
+
+
+def customer(**fields):
+    return Customer(user_id="u1", name="Ayşe", phone="905321112233", created_at=CREATED, updated_at=CREATED, **fields)
+
+
+def test_encode_keeps_native_datetimes_and_decode_round_trips():
+    instance = customer(notes="Kedi sahibi")
+    doc = to_document(instance)
+    assert doc["created_at"] is CREATED
+    assert get_codec(Customer).decode(doc) == instance
+
+
+def test_projection_covers_model_fields_without_id():
+    projection = get_codec(Customer).projection
+    assert projection["_id"] == 0
+    assert set(projection) - {"_id"} == set(Customer.model_fields)
+
+
+def test_update_sets_sent_fields_and_updated_at():
+    update = get_codec(Customer).update(CustomerUpdate(notes="Yeni not"))
+    assert set(update) == {"notes", "updated_at"}
+    assert update["updated_at"] > CREATED
+
+
+def test_dump_json_fills_defaults_for_older_documents():
+    doc = to_document(customer())
+    del doc["notes"]
+    dumped = json.loads(get_codec(Customer).dump_json([doc]))
+    assert dumped[0]["notes"] is None
+    assert dumped[0]["created_at"] == "2026-01-05T08:00:00Z"
+
+
+def test_stream_ndjson_writes_one_document_per_line(run_with_db):
+    codec = get_codec(Customer)
+
+    async def test(db):
+        docs = [to_document(customer(customer_id=f"cust_{i}")) for i in range(3)]
+        del docs[1]["address"]
+        await db.customers.insert_many(docs)
+
+        response = codec.stream_ndjson(db.customers.find({}, codec.projection).sort("customer_id", 1))
+        assert response.media_type == NDJSON_MEDIA_TYPE
+        body = b"".join([chunk async for chunk in response.body_iterator])
+
+        lines = body.decode().splitlines()
+        assert [json.loads(line)["customer_id"] for line in lines] == ["cust_0", "cust_1", "cust_2"]
+        assert json.loads(lines[1])["address"] is None
+        assert body.endswith(b"\n")
+
+    run_with_db(test)
@@ -0,0 +1,28 @@
+import pytest
+
+from conversation import classify_confirmation
+
+
+@pytest.mark.parametrize("text", [
+    "Evet", "evet!", "Evet, teşekkürler 🙏", "tamam olur", "Olur lütfen", "Peki tamam", "OK", "uygun",
+])
+def test_bare_confirmations_are_yes(text):
+    assert classify_confirmation(text) == "yes"
+
+
+@pytest.mark.parametrize("text", ["Hayır", "HAYIR teşekkürler.", "uygun değil", "İptal", "vazgeçtim"])
+def test_bare_refusals_are_no(text):
+    assert classify_confirmation(text) == "no"
+
+
+@pytest.mark.parametrize("text", [
+    "Evet ama 15:00 olsun",
+    "evet 14:00",
+    "evet yarın",
+    "hayır 16:00 olur mu",
+    "tamam ama kedim için",
+    "",
+    "evet " * 20,
+])
+def test_replies_with_more_than_a_decision_are_left_to_the_parser(text):
+    assert classify_confirmation(text) is None
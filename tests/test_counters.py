@@ -0,0 +1,129 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from counters import (
+    get_tenant_counters, increment_counter, try_increment_counter,
+    reconcile_tenant_counters, reconcile_all_tenant_counters, RECONCILE_QUIET_SECONDS,
+    IMPORT_STALE_SECONDS
+)
+
+
+async def seed_customers(db, user_id, count):
+    if count:
+        await db.customers.insert_many([{"user_id": user_id, "customer_id": f"c{i}"} for i in range(count)])
+
+
+def test_counter_is_seeded_from_collections(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 3)
+        counters = await get_tenant_counters(db, "u1")
+        assert counters["customers"] == 3
+        assert counters["pets"] == 0
+        assert "reconciled_at" in counters
+
+    run_with_db(test)
+
+
+# mongomock re-reads the document with the (no longer matching) $lte filter
+@pytest.mark.requires_mongo
+def test_try_increment_respects_limit(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 8)
+        assert await try_increment_counter(db, "u1", "customers", 10) == (True, 9)
+        assert await try_increment_counter(db, "u1", "customers", 10) == (True, 10)
+        assert await try_increment_counter(db, "u1", "customers", 10) == (False, 10)
+
+    run_with_db(test)
+
+
+# mongomock re-reads the document with the (no longer matching) $lte filter
+@pytest.mark.requires_mongo
+def test_try_increment_amount_is_all_or_nothing(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 5)
+        assert await try_increment_counter(db, "u1", "customers", 10, amount=6) == (False, 5)
+        assert await try_increment_counter(db, "u1", "customers", 10, amount=5) == (True, 10)
+
+    run_with_db(test)
+
+
+def test_try_increment_unlimited(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 2)
+        await get_tenant_counters(db, "u1")
+        assert await try_increment_counter(db, "u1", "customers", -1, amount=1000) == (True, 1002)
+
+    run_with_db(test)
+
+
+def test_try_increment_unlimited_seeds_before_reserving(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 2)
+        # The reserved customer isn't inserted yet; the seed must not swallow the reservation
+        assert await try_increment_counter(db, "u1", "customers", -1) == (True, 3)
+
+    run_with_db(test)
+
+
+class ReservingDuringCount:
+    """Database proxy whose first count is followed by a slot reservation, as if it raced the recount."""
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+        self.reserved = False
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        proxy = self
+
+        class Collection:
+            def __getattr__(self, attr):
+                return getattr(collection, attr)
+
+            async def count_documents(self, *args, **kwargs):
+                result = await collection.count_documents(*args, **kwargs)
+                if not proxy.reserved:
+                    proxy.reserved = True
+                    await increment_counter(proxy.db, proxy.user_id, "customers", 1)
+                return result
+
+        return Collection()
+
+
+def test_reconcile_keeps_concurrent_write(run_with_db):
+    async def test(db):
+        await seed_customers(db, "u1", 1)
+        await get_tenant_counters(db, "u1")
+        doc = await reconcile_tenant_counters(ReservingDuringCount(db, "u1"), "u1")
+        # The reservation's insert hasn't landed; overwriting with the recount would lose it
+        assert doc["customers"] == 2
+
+    run_with_db(test)
+
+
+def test_reconcile_all_skips_recently_written_and_importing_tenants(run_with_db):
+    async def test(db):
+        old = datetime.now(timezone.utc) - timedelta(seconds=RECONCILE_QUIET_SECONDS * 2)
+        for user_id in ("idle", "busy", "importing", "orphaned"):
+            await seed_customers(db, user_id, 1)
+            await db.tenant_counters.insert_one(
+                {"user_id": user_id, "customers": 7, "reconciled_at": old, "updated_at": old}
+            )
+        await increment_counter(db, "busy", "customers", 1)
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=IMPORT_STALE_SECONDS * 2)
+        await db.import_jobs.insert_one({"user_id": "importing", "status": "importing", "updated_at": now})
+        await db.import_jobs.insert_one({"user_id": "orphaned", "status": "importing", "updated_at": stale})
+        await seed_customers(db, "new", 2)
+
+        await reconcile_all_tenant_counters(db)
+
+        counts = {doc["user_id"]: doc["customers"] async for doc in db.tenant_counters.find({})}
+        assert counts == {"idle": 1, "busy": 8, "importing": 7, "orphaned": 1, "new": 2}
+
+    run_with_db(test)
@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks import datagen
+from benchmarks.datagen import GeneratorConfig, build_clinic, generate
+
+NOW = datetime(2026, 10, 19, 10, tzinfo=timezone.utc)
+CONFIG = GeneratorConfig(clinics=2, customers=6, years=1, seed=7)
+
+
+def test_build_clinic_is_deterministic_for_a_seed():
+    first = build_clinic(CONFIG, 0, 3, 0, NOW)
+    second = build_clinic(CONFIG, 0, 3, 0, NOW)
+    assert first == second
+    assert first["ai_settings"][0]["created_at"] == first["users"][0]["created_at"]
+
+
+def test_generate_keeps_existing_data_unless_asked_to_drop(run_with_db):
+    async def test(db):
+        await db.customers.insert_one({"customer_id": "keep"})
+        await generate(db, CONFIG)
+        assert await db.customers.count_documents({}) == CONFIG.customers + 1
+
+        await generate(db, CONFIG, drop=True)
+        assert await db.customers.count_documents({}) == CONFIG.customers
+
+    run_with_db(test)
+
+
+def test_generate_refuses_to_drop_the_app_database(run_with_db, monkeypatch):
+    async def test(db):
+        monkeypatch.setattr(datagen, "app_db_name", lambda: db.name)
+        await db.customers.insert_one({"customer_id": "keep"})
+        with pytest.raises(ValueError):
+            await generate(db, CONFIG, drop=True)
+        assert await db.customers.count_documents({}) == 1
+
+    run_with_db(test)
@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+from dates import MIGRATION_ID, as_utc, migrate_datetime_fields
+
+
+def test_as_utc_normalizes_strings_and_naive_datetimes():
+    expected = datetime(2026, 3, 1, 9, 30, tzinfo=timezone.utc)
+    assert as_utc("2026-03-01T09:30:00Z") == expected
+    assert as_utc("2026-03-01T12:30:00+03:00") == expected
+    assert as_utc(datetime(2026, 3, 1, 9, 30)) == expected
+    assert as_utc("") is None
+
+
+def test_migration_converts_strings_and_resumes_after_bad_values(run_with_db):
+    async def test(db):
+        await db.appointments.insert_many([
+            {"_id": 1, "date": "2026-03-01T09:30:00Z", "created_at": "2026-02-20T08:00:00+00:00"},
+            {"_id": 2, "date": "yarın", "created_at": datetime(2026, 2, 20, tzinfo=timezone.utc)},
+        ])
+
+        results = await migrate_datetime_fields(db, batch_size=1)
+        assert results["appointments"] == 1
+        first = await db.appointments.find_one({"_id": 1})
+        assert first["date"] == datetime(2026, 3, 1, 9, 30, tzinfo=timezone.utc)
+        progress = await db.migrations.find_one({"_id": MIGRATION_ID})
+        assert "completed_at" not in progress
+        assert not progress["collections"]["appointments"]["done"]
+
+        await db.appointments.update_one({"_id": 2}, {"$set": {"date": "2026-03-02T10:00:00Z"}})
+        results = await migrate_datetime_fields(db, batch_size=1)
+        assert results["appointments"] == 1
+        assert results["customers"] == 0
+        progress = await db.migrations.find_one({"_id": MIGRATION_ID})
+        assert progress["completed_at"]
+        assert await migrate_datetime_fields(db) == {}
+
+    run_with_db(test)
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+import events
+from events import RESYNC_EVENT, EventBroker, format_sse, publish_event, set_feed_event_types
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_overflowing_subscriber_gets_a_single_resync(monkeypatch):
+    monkeypatch.setattr(events, "EVENT_QUEUE_SIZE", 2)
+    broker = EventBroker()
+    slow, other = broker.subscribe("u1"), broker.subscribe("u2")
+
+    for i in range(3):
+        broker.publish("u1", "message.created", {"n": i})
+    broker.publish("u2", "message.created", {"n": 0})
+
+    assert [event_type for _, event_type, _ in drain(slow)] == [RESYNC_EVENT]
+    assert len(drain(other)) == 1
+    assert broker.stats["overflows"] == 1
+
+
+def test_unsubscribe_removes_idle_tenant():
+    broker = EventBroker()
+    queue = broker.subscribe("u1")
+    broker.unsubscribe("u1", queue)
+    assert "u1" not in broker.subscribers
+    broker.publish("u1", "message.created", {})
+    assert broker.stats == {"published": 1, "delivered": 0, "overflows": 0}
+
+
+def test_format_sse_frame():
+    created = datetime(2026, 10, 19, 7, 30, tzinfo=timezone.utc)
+    frame = format_sse(7, "message.created", {"text": "Merhaba", "created_at": created, "ref": ObjectId("0" * 24)})
+    lines = frame.decode().split("\n")
+    assert lines[:2] == ["id: 7", "event: message.created"]
+    assert json.loads(lines[2].removeprefix("data: ")) == {
+        "text": "Merhaba", "created_at": "2026-10-19T07:30:00Z", "ref": "0" * 24
+    }
+    assert frame.endswith(b"\n\n")
+
+
+def test_publish_event_drops_mongo_id_and_skips_feed_types(monkeypatch):
+    broker = EventBroker()
+    monkeypatch.setattr(events, "_broker", broker)
+    queue = broker.subscribe("u1")
+    doc = {"_id": ObjectId(), "message_id": "msg_1"}
+
+    publish_event("u1", "message.created", doc)
+    set_feed_event_types(frozenset({"message.created"}))
+    try:
+        publish_event("u1", "message.created", doc)
+    finally:
+        set_feed_event_types(frozenset())
+
+    assert [data for _, _, data in drain(queue)] == [{"message_id": "msg_1"}]
+    assert "_id" in doc
@@ -0,0 +1,144 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import importer
+from codec import to_document
+from counters import get_tenant_counters, IMPORT_STALE_SECONDS
+from importer import ImportRun, fail_orphaned_imports, iter_csv_rows, map_headers, normalize_phone, parse_row
+from models import ImportJob
+
+HEADER = ["Ad Soyad", "Telefon", "Hayvan Adı", "Tür", "Doğum Tarihi"]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("0532 111 22 33", "905321112233"),
+    ("+90 (532) 111-22-33", "905321112233"),
+    ("5321112233", "905321112233"),
+    ("0090 532 111 22 33", "905321112233"),
+    ("12345", None),
+    ("", None),
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+def test_map_headers_folds_turkish_aliases_and_ignores_unknown_columns():
+    columns = map_headers(["Ad Soyad", "Cep Telefonu", "Kayıt No", "Hayvan Adı", "TÜR", "Telefon"])
+    assert columns == {0: "name", 1: "phone", 3: "pet_name", 4: "species"}
+
+
+def test_parse_row_builds_customer_and_pet():
+    customer, pet, errors = parse_row(["Ayşe Kaya", "0532 111 22 33", "Tekir", "Kedi", "03.05.2021"], map_headers(HEADER))
+    assert errors == []
+    assert customer["phone"] == "905321112233"
+    assert pet["species"] == "cat"
+    assert pet["birth_date"].year == 2021 and pet["birth_date"].month == 5
+
+
+def test_parse_row_reports_invalid_fields():
+    columns = map_headers(HEADER)
+    _, _, errors = parse_row(["Ayşe Kaya", "", "Tekir", "Kedi", ""], columns)
+    assert errors == ["Telefon zorunlu"]
+    _, _, errors = parse_row(["Ayşe Kaya", "0532 111 22 33", "Tekir", "Kedi", "geçen yıl"], columns)
+    assert len(errors) == 1 and errors[0].startswith("birth_date")
+
+
+def test_iter_csv_rows_reads_windows_1254_with_semicolons(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes("Ad Soyad;Telefon\nŞule Çelik;05321112233\n".encode("cp1254"))
+    assert list(iter_csv_rows(str(path))) == [["Ad Soyad", "Telefon"], ["Şule Çelik", "05321112233"]]
+
+
+async def run_import(db, tmp_path, rows, plan="unlimited"):
+    await db.subscriptions.insert_one({"user_id": "u1", "plan": plan, "status": "active"})
+    path = tmp_path / "import.csv"
+    path.write_text("\n".join(",".join(row) for row in [HEADER, *rows]) + "\n", encoding="utf-8")
+    job = ImportJob(user_id="u1", file_format="csv", filename="import.csv")
+    await db.import_jobs.insert_one(to_document(job))
+    await ImportRun(db, job, str(path)).run()
+    return await db.import_jobs.find_one({"job_id": job.job_id})
+
+
+def test_import_dedupes_against_tenant_and_file(run_with_db, tmp_path):
+    async def test(db):
+        await db.customers.insert_one({"user_id": "u1", "customer_id": "cust_old", "phone": "905321112233"})
+        await db.pets.insert_one({"user_id": "u1", "customer_id": "cust_old", "name": "Tekir"})
+        job = await run_import(db, tmp_path, [
+            ["Ayşe Kaya", "0532 111 22 33", "tekir", "Kedi", ""],  # existing owner and pet
+            ["Ayşe Kaya", "0532 111 22 33", "Pamuk", "Kedi", ""],  # new pet for existing owner
+            ["Can Demir", "0533 444 55 66", "Karabaş", "Köpek", ""],
+            ["Can Demir", "+90 533 444 55 66", "Karabaş", "Köpek", ""],  # repeated in file
+            ["Ece Aksoy", "", "Boncuk", "Kedi", ""],  # invalid
+        ])
+
+        assert job["status"] == "completed"
+        assert (job["customers_created"], job["pets_created"]) == (1, 2)
+        assert (job["duplicates_skipped"], job["error_count"]) == (2, 1)
+        assert job["errors"][0]["row"] == 6
+        assert job["rows_total"] == 5
+        pamuk = await db.pets.find_one({"name": "Pamuk"})
+        assert pamuk["customer_id"] == "cust_old"
+        counters = await get_tenant_counters(db, "u1")
+        assert (counters["customers"], counters["pets"]) == (2, 3)
+
+    run_with_db(test)
+
+
+def test_import_writes_each_chunk_before_reading_the_next(run_with_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_BATCH_SIZE", 2)
+    queued = []
+    write_chunk = ImportRun.write_chunk
+
+    async def recording_write_chunk(self, first_row):
+        queued.append(len(self.new_customers))
+        return await write_chunk(self, first_row)
+
+    monkeypatch.setattr(ImportRun, "write_chunk", recording_write_chunk)
+
+    async def test(db):
+        rows = [[f"Sahip {i}", f"0532 000 00 {i:02d}", f"Hayvan {i}", "Kedi", ""] for i in range(5)]
+        job = await run_import(db, tmp_path, rows)
+        assert job["status"] == "completed"
+        assert queued == [2, 2, 1]
+        assert await db.customers.count_documents({"user_id": "u1"}) == 5
+
+    run_with_db(test)
+
+
+# The plan limit is enforced by try_increment_counter, which needs a real server
+@pytest.mark.requires_mongo
+def test_import_stops_at_the_plan_limit_keeping_written_chunks(run_with_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_BATCH_SIZE", 4)
+
+    async def test(db):
+        rows = [[f"Sahip {i}", f"0532 000 00 {i:02d}", "", "", ""] for i in range(12)]
+        job = await run_import(db, tmp_path, rows, plan="starter")
+        assert job["status"] == "failed"
+        assert job["customers_created"] == 8
+        assert "10. satırdan" in job["message"]
+        assert (await get_tenant_counters(db, "u1"))["customers"] == 8
+
+    run_with_db(test)
+
+
+def test_imports_orphaned_by_a_restart_are_failed(run_with_db, monkeypatch):
+    async def test(db):
+        stale = datetime.now(timezone.utc) - timedelta(seconds=IMPORT_STALE_SECONDS * 2)
+        orphaned = ImportJob(user_id="u1", file_format="csv", status="importing", updated_at=stale)
+        running_here = ImportJob(user_id="u1", file_format="csv", status="importing", updated_at=stale)
+        other_worker = ImportJob(user_id="u2", file_format="csv", status="parsing")
+        for job in (orphaned, running_here, other_worker):
+            await db.import_jobs.insert_one(to_document(job))
+        monkeypatch.setitem(importer._running, running_here.job_id, None)
+
+        assert await fail_orphaned_imports(db) == 1
+
+        jobs = {doc["job_id"]: doc async for doc in db.import_jobs.find({})}
+        assert jobs[orphaned.job_id]["status"] == "failed"
+        assert jobs[orphaned.job_id]["completed_at"] is not None
+        assert "yarıda kaldı" in jobs[orphaned.job_id]["message"]
+        assert jobs[running_here.job_id]["status"] == "importing"
+        assert jobs[other_worker.job_id]["status"] == "parsing"
+
+    run_with_db(test)
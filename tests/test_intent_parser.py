@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from intent_parser import CLINIC_TIMEZONE, parse_booking_request
+
+# Monday 19 October 2026, 10:00 clinic time
+NOW = datetime(2026, 10, 19, 10, 0, tzinfo=CLINIC_TIMEZONE)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("yarın 14:00 aşı için randevu", ("2026-10-20", "14:00", "Aşı")),
+    ("Cuma saat 15 randevu alabilir miyim", ("2026-10-23", "15:00", "Muayene")),
+    ("haftaya salı 10.30 kontrol randevusu", ("2026-10-27", "10:30", "Kontrol")),
+    ("25 ekim 09:00 randevu", ("2026-10-25", "09:00", "Muayene")),
+    ("24.10 11:15 randevu", ("2026-10-24", "11:15", "Muayene")),
+    ("2026-11-02 16:45 randevu", ("2026-11-02", "16:45", "Muayene")),
+    # Today's weekday with a time already past means next week
+    ("pazartesi 09:00 randevu", ("2026-10-26", "09:00", "Muayene")),
+])
+def test_clear_requests_are_parsed(text, expected):
+    result = parse_booking_request(text, NOW)
+    assert (result["date"], result["time"], result["service"]) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "merhaba yarın 14:00",                   # no booking intent
+    "randevumu iptal etmek istiyorum",       # existing booking
+    "yarın 14:00 randevumu değiştirmek istiyorum",
+    "saat 3 randevu yarın",                  # 03:00 or 15:00?
+    "yarın 14:00 veya 15:00 randevu",        # two times
+    "yarın ya da cuma 14:00 randevu",        # two dates
+    "bugün 09:00 randevu",                   # already past
+    "randevu almak istiyorum",               # no date or time
+])
+def test_unclear_requests_are_left_to_the_model(text):
+    assert parse_booking_request(text, NOW) is None
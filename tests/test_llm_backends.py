@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from llm_backends import LLMBackend, LLMSession, StubBackend
+
+
+def test_backend_without_create_session_fails_on_instantiation():
+    class Incomplete(LLMBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_session_without_send_fails_on_instantiation():
+    class Incomplete(LLMSession):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_stub_is_deterministic_and_books_when_prompted():
+    backend = StubBackend()
+    system = "... [RANDEVU_TALEBI] ..."
+
+    async def run():
+        first = await backend.create_session("a", system).send("randevu istiyorum")
+        second = await backend.create_session("b", system).send("randevu istiyorum")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert "[RANDEVU_TALEBI]" in first
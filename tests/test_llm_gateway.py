@@ -0,0 +1,108 @@
+import asyncio
+import gc
+import time
+
+import pytest
+
+import llm_gateway
+from llm_backends import StubBackend
+from llm_gateway import CircuitBreaker, LLMUnavailableError, call_llm
+
+
+@pytest.fixture(autouse=True)
+def gateway(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_breaker", CircuitBreaker())
+    monkeypatch.setattr(llm_gateway, "_outcomes", {})
+    monkeypatch.setattr(llm_gateway, "_histograms", {})
+    monkeypatch.setattr(llm_gateway, "CIRCUIT_MIN_CALLS", 3)
+    return llm_gateway
+
+
+def ask(backend, **kwargs):
+    return call_llm(lambda: backend.respond("sistem", "merhaba"), **kwargs)
+
+
+async def fail_times(count):
+    failing = StubBackend(error_rate=1.0)
+    for _ in range(count):
+        with pytest.raises(RuntimeError):
+            await ask(failing)
+
+
+def expire_cool_down():
+    llm_gateway._breaker.opened_at = time.monotonic() - llm_gateway.CIRCUIT_OPEN_SECONDS
+
+
+def test_breaker_opens_after_failures_and_rejects_without_calling():
+    backend = StubBackend()
+
+    async def run():
+        await fail_times(3)
+        assert llm_gateway._breaker.state == "open"
+        with pytest.raises(LLMUnavailableError):
+            await ask(backend)
+
+    asyncio.run(run())
+    assert backend.calls == 0
+    assert llm_gateway.get_gateway_stats()["outcomes"]["chat"] == {"ok": 0, "error": 3, "timeout": 0, "rejected": 1}
+
+
+def test_successful_probe_closes_the_breaker_and_blocks_concurrent_calls():
+    async def run():
+        await fail_times(3)
+        expire_cool_down()
+        probe = asyncio.create_task(ask(StubBackend(latency_ms=50)))
+        await asyncio.sleep(0.01)
+        assert llm_gateway._breaker.state == "half_open"
+        with pytest.raises(LLMUnavailableError):
+            await ask(StubBackend())
+        await probe
+        assert llm_gateway._breaker.state == "closed"
+        await ask(StubBackend())
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_the_breaker():
+    async def run():
+        await fail_times(3)
+        expire_cool_down()
+        await fail_times(1)
+        assert llm_gateway._breaker.state == "open"
+        assert time.monotonic() - llm_gateway._breaker.opened_at < 1
+        with pytest.raises(LLMUnavailableError):
+            await ask(StubBackend())
+
+    asyncio.run(run())
+
+
+def test_timeout_is_counted_and_recorded_as_a_failure():
+    async def run():
+        with pytest.raises(LLMUnavailableError, match="timed out"):
+            await ask(StubBackend(latency_ms=500), timeout=0.02)
+
+    asyncio.run(run())
+    stats = llm_gateway.get_gateway_stats()
+    assert stats["outcomes"]["chat"]["timeout"] == 1
+    assert stats["latency"]["chat"]["count"] == 1
+    assert list(llm_gateway._breaker.results) == [False]
+
+
+def test_tenant_concurrency_is_limited_and_idle_semaphores_are_dropped(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_TENANT_MAX_CONCURRENCY", 2)
+    state = {"active": 0, "max": 0}
+
+    async def call():
+        state["active"] += 1
+        state["max"] = max(state["max"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return "ok"
+
+    async def run():
+        await asyncio.gather(*(call_llm(call, tenant="tenant-limited") for _ in range(6)))
+
+    asyncio.run(run())
+    assert state["max"] == 2
+    gc.collect()
+    assert "tenant-limited" not in llm_gateway._tenant_semaphores
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+import metrics
+from metrics import Counter, Histogram, MetricsMiddleware, render_metrics
+
+
+def test_counter_renders_sorted_series_with_escaped_labels():
+    counter = Counter("test_total", "Test counter.", ("route", "status"))
+    counter.inc("/b", "200")
+    counter.inc("/a", "500", amount=2)
+    counter.inc('/a"q', "200")
+    assert counter.render() == [
+        "# HELP test_total Test counter.",
+        "# TYPE test_total counter",
+        'test_total{route="/a",status="500"} 2',
+        'test_total{route="/a\\"q",status="200"} 1',
+        'test_total{route="/b",status="200"} 1',
+    ]
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = Histogram("test_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, "/a")
+    assert histogram.render() == [
+        "# HELP test_seconds Test latency.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a",le="0.1"} 1',
+        'test_seconds_bucket{route="/a",le="1.0"} 3',
+        'test_seconds_bucket{route="/a",le="+Inf"} 4',
+        'test_seconds_sum{route="/a"} 4.25',
+        'test_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_render_metrics_includes_llm_collector():
+    text = render_metrics()
+    assert text.endswith("\n")
+    assert "# TYPE vetflow_http_requests_total counter" in text
+    assert "# TYPE vetflow_llm_circuit_open gauge" in text
+
+
+def test_middleware_labels_requests_with_the_route_template(monkeypatch):
+    requests = Counter("requests_total", "Requests.", ("method", "route", "status"))
+    duration = Histogram("duration_seconds", "Latency.", ("method", "route", "status"))
+    monkeypatch.setattr(metrics, "HTTP_REQUESTS", requests)
+    monkeypatch.setattr(metrics, "HTTP_DURATION", duration)
+
+    api = FastAPI()
+
+    @api.get("/api/customers/{customer_id}")
+    async def customer(customer_id: str):
+        return {"customer_id": customer_id}
+
+    app = MetricsMiddleware(api)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for customer_id in ("cust_1", "cust_2"):
+                await client.get(f"/api/customers/{customer_id}")
+            await client.get("/missing")
+
+    asyncio.run(run())
+    assert requests._values == {
+        ("GET", "/api/customers/{customer_id}", "200"): 2,
+        ("GET", "unmatched", "404"): 1,
+    }
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone, timedelta
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import versions
+from middleware import ConditionalGetMiddleware, _etag_collections
+from versions import bump_version
+
+
+@pytest.mark.parametrize("path, collections", [
+    ("/api/customers", ("customers",)),
+    ("/api/customers/cust_1", ("customers",)),
+    ("/api/pets/pet_1", ("pets",)),
+    ("/api/appointments/apt_1", ("appointments",)),
+    ("/api/appointments/apt_1/details", ("appointments", "customers", "pets")),
+    ("/api/pets/pet_1/history", (
+        "pets", "customers", "health_records", "appointments", "pet_product_usages", "products"
+    )),
+    ("/api/finance/summary", ("transactions",)),
+])
+def test_etag_routes_match_collections(path, collections):
+    assert _etag_collections(path) == collections
+
+
+@pytest.mark.parametrize("path", [
+    "/api/customers/cust_1/extra",
+    "/api/customers/",
+    "/api/products/prod_1",
+    "/api/imports",
+    "/api/dashboard/stats",
+    "/api/subscription/current",
+    "/api/events/stream",
+])
+def test_routes_without_etag_are_not_matched(path):
+    assert _etag_collections(path) is None
+
+
+def test_conditional_get_answers_304_until_collection_changes(run_with_db):
+    calls = []
+
+    async def customers(request):
+        calls.append(request.url.path)
+        return JSONResponse([{"name": "Ayşe"}])
+
+    async def test(db):
+        versions.invalidate_versions()
+        await db.user_sessions.insert_one({
+            "session_token": "tok", "user_id": "u1",
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=1)
+        })
+        app = ConditionalGetMiddleware(Starlette(routes=[Route("/api/customers", customers)]), db)
+        headers = {"Authorization": "Bearer tok"}
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first = await client.get("/api/customers", headers=headers)
+            etag = first.headers["etag"]
+            cached = await client.get("/api/customers", headers={**headers, "If-None-Match": etag})
+            await bump_version(db, "u1", "pets")
+            unrelated = await client.get("/api/customers", headers={**headers, "If-None-Match": etag})
+            await bump_version(db, "u1", "customers")
+            changed = await client.get("/api/customers", headers={**headers, "If-None-Match": etag})
+            anonymous = await client.get("/api/customers")
+
+        assert etag.startswith('W/"')
+        assert (cached.status_code, unrelated.status_code) == (304, 304)
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert "etag" not in anonymous.headers
+        assert len(calls) == 3
+        versions.invalidate_versions()
+
+    run_with_db(test)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+import pytest
+
+import profiling
+from profiling import _store, profiled_job
+
+
+class FakeProfiler:
+    html = "<html>profile</html>"
+    text = "0.010 handler  server.py:1"
+
+    def __init__(self, **kwargs):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def output_html(self):
+        return self.html
+
+    def output_text(self, unicode=False, color=False):
+        return self.text
+
+
+class FailingProfiles:
+    async def insert_one(self, doc):
+        raise RuntimeError("document too large")
+
+
+class FailingDB:
+    profiles = FailingProfiles()
+
+
+def test_store_saves_both_renderings(run_with_db):
+    async def test(db):
+        await _store(db, "prof_1", FakeProfiler(), "/api/customers", "request", "u1", 0.25)
+        doc = await db.profiles.find_one({"profile_id": "prof_1"})
+        assert doc["html"] == FakeProfiler.html
+        assert doc["text"] == FakeProfiler.text
+        assert doc["duration_ms"] == 250.0
+
+    run_with_db(test)
+
+
+def test_store_drops_oversized_html_and_truncates_text(run_with_db, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_OUTPUT_BYTES", 100)
+    profiler = FakeProfiler()
+    profiler.html = "<html>" + "x" * 200 + "</html>"
+    profiler.text = "ş" * 200
+
+    async def test(db):
+        await _store(db, "prof_1", profiler, "/api/customers", "request", "u1", 0.25)
+        doc = await db.profiles.find_one({"profile_id": "prof_1"})
+        assert doc["html"] is None
+        assert doc["text"].startswith("ş" * 50)
+        assert doc["text"].endswith("(truncated)\n")
+
+    run_with_db(test)
+
+
+def test_store_failure_is_logged_not_raised(caplog):
+    async def run():
+        with caplog.at_level(logging.ERROR, logger="profiling"):
+            await _store(FailingDB(), "prof_1", FakeProfiler(), "daily_reminders", "job", None, 1.0)
+
+    asyncio.run(run())
+    assert "Could not store profile prof_1" in caplog.text
+
+
+def test_profiled_job_keeps_the_job_exception_when_storing_fails(monkeypatch):
+    monkeypatch.setattr(profiling, "Profiler", FakeProfiler)
+    monkeypatch.setattr(profiling, "_armed_jobs", {"daily_reminders"})
+
+    async def run():
+        async with profiled_job(FailingDB(), "daily_reminders"):
+            raise ValueError("job failed")
+
+    with pytest.raises(ValueError, match="job failed"):
+        asyncio.run(run())
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import querylog
+from querylog import QueryRecorder, QueryRecorderMiddleware, query_shape, report
+
+
+def command_event(request_id, command, duration_ms=1.0):
+    name = next(iter(command))
+    return SimpleNamespace(
+        command=command, command_name=name, connection_id=("localhost", 27017),
+        request_id=request_id, duration_micros=int(duration_ms * 1000)
+    )
+
+
+def record(recorder, commands, duration_ms=1.0):
+    for request_id, command in enumerate(commands):
+        event = command_event(request_id, command, duration_ms)
+        recorder.started(event)
+        recorder.finished(event)
+
+
+def test_query_shape_ignores_values_but_keeps_operators():
+    assert query_shape({"pet_id": "pet_1", "date": {"$gte": 1}}) == query_shape({"date": {"$gte": 2}, "pet_id": "pet_2"})
+    assert query_shape({"pet_id": "pet_1"}) != query_shape({"customer_id": "pet_1"})
+
+
+def test_repeated_same_shape_queries_are_flagged(monkeypatch, caplog):
+    monkeypatch.setattr(querylog, "N_PLUS_ONE_THRESHOLD", 3)
+    recorder = QueryRecorder("GET /api/pets")
+    record(recorder, [{"find": "pets", "filter": {"pet_id": f"pet_{i}"}} for i in range(3)])
+    record(recorder, [{"find": "customers", "filter": {"user_id": "u1"}}])
+
+    assert recorder.count == 4
+    (key, count), = recorder.repeated()
+    assert key[:2] == ("pets", "find") and count == 3
+
+    with caplog.at_level(logging.WARNING, logger="querylog"):
+        asyncio.run(report(None, recorder))
+    assert "N+1 suspect in GET /api/pets: 3x pets.find" in caplog.text
+
+
+def test_slow_queries_keep_the_command_without_driver_fields(monkeypatch):
+    monkeypatch.setattr(querylog, "SLOW_QUERY_MS", 50)
+    recorder = QueryRecorder("job")
+    record(recorder, [{"find": "pets", "filter": {"user_id": "u1"}, "lsid": {"id": 1}, "$db": "vetflow"}], duration_ms=80)
+    (slow,) = recorder.slow
+    assert slow["body"] == {"find": "pets", "filter": {"user_id": "u1"}}
+    assert recorder.total_ms == 80
+
+
+def request_headers(enabled, monkeypatch):
+    monkeypatch.setattr(querylog, "QUERY_RECORDER_ENABLED", enabled)
+    api = FastAPI()
+
+    @api.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    async def run():
+        app = QueryRecorderMiddleware(api, db=None)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return (await client.get("/api/ping")).headers
+
+    return asyncio.run(run())
+
+
+def test_db_headers_are_added_outside_production(monkeypatch):
+    headers = request_headers(True, monkeypatch)
+    assert headers["x-db-queries"] == "0"
+    assert headers["x-db-time"] == "0.0"
+
+
+def test_db_headers_are_suppressed_in_production(monkeypatch):
+    headers = request_headers(False, monkeypatch)
+    assert "x-db-queries" not in headers and "x-db-time" not in headers
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import ai_chat
+import reminder_renderer
+from llm_backends import StubBackend, set_llm_backend
+from reminder_renderer import DEFAULT_REMINDER_TEMPLATES, ReminderRenderer, render_reminder
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    reminder_renderer._template_cache.clear()
+    set_llm_backend(StubBackend())
+    yield
+    set_llm_backend(None)
+    reminder_renderer._template_cache.clear()
+
+
+def settings(templates=None, personalize=False, user_id="u1"):
+    return {"user_id": user_id, "updated_at": "v1", "reminder_templates": templates or {},
+            "personalize_reminders": personalize}
+
+
+def jobs_for(ai_settings, count):
+    return [{
+        "key": f"{ai_settings['user_id']}-{i}", "ai_settings": ai_settings, "reminder_type": "vaccination",
+        "customer_name": "Ayşe", "pet_name": "Tekir", "details": "Kuduz aşısı"
+    } for i in range(count)]
+
+
+def test_custom_template_is_used():
+    text = render_reminder(settings({"vaccination": "{pet_name} aşı günü - {clinic_name}"}),
+                           "vaccination", "Ayşe", "Tekir", "")
+    assert text == "Tekir aşı günü - VetFlow Veteriner Kliniği"
+
+
+@pytest.mark.parametrize("template", [
+    "{details:>1000000000}",
+    "{customer_name:0999999999}",
+    "{pet_name!r}",
+    "{unknown}",
+    "{customer_name.__class__}",
+    "{}",
+    "{pet_name",
+])
+def test_invalid_template_falls_back_to_default(template):
+    text = render_reminder(settings({"vaccination": template}), "vaccination", "Ayşe", "Tekir", "Kuduz")
+    assert text == DEFAULT_REMINDER_TEMPLATES["vaccination"].format(
+        customer_name="Ayşe", pet_name="Tekir", details="Kuduz"
+    )
+
+
+class FakeBatchLLM:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, ai_settings, batch):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("model down")
+            self.batches.append([job["key"] for job in batch])
+            return {job["key"]: f"Kişisel: {job['key']}" for job in batch}
+        finally:
+            self.active -= 1
+
+
+def render(monkeypatch, llm, jobs, **limits):
+    monkeypatch.setattr(ai_chat, "generate_reminder_messages_batch", llm)
+    renderer = ReminderRenderer(**limits)
+    return asyncio.run(renderer.render_all(jobs)), renderer
+
+
+def test_personalization_is_split_per_tenant_and_batch(monkeypatch):
+    llm = FakeBatchLLM()
+    jobs = jobs_for(settings(personalize=True), 5) + jobs_for(settings(personalize=True, user_id="u2"), 2)
+    jobs += jobs_for(settings(user_id="u3"), 1)
+    messages, renderer = render(monkeypatch, llm, jobs, batch_size=2, max_calls=10)
+
+    assert sorted(map(len, llm.batches)) == [1, 2, 2, 2]
+    assert all(len({key.split("-")[0] for key in batch}) == 1 for batch in llm.batches)
+    assert messages["u1-4"] == "Kişisel: u1-4"
+    assert messages["u3-0"].startswith("Sayın Ayşe")
+    assert renderer.stats["personalized"] == 7 and renderer.stats["templated"] == 8
+
+
+def test_concurrency_is_limited(monkeypatch):
+    llm = FakeBatchLLM(delay=0.01)
+    render(monkeypatch, llm, jobs_for(settings(personalize=True), 8), batch_size=1, concurrency=2, max_calls=10)
+    assert len(llm.batches) == 8
+    assert llm.max_active == 2
+
+
+def test_call_budget_keeps_templates_for_the_rest(monkeypatch):
+    llm = FakeBatchLLM()
+    messages, renderer = render(monkeypatch, llm, jobs_for(settings(personalize=True), 6), batch_size=2, max_calls=2)
+    assert len(llm.batches) == 2
+    assert renderer.stats["over_budget"] == 2
+    assert sum(text.startswith("Sayın") for text in messages.values()) == 2
+
+
+def test_time_budget_and_failures_keep_templates(monkeypatch):
+    llm = FakeBatchLLM(delay=0.2)
+    messages, renderer = render(monkeypatch, llm, jobs_for(settings(personalize=True), 2),
+                                batch_size=2, max_calls=5, max_seconds=0.05)
+    assert renderer.stats["llm_failures"] == 1
+    assert all(text.startswith("Sayın") for text in messages.values())
+
+    messages, renderer = render(monkeypatch, FakeBatchLLM(fail=True), jobs_for(settings(personalize=True), 2))
+    assert renderer.stats["llm_failures"] == 1 and renderer.stats["personalized"] == 0
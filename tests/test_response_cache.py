@@ -0,0 +1,49 @@
+from response_cache import TenantAnswerIndex, normalize_message
+
+
+def index_with(faq=(), generated=()):
+    index = TenantAnswerIndex("v1", [{"faq_id": f"faq_{i}", "question": q, "answer": a} for i, (q, a) in enumerate(faq)])
+    for question, answer in generated:
+        index.store(normalize_message(question), answer)
+    return index
+
+
+def lookup(index, message, include_generated=True):
+    return index.lookup(normalize_message(message), include_generated)
+
+
+def test_normalize_folds_turkish_case_and_punctuation():
+    assert normalize_message("  IŞIK   İğne!! ") == "isik igne"
+    assert normalize_message("Çalışma saatleriniz nedir?") == normalize_message("calisma SAATLERINIZ nedir")
+
+
+def test_faq_matches_paraphrase_above_its_threshold():
+    index = index_with(faq=[("Pazar günü açık mısınız?", "Pazar kapalıyız.")])
+    assert lookup(index, "Pazar günleri açık mısınız") == ("Pazar kapalıyız.", "faq")
+
+
+def test_generated_answers_need_the_stricter_threshold():
+    index = index_with(generated=[("Pazar günü açık mısınız?", "Pazar kapalıyız.")])
+    # ~0.83 similar: enough for a curated FAQ, not for reusing a generated answer
+    assert lookup(index, "Pazar günleri açık mısınız") is None
+    assert lookup(index, "pazar gunu acik misiniz") == ("Pazar kapalıyız.", "cache")
+
+
+def test_different_question_does_not_match():
+    index = index_with(
+        faq=[("Kedi aşısı ne kadar?", "Kliniğe danışın.")],
+        generated=[("Çalışma saatleriniz nedir?", "09:00-18:00")]
+    )
+    assert lookup(index, "Köpek aşısı ne kadar?") is None
+    assert lookup(index, "Adresiniz nerede?") is None
+
+
+def test_generated_answers_are_skipped_when_not_allowed():
+    index = index_with(generated=[("Çalışma saatleriniz nedir?", "09:00-18:00")])
+    assert lookup(index, "Çalışma saatleriniz nedir?", include_generated=False) is None
+
+
+def test_short_messages_are_never_cached():
+    index = index_with(generated=[("tamam", "Harika")])
+    assert lookup(index, "tamam") is None
+    assert index.stats["stored"] == 0
@@ -0,0 +1,26 @@
+from datetime import datetime, timezone, timedelta
+
+from subscription import rollover_subscription_periods
+
+
+def test_ended_periods_expire_and_current_ones_are_kept(run_with_db):
+    async def test(db):
+        now = datetime.now(timezone.utc)
+        await db.subscriptions.insert_many([
+            {"user_id": "paid", "plan": "professional", "status": "active",
+             "current_period_end": now - timedelta(hours=1), "unregistered_responses_used": 9},
+            {"user_id": "trial", "plan": "starter", "status": "trial",
+             "current_period_end": now - timedelta(days=2), "unregistered_responses_used": 0},
+            {"user_id": "current", "plan": "starter", "status": "active",
+             "current_period_end": now + timedelta(days=10), "unregistered_responses_used": 4},
+        ])
+
+        assert await rollover_subscription_periods(db, batch_size=1) == {"expired": 2}
+
+        statuses = {s["user_id"]: (s["status"], s["unregistered_responses_used"])
+                    async for s in db.subscriptions.find({})}
+        assert statuses == {"paid": ("expired", 0), "trial": ("expired", 0), "current": ("active", 4)}
+        audits = await db.subscription_rollovers.find({}, {"_id": 0, "user_id": 1, "action": 1}).to_list(10)
+        assert sorted((a["user_id"], a["action"]) for a in audits) == [("paid", "expired"), ("trial", "expired")]
+
+    run_with_db(test)
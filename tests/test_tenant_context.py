@@ -0,0 +1,36 @@
+from subscription import add_extra_responses, reserve_whatsapp_response
+from tenant_context import load_tenant_context, invalidate_tenant_context
+
+
+async def add_subscription(db, user_id="u1"):
+    await db.subscriptions.insert_one({
+        "user_id": user_id, "plan": "starter", "status": "active",
+        "unregistered_responses_used": 0, "extra_responses_balance": 0,
+    })
+
+
+def test_cached_context_is_not_shared_between_callers(run_with_db):
+    async def test(db):
+        invalidate_tenant_context()
+        await add_subscription(db)
+        first = await load_tenant_context(db, "u1")
+        first.subscription["plan"] = "unlimited"
+        second = await load_tenant_context(db, "u1")
+        assert second.subscription["plan"] == "starter"
+
+    run_with_db(test)
+
+
+def test_credit_writes_invalidate_the_context(run_with_db):
+    async def test(db):
+        invalidate_tenant_context()
+        await add_subscription(db)
+        await load_tenant_context(db, "u1")
+
+        await reserve_whatsapp_response(db, "u1")
+        assert (await load_tenant_context(db, "u1")).subscription["unregistered_responses_used"] == 1
+
+        await add_extra_responses(db, "u1", 50)
+        assert (await load_tenant_context(db, "u1")).subscription["extra_responses_balance"] == 50
+
+    run_with_db(test)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import tracing
+from tracing import TracingMiddleware, get_request_id, install_log_correlation, root_span, span
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    exporter = tracing.get_exporter()
+    exporter.drain()
+    yield exporter
+    exporter.drain()
+
+
+def test_child_spans_link_to_their_parent(exporter):
+    with root_span("job", request_id="job-1") as root:
+        with span("mongo.find", "client") as child:
+            with span("inner") as grandchild:
+                pass
+
+    assert child.trace_id == grandchild.trace_id == root.trace_id
+    assert (root.parent_id, child.parent_id, grandchild.parent_id) == (None, root.span_id, child.span_id)
+    assert [s.name for s in exporter.drain()] == ["inner", "mongo.find", "job"]
+    assert tracing.current_span() is None
+
+
+def test_errors_are_recorded_on_the_failing_spans(exporter):
+    with pytest.raises(ValueError):
+        with root_span("job"):
+            with span("step"):
+                raise ValueError("boom")
+    assert [s.error for s in exporter.drain()] == ["ValueError: boom", "ValueError: boom"]
+
+
+def test_spans_are_no_ops_when_tracing_is_off():
+    with root_span("job") as root:
+        with span("step") as child:
+            assert get_request_id() != "-"
+    assert root is None and child is None
+    assert get_request_id() == "-"
+
+
+def test_log_records_carry_the_correlation_id(caplog):
+    factory = logging.getLogRecordFactory()
+    install_log_correlation()
+    try:
+        with caplog.at_level(logging.INFO, logger="tracing"):
+            with root_span("job", request_id="req-42"):
+                tracing.logger.info("inside")
+            tracing.logger.info("outside")
+    finally:
+        logging.setLogRecordFactory(factory)
+    assert [record.request_id for record in caplog.records] == ["req-42", "-"]
+
+
+def test_middleware_continues_incoming_trace_and_echoes_ids(exporter):
+    api = FastAPI()
+
+    @api.get("/api/customers/{customer_id}")
+    async def customer(customer_id: str):
+        return {"request_id": get_request_id()}
+
+    trace_id, parent_id = "a" * 32, "b" * 16
+
+    async def run():
+        transport = httpx.ASGITransport(app=TracingMiddleware(api))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/customers/cust_1", headers={
+                "traceparent": f"00-{trace_id}-{parent_id}-01", "X-Request-ID": "req-7"
+            })
+
+    response = asyncio.run(run())
+    assert response.json() == {"request_id": "req-7"}
+    assert response.headers["x-request-id"] == "req-7"
+    (root,) = exporter.drain()
+    assert (root.trace_id, root.parent_id) == (trace_id, parent_id)
+    assert root.name == "GET /api/customers/{customer_id}"
+    assert response.headers["traceparent"] == f"00-{trace_id}-{root.span_id}-01"
@@ -0,0 +1,177 @@
+import pytest
+
+from subscription import SUBSCRIPTION_PLANS, reserve_whatsapp_response, refund_whatsapp_response
+
+
+async def add_subscription(db, plan="starter", used=0, extra=0, status="active", user_id="u1"):
+    await db.subscriptions.insert_one({
+        "user_id": user_id,
+        "plan": plan,
+        "status": status,
+        "unregistered_responses_used": used,
+        "extra_responses_balance": extra,
+    })
+
+
+async def balances(db, user_id="u1"):
+    sub = await db.subscriptions.find_one({"user_id": user_id})
+    return sub["unregistered_responses_used"], sub["extra_responses_balance"]
+
+
+def test_monthly_allowance_is_used_before_extra(run_with_db):
+    async def test(db):
+        limit = SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        await add_subscription(db, used=limit - 1, extra=2)
+
+        first = await reserve_whatsapp_response(db, "u1")
+        assert first["reserved"] and first["source"] == "monthly"
+        assert first["responses_left"] == 2
+        assert await balances(db) == (limit, 2)
+
+        second = await reserve_whatsapp_response(db, "u1")
+        assert second["reserved"] and second["source"] == "extra"
+        assert await balances(db) == (limit, 1)
+
+    run_with_db(test)
+
+
+def test_exhausted_credits_are_not_reserved(run_with_db):
+    async def test(db):
+        limit = SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        await add_subscription(db, used=limit, extra=0)
+        result = await reserve_whatsapp_response(db, "u1")
+        assert not result["reserved"]
+        assert await balances(db) == (limit, 0)
+
+    run_with_db(test)
+
+
+def test_monthly_limit_follows_plan(run_with_db):
+    async def test(db):
+        starter = SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        professional = SUBSCRIPTION_PLANS["professional"]["unregistered_response_limit"]
+        assert professional > starter
+        await add_subscription(db, plan="professional", used=starter)
+        result = await reserve_whatsapp_response(db, "u1")
+        assert result["source"] == "monthly"
+        assert result["responses_left"] == professional - starter - 1
+
+    run_with_db(test)
+
+
+def test_inactive_subscription_is_not_charged(run_with_db):
+    async def test(db):
+        await add_subscription(db, status="expired", extra=5)
+        assert not (await reserve_whatsapp_response(db, "u1"))["reserved"]
+        assert await balances(db) == (0, 5)
+
+    run_with_db(test)
+
+
+def test_refund_returns_credit_to_its_bucket(run_with_db):
+    async def test(db):
+        limit = SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        await add_subscription(db, used=limit - 1, extra=1)
+        monthly = await reserve_whatsapp_response(db, "u1")
+        extra = await reserve_whatsapp_response(db, "u1")
+        assert await balances(db) == (limit, 0)
+
+        await refund_whatsapp_response(db, "u1", extra)
+        assert await balances(db) == (limit, 1)
+        await refund_whatsapp_response(db, "u1", monthly)
+        assert await balances(db) == (limit - 1, 1)
+
+    run_with_db(test)
+
+
+def test_refund_of_failed_reservation_is_a_no_op(run_with_db):
+    async def test(db):
+        limit = SUBSCRIPTION_PLANS["starter"]["unregistered_response_limit"]
+        await add_subscription(db, used=limit)
+        result = await reserve_whatsapp_response(db, "u1")
+        await refund_whatsapp_response(db, "u1", result)
+        assert await balances(db) == (limit, 0)
+
+    run_with_db(test)
+
+
+def webhook_payload(phone, text, message_id):
+    return {"entry": [{"changes": [{"value": {
+        "contacts": [{"profile": {"name": "Test"}}],
+        "messages": [{"id": message_id, "from": phone, "type": "text", "text": {"body": text}}]
+    }}]}]}
+
+
+async def post_webhook(db, monkeypatch, text="Merhaba"):
+    import httpx
+    import server
+
+    monkeypatch.setattr(server, "db", db)
+    await add_subscription(db, used=3, extra=1)
+    await db.ai_settings.insert_one({"user_id": "u1", "is_active": True})
+
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/api/whatsapp/webhook", json=webhook_payload("905449990000", text, "wamid.t1"))
+
+
+@pytest.fixture
+def webhook_stubs(monkeypatch):
+    import ai_chat
+    import server
+    import whatsapp
+
+    stubs = {"cached": None, "llm_error": None}
+
+    async def llm(*args, **kwargs):
+        if stubs["llm_error"]:
+            raise stubs["llm_error"]
+        return "Model yanıtı", None
+
+    async def cached_answer(*args, **kwargs):
+        return stubs["cached"]
+
+    async def send(phone, text):
+        return {"success": True}
+
+    async def no_op(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(ai_chat, "get_ai_response", llm)
+    monkeypatch.setattr(server, "lookup_cached_answer", cached_answer)
+    monkeypatch.setattr(server, "store_generated_answer", no_op)
+    monkeypatch.setattr(whatsapp, "send_text_message", send)
+    return stubs
+
+
+def test_webhook_refunds_credit_when_reply_fails_before_sending(run_with_db, monkeypatch, webhook_stubs):
+    webhook_stubs["llm_error"] = RuntimeError("model down")
+
+    async def test(db):
+        response = await post_webhook(db, monkeypatch)
+        assert response.status_code == 500
+        assert await balances(db) == (3, 1)
+
+    run_with_db(test)
+
+
+def test_webhook_bills_generated_reply(run_with_db, monkeypatch, webhook_stubs):
+    async def test(db):
+        response = await post_webhook(db, monkeypatch)
+        assert response.status_code == 200
+        assert await balances(db) == (4, 1)
+
+    run_with_db(test)
+
+
+def test_webhook_does_not_bill_cached_reply(run_with_db, monkeypatch, webhook_stubs):
+    webhook_stubs["cached"] = ("Hafta içi 09:00-18:00 açığız.", "faq")
+
+    async def test(db):
+        response = await post_webhook(db, monkeypatch, "Çalışma saatleriniz?")
+        assert response.status_code == 200
+        assert await balances(db) == (3, 1)
+        outbound = await db.whatsapp_messages.find_one({"direction": "outbound"})
+        assert outbound["message_text"] == "Hafta içi 09:00-18:00 açığız."
+
+    run_with_db(test)